@@ -188,9 +188,9 @@ async def login(
         db.commit()
 
         # *** ADDED: Invalidate relevant caches to ensure fresh data ***
-        from app.core.cache import init_redis_pool, invalidate_cache
+        from app.core.cache import init_redis_pool, bump_data_version
         redis = await init_redis_pool()
-        await invalidate_cache("table_data:*")  # Invalidate all table data caches
+        await bump_data_version()  # Make all cached table data stale
         logger.info(f"Invalidated table data cache for user: {username}")
 
         # Generate tokens
@@ -296,17 +296,10 @@ async def admin_dashboard(
 
         # Get columns from the actual database table
         try:
-            # Get the actual table columns
-            from app.models.table import BigTable
-            from sqlalchemy import inspect
+            # Get the actual table columns from the schema registry filled at startup
+            from app.core.schema_registry import schema_registry
 
-            # Use a separate sync engine to inspect table schema
-            from app.core.db import sync_engine
-
-            # Get all columns from the database
-            inspector = inspect(sync_engine)
-            table_columns = inspector.get_columns("taitur_data")  # Use your actual table name
-            column_names = [col['name'] for col in table_columns]
+            column_names = schema_registry.column_names()
 
             # For each column, get or create a ColumnSetting
             columns = []
@@ -0,0 +1,104 @@
+# jobs.py - Background job submit/status/result/cancel endpoints
+import logging
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse
+
+from app.api.dependencies import get_current_active_user
+from app.core.jobs import JOB_SUCCEEDED, job_queue, job_to_dict
+from app.models.job import Job
+from app.models.user import User
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Create router with proper prefix
+router = APIRouter(prefix="/api/v1/jobs", tags=["jobs"])
+
+
+def get_owned_job(job_id: str, current_user: User) -> Job:
+    """Job by id, visible to its owner and to admins"""
+    job = job_queue.get_job(job_id)
+    if job is None or (job.user_id != current_user.id and not current_user.is_admin):
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+
+@router.post("")
+async def submit_job(
+        request: Request,
+        current_user: User = Depends(get_current_active_user)
+):
+    """Queue a background job: {"kind": ..., "params": {...}}; progress is sent over /ws"""
+    try:
+        body = await request.json()
+        kind = body.get("kind")
+        params = body.get("params") or {}
+
+        if not job_queue.has_kind(kind):
+            raise HTTPException(status_code=400, detail=f"Unknown job kind: {kind}")
+        if not isinstance(params, dict):
+            raise HTTPException(status_code=400, detail="Job params must be an object")
+
+        return {"success": True, "job": await job_queue.submit(kind, params, current_user.id)}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error submitting job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error submitting job: {str(e)}")
+
+
+@router.get("")
+async def list_jobs(current_user: User = Depends(get_current_active_user)):
+    """Recent jobs of the current user, newest first"""
+    try:
+        return {"success": True, "jobs": [job_to_dict(job) for job in job_queue.list_jobs(current_user.id)]}
+    except Exception as e:
+        logger.exception(f"Error listing jobs: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error listing jobs: {str(e)}")
+
+
+@router.get("/{job_id}")
+async def get_job_status(job_id: str, current_user: User = Depends(get_current_active_user)):
+    """Status and progress of a job"""
+    try:
+        return {"success": True, "job": job_to_dict(get_owned_job(job_id, current_user))}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error getting job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting job: {str(e)}")
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str, current_user: User = Depends(get_current_active_user)):
+    """Result document of a finished job"""
+    try:
+        job = get_owned_job(job_id, current_user)
+        if job.status != JOB_SUCCEEDED:
+            raise HTTPException(status_code=409, detail=f"Job is {job.status}, no result available")
+        if not job.result_path or not os.path.exists(job.result_path):
+            raise HTTPException(status_code=404, detail="Job has no result")
+
+        return FileResponse(job.result_path, media_type="application/json")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error getting result of job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error getting job result: {str(e)}")
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str, current_user: User = Depends(get_current_active_user)):
+    """Cancel a queued or running job"""
+    try:
+        get_owned_job(job_id, current_user)
+        return {"success": True, "job": await job_queue.cancel(job_id)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error cancelling job {job_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error cancelling job: {str(e)}")
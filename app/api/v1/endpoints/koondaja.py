@@ -1,24 +1,36 @@
 # koondaja.py - Updated with toimiku_nr_loplik logic
-import csv
+import asyncio
 import logging
 import os
 import re
+import time
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterator, List, Optional, Set, Tuple
 from collections import defaultdict
 
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.dependencies import get_current_active_user
-from app.core.db import get_db
+from app.core.db import get_db, get_db_context
+from app.core.jobs import JobContext, job_queue
+from app.core.schema_registry import schema_registry
 from app.models.user import User
+from app.services.csv_stream import CSV_CHUNK_ROWS, detect_encoding, iter_chunks, iter_csv_rows
+from app.services.koondaja_cache import koondaja_cache
+from app.services.koondaja_reconciler import load_candidates, reconcile_lines
+from app.services.row_materializer import materialize_rows
+from app.services.wire_format import NDJSON_MEDIA_TYPE, ndjson_line, rows_to_columnar, wants_columnar, wants_ndjson
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Koondaja import jobs run at once per worker process
+KOONDAJA_IMPORT_JOBS = 2
+
 # Create router with proper prefix
 router = APIRouter(prefix="/api/v1/koondaja", tags=["koondaja"])
 
@@ -100,294 +112,293 @@ def extract_toimiku_number(text: str) -> Optional[str]:
     return None
 
 
-async def get_database_info(db: AsyncSession, toimiku_numbers: List[str], viitenumbers: List[str],
-                            registrikoodid: List[str]) -> Dict[str, Dict]:
-    """Fetch all required database information in one efficient query including võlgnik names."""
-    if not toimiku_numbers and not viitenumbers and not registrikoodid:
-        return {"by_toimiku": {}, "by_viitenumber": {}, "by_registrikood": {}, "by_name": {}}
-
-    try:
-        # Build query to get all needed fields
-        query = text("""
-            SELECT 
-                "toimiku_nr",
-                "viitenumber",
-                "võlgnik",
-                "nõude_sisu",
-                "võla_jääk",
-                "staatus",
-                "rmp_märkused",
-                "märkused",
-                "võlgniku_kood"
-            FROM "taitur_data"
-            WHERE "toimiku_nr" = ANY(:toimiku_numbers) 
-               OR "viitenumber" = ANY(:viitenumbers)
-               OR "võlgniku_kood" = ANY(:registrikoodid)
-        """)
-
-        result = await db.execute(query, {
-            "toimiku_numbers": toimiku_numbers or [],
-            "viitenumbers": viitenumbers or [],
-            "registrikoodid": registrikoodid or []
-        })
-
-        rows = result.fetchall()
-
-        # Create lookup dictionaries
-        data_by_toimiku = {}
-        data_by_viitenumber = {}
-        data_by_registrikood = {}
-        data_by_name = {}  # NEW: Add name-based lookup
-
-        for row in rows:
-            row_dict = {
-                "toimiku_nr": row[0],
-                "viitenumber": row[1],
-                "võlgnik": row[2],
-                "nõude_sisu": row[3],
-                "võla_jääk": row[4],
-                "staatus": row[5],
-                "rmp_märkused": row[6],
-                "märkused": row[7],
-                "võlgniku_kood": row[8]
-            }
+# Konto vv import pipeline. Every stage runs once per batch of lines:
+#   parse (iter_konto_vv_rows) -> key extraction (extract_konto_vv_keys)
+#   -> bulk lookup (reconcile_lines) -> aggregate (konto_vv_payment_columns)
+#   -> enrich (enrich_konto_vv_batch)
+# A batch is columnar: {"line_no": [...], "rows": [...], "toimiku": [...], ...}
+
+# Output fields filled from the CSV line or with a constant, in KOONDAJA_COLUMNS order
+KONTO_VV_CSV_FIELDS = [
+    (field_key, field_info.get("index"), field_info.get("value", ""))
+    for field_key, field_info in KOONDAJA_COLUMNS.items()
+    if field_info["source"] in ("csv", "empty", "fixed")
+    and (field_info["source"] != "csv" or "index" in field_info)
+]
+
+# Output fields filled from the matched database record, with their value when there is no match
+KONTO_VV_DB_FIELDS = [
+    ("nimi_baasis", "võlgnik", ""),
+    ("noude_sisu", "nõude_sisu", ""),
+    ("toimiku_jaak", "võla_jääk", 0.0),
+    ("staatus_baasis", "staatus", ""),
+    ("em_markus", "rmp_märkused", ""),
+    ("toimiku_markused", "märkused", ""),
+]
+
+
+def iter_konto_vv_rows(file_path: str, encoding: str) -> Iterator[List[str]]:
+    """Parse stage: cleaned S/V = 'C' rows of a Konto vv file, read incrementally"""
+    for row in iter_csv_rows(file_path, encoding, delimiter=';'):
+        if not row or len(row) < 10:
+            continue
+
+        # Clean row data
+        cleaned_row = [str(field).strip() if field is not None else "" for field in row]
+
+        # Only process rows where S/V = 'C'
+        if cleaned_row[7] == 'C':
+            yield cleaned_row
+
+
+def extract_konto_vv_keys(rows: List[List[str]], first_line_no: int) -> Dict[str, List]:
+    """Key extraction stage: columnar batch with the lookup keys of every row"""
+    return {
+        "line_no": list(range(first_line_no, first_line_no + len(rows))),
+        "rows": rows,
+        # Toimiku number from selgitus (CSV index 11)
+        "toimiku": [extract_toimiku_number(row[11]) if len(row) > 11 else None for row in rows],
+        "viitenumber": [row[9] for row in rows],
+        "registrikood": [row[14] if len(row) > 14 else "" for row in rows],
+    }
+
+
+def collect_payment_stats(file_path: str, encoding: str) -> Tuple[Dict[str, Dict], Dict[str, Set[str]]]:
+    """
+    First pass over the whole file: payment count and total per viitenumber
+    (or toimiku number), and every lookup key of the file for the name fallback.
+    """
+    payment_stats = defaultdict(lambda: {"count": 0, "total": 0.0})
+    file_keys: Dict[str, Set[str]] = {"toimiku": set(), "viitenumber": set(), "registrikood": set()}
+
+    for row in iter_konto_vv_rows(file_path, encoding):
+        toimiku = extract_toimiku_number(row[11]) if len(row) > 11 else None
+        # The toimiku number only matters when there is no viitenumber
+        identifier = row[9] or toimiku
+
+        if identifier and len(row) > 8:
+            payment_stats[identifier]["count"] += 1
+            payment_stats[identifier]["total"] += safe_number_conversion(row[8], 0.0)
+
+        for name, key in (("toimiku", toimiku), ("viitenumber", row[9]),
+                          ("registrikood", row[14] if len(row) > 14 else "")):
+            if key:
+                file_keys[name].add(key)
+
+    return dict(payment_stats), file_keys
+
+
+def konto_vv_payment_columns(batch: Dict[str, List], payment_stats: Dict[str, Dict]) -> Tuple[List, List]:
+    """Aggregate stage: laekumiste_arv and laekumised_kokku of every row, by Toimiku nr selgituses"""
+    counts = []
+    totals = []
+    for toimiku, row in zip(batch["toimiku"], batch["rows"]):
+        stats = payment_stats.get(toimiku) if toimiku else None
+        if stats:
+            counts.append(stats["count"])
+            # Convert back to Estonian format (comma as decimal separator)
+            totals.append(str(stats["total"]).replace('.', ','))
+        else:
+            counts.append(1)  # Current row counts as 1
+            totals.append(row[8])
+    return counts, totals
 
-            if row[0]:  # toimiku_nr
-                data_by_toimiku[row[0]] = row_dict
-            if row[1]:  # viitenumber
-                data_by_viitenumber[row[1]] = row_dict
-            if row[8]:  # võlgniku_kood
-                data_by_registrikood[row[8]] = row_dict
-            if row[2]:  # võlgnik (name)
-                # For name lookup, we might have multiple records per name,
-                # so store as a list and we'll use the first one with a toimiku_nr
-                if row[2] not in data_by_name:
-                    data_by_name[row[2]] = []
-                data_by_name[row[2]].append(row_dict)
 
-        return {
-            "by_toimiku": data_by_toimiku,
-            "by_viitenumber": data_by_viitenumber,
-            "by_registrikood": data_by_registrikood,
-            "by_name": data_by_name  # NEW: Add name-based lookup
+def enrich_konto_vv_batch(
+        batch: Dict[str, List],
+        matches: Dict[int, Dict[str, Any]],
+        payment_stats: Dict[str, Dict]
+) -> List[Dict[str, Any]]:
+    """Enrich stage: output rows of a batch from the CSV fields, reconciled matches and payment stats"""
+    counts, totals = konto_vv_payment_columns(batch, payment_stats)
+
+    data = []
+    for i, row in enumerate(batch["rows"]):
+        row_data = {
+            field_key: (row[idx] if len(row) > idx else "") if idx is not None else value
+            for field_key, idx, value in KONTO_VV_CSV_FIELDS
         }
 
-    except Exception as e:
-        logger.error(f"Error fetching database info: {str(e)}")
-        return {"by_toimiku": {}, "by_viitenumber": {}, "by_registrikood": {}, "by_name": {}}
+        # Final toimiku number as resolved by the reconciler (viitenumber, registrikood or name match)
+        match = matches.get(batch["line_no"][i]) or {}
+        toimiku_nr_loplik = match.get("toimiku_nr_loplik", "")
+        row_data["toimiku_nr_selgituses"] = batch["toimiku"][i] or ""
+        row_data["toimiku_nr_viitenumbris"] = match.get("toimiku_nr_viitenumbris", "")
+        row_data["toimiku_nr_loplik"] = toimiku_nr_loplik
+        row_data["has_valid_toimiku"] = bool(toimiku_nr_loplik)  # Flag for frontend styling
+        row_data[
+            "match_source"] = match.get("match_source")  # Track how the toimiku was found ('viitenumber', 'registrikood', 'name', None)
+
+        # Database record picked by the reconciler: by final toimiku_nr, else viitenumber, else registrikood
+        db_record = match.get("record")
+        if db_record:
+            for field_key, db_field, _ in KONTO_VV_DB_FIELDS:
+                row_data[field_key] = db_record.get(db_field, "")
+
+            # Aggregates for this võlgnik
+            row_data["toimikute_arv"] = match["toimikute_arv"]
+            row_data["toimikute_jaakide_summa"] = match["toimikute_jaakide_summa"]
+
+            # Calculate Vahe (difference between database balance and CSV amount)
+            row_data["vahe"] = (safe_number_conversion(db_record.get("võla_jääk", 0))
+                                - safe_number_conversion(row_data["summa"]))
+        else:
+            # No database record found
+            for field_key, _, empty_value in KONTO_VV_DB_FIELDS:
+                row_data[field_key] = empty_value
+            row_data["toimikute_arv"] = 0
+            row_data["toimikute_jaakide_summa"] = 0.0
+            row_data["vahe"] = 0.0
 
+        row_data["laekumiste_arv"] = counts[i]
+        row_data["laekumised_kokku"] = totals[i]
+        data.append(row_data)
 
-async def calculate_aggregates(db: AsyncSession, all_rows: List[Dict]) -> Dict[str, Dict]:
-    """Calculate aggregate values for toimiku statistics."""
-    try:
-        # Get all unique võlgnik names
-        volgnik_names = list(set(row.get("nimi_baasis", "") for row in all_rows if row.get("nimi_baasis")))
+    return data
 
-        if not volgnik_names:
-            return {}
 
-        # Query to get counts and sums by võlgnik
-        query = text("""
-            SELECT 
-                "võlgnik",
-                COUNT(DISTINCT "toimiku_nr") as toimiku_count,
-                SUM("võla_jääk") as total_jaak
-            FROM "taitur_data"
-            WHERE "võlgnik" = ANY(:names)
-            GROUP BY "võlgnik"
-        """)
+async def iter_konto_vv_chunks(
+        db: AsyncSession,
+        file_path: str,
+        encoding: str,
+        first_pass: Awaitable[Tuple[Dict[str, Dict], Dict[str, Set[str]]]],
+        chunk_size: int = CSV_CHUNK_ROWS
+) -> AsyncIterator[Tuple[int, List[Dict[str, Any]]]]:
+    """
+    Second pass: run the pipeline stages over the file batch by batch.
 
-        result = await db.execute(query, {"names": volgnik_names})
-        rows = result.fetchall()
+    Yields (rows read so far, processed rows of the batch); only one batch of
+    raw and processed rows is held in memory at a time. ``first_pass`` is the
+    running collect_payment_stats; its file-wide keys select the candidate
+    rows of the name fallback before the first batch is reconciled. The CSV
+    is read and decoded in the default executor, one chunk per call.
+    """
+    payment_stats, file_keys = await first_pass
+    candidates = await load_candidates(
+        db, file_keys["toimiku"], file_keys["viitenumber"], file_keys["registrikood"]
+    )
+
+    loop = asyncio.get_running_loop()
+    chunks = iter_chunks(iter_konto_vv_rows(file_path, encoding), chunk_size)
+    row_count = 0
+    while True:
+        rows = await loop.run_in_executor(None, next, chunks, None)
+        if rows is None:
+            break
+
+        batch = extract_konto_vv_keys(rows, row_count + 1)
+        row_count += len(rows)
+
+        # Resolve matches and aggregates for the batch in one set-based query
+        matches = await reconcile_lines(
+            db, list(zip(batch["line_no"], batch["toimiku"], batch["viitenumber"], batch["registrikood"])),
+            candidates
+        )
+
+        yield row_count, enrich_konto_vv_batch(batch, matches, payment_stats)
+
+
+async def iter_konto_vv_records(
+        db: AsyncSession,
+        file_path: str,
+        folder_name: str,
+        encoding: str,
+        job: Optional[JobContext] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Records of a Konto vv import: a header with the column definitions, one
+    "rows" record per reconciled chunk, then a summary with the counts.
 
-        aggregates = {}
-        for row in rows:
-            aggregates[row[0]] = {
-                "count": row[1],
-                "sum": float(row[2]) if row[2] else 0.0
-            }
+    An unchanged file against unchanged table data is replayed from the
+    Koondaja cache; otherwise the records are written to it as they are
+    produced. A background job gets progress after every chunk.
+    """
+    start_time = time.time()
+    file_name = os.path.basename(file_path)
+
+    cache_key = await koondaja_cache.key_for(db, file_path)
+    cached = await koondaja_cache.read(cache_key)
+    if cached is not None:
+        logger.info(f"Serving {file_name} from the Koondaja cache")
+        async for record in cached:
+            yield record
+        return
+
+    cache_writer = koondaja_cache.writer(file_path, cache_key)
+    first_pass = None
+    try:
+        header = {
+            "type": "header",
+            "file": file_name,
+            "folder_type": folder_name.lower(),
+            "encoding_used": encoding,
+            "columns": KOONDAJA_COLUMNS
+        }
+        cache_writer.write(header)
+        yield header
 
-        return aggregates
+        # First pass: a row's laekumiste_arv and laekumised_kokku also count the later lines of its
+        # toimiku, and the name fallback searches the rows matched by any key of the file, so both
+        # need every line before any row is complete. The CSV-only pass runs in a thread.
+        first_pass = asyncio.get_running_loop().run_in_executor(
+            None, collect_payment_stats, file_path, encoding
+        )
 
-    except Exception as e:
-        logger.error(f"Error calculating aggregates: {str(e)}")
-        return {}
+        # Second pass: reconcile and process in chunks
+        row_count = 0
+        valid_rows = 0
+        async for row_count, chunk in iter_konto_vv_chunks(db, file_path, encoding, first_pass):
+            if job:
+                await job.progress(None, f"{row_count} rows reconciled")
+            if chunk:
+                valid_rows += len(chunk)
+                record = {"type": "rows", "rows": chunk}
+                cache_writer.write(record)
+                yield record
 
+        logger.info(
+            f"Successfully processed {valid_rows} out of {row_count} rows from {file_name} "
+            f"in {time.time() - start_time:.2f}s")
 
-def determine_toimiku_nr_loplik(row_data: Dict[str, Any], db_info: Dict[str, Dict]) -> tuple[
-    Optional[str], bool, Optional[str]]:
+        summary = {
+            "type": "summary",
+            "success": True,
+            "message": f"Successfully imported {valid_rows} rows from {file_name}",
+            "folder_type": folder_name.lower(),
+            "encoding_used": encoding,
+            "total_rows_processed": row_count,
+            "valid_rows": valid_rows
+        }
+        # Only reached when every batch was reconciled; any failure propagates and close() discards the entry
+        cache_writer.write(summary)
+        cache_writer.commit()
+        yield summary
+    finally:
+        if first_pass is not None:
+            # The consumer may stop before the second pass awaited the first one
+            if first_pass.done():
+                if not first_pass.cancelled():
+                    first_pass.exception()
+            else:
+                first_pass.cancel()
+        cache_writer.close()
+
+
+async def stream_konto_vv_import(file_path: str, folder_name: str, encoding: str) -> AsyncIterator[bytes]:
     """
-    Determine the final toimiku number based on the extended business logic.
-    Returns tuple: (toimiku_nr_loplik, has_valid_toimiku, match_source)
+    NDJSON body of a Konto vv import, one line per record of iter_konto_vv_records.
 
-    Extended Logic:
-    1. If "Toimiku nr selgituses" equals "Toimiku nr viitenumbris" (from viitenumber lookup), use it
-    2. OR if "Toimiku nr selgituses" equals toimiku_nr from database row matching isiku_registrikood, use it
-    3. OR if we can find toimiku_nr through "Nimi baasis"/võlgnik lookup, use that
-    4. Else leave empty (invalid)
-
-    match_source values: 'viitenumber', 'registrikood', 'name', None
+    Rows go out as soon as each chunk is reconciled. A failure mid-stream is
+    reported as an "error" record since the status code has already been sent.
     """
-    toimiku_selgituses = row_data.get("toimiku_nr_selgituses", "")
-    viitenumber = row_data.get("viitenumber", "")
-    isiku_registrikood = row_data.get("isiku_registrikood", "")
-
-    # Get toimiku_nr_viitenumbris from database lookup by viitenumber (10th CSV item)
-    toimiku_viitenumbris = ""
-    if viitenumber and viitenumber in db_info["by_viitenumber"]:
-        db_record = db_info["by_viitenumber"][viitenumber]
-        toimiku_viitenumbris = db_record.get("toimiku_nr", "")
-
-    # Get toimiku_nr from database lookup by isiku_registrikood (15th CSV item)
-    toimiku_from_registrikood = ""
-    if isiku_registrikood and isiku_registrikood in db_info["by_registrikood"]:
-        db_record = db_info["by_registrikood"][isiku_registrikood]
-        toimiku_from_registrikood = db_record.get("toimiku_nr", "")
-
-    # Store the viitenumbris value for display
-    row_data["toimiku_nr_viitenumbris"] = toimiku_viitenumbris
-
-    # Validation logic:
-    # 1. If toimiku_selgituses equals toimiku_viitenumbris, it's valid
-    if toimiku_selgituses and toimiku_selgituses == toimiku_viitenumbris:
-        return toimiku_selgituses, True, 'viitenumber'
-
-    # 2. If toimiku_selgituses equals toimiku_nr from registrikood lookup, it's valid
-    if toimiku_selgituses and toimiku_selgituses == toimiku_from_registrikood:
-        return toimiku_selgituses, True, 'registrikood'
-
-    # 3. NEW: Check for toimiku_nr by name lookup ("Nimi baasis"/võlgnik)
-    # Find any database record that could provide the name, then look up toimiku_nr by that name
-    potential_name = ""
-    name_based_toimiku = ""
-
-    # Try to get name from various database lookups
-    if viitenumber and viitenumber in db_info["by_viitenumber"]:
-        potential_name = db_info["by_viitenumber"][viitenumber].get("võlgnik", "")
-    elif isiku_registrikood and isiku_registrikood in db_info["by_registrikood"]:
-        potential_name = db_info["by_registrikood"][isiku_registrikood].get("võlgnik", "")
-    elif toimiku_selgituses and toimiku_selgituses in db_info["by_toimiku"]:
-        potential_name = db_info["by_toimiku"][toimiku_selgituses].get("võlgnik", "")
-
-    # If we have a name, look for any toimiku_nr associated with that võlgnik
-    if potential_name and potential_name in db_info.get("by_name", {}):
-        # Get the first record with a toimiku_nr for this name
-        name_records = db_info["by_name"][potential_name]
-        for record in name_records:
-            if record.get("toimiku_nr"):
-                name_based_toimiku = record.get("toimiku_nr")
-                break
-
-        # If we found a toimiku_nr through name lookup, use it
-        if name_based_toimiku:
-            row_data["nimi_baasis"] = potential_name  # Store the name we used
-            logger.debug(f"Name-based lookup successful: '{potential_name}' -> '{name_based_toimiku}'")
-            return name_based_toimiku, True, 'name'
-
-    # No validation passed - leave empty (will be highlighted in light blue)
-    return "", False, None
-
-
-def process_konto_vv_row(
-        row: List[str],
-        row_num: int,
-        db_info: Dict[str, Dict],
-        aggregates: Dict[str, Dict],
-        payment_stats: Dict[str, Dict]
-) -> Optional[Dict[str, Any]]:
-    """Process a single row from Konto vv CSV file with updated toimiku validation logic."""
-
-    # Skip rows that don't have S/V = 'C'
-    if len(row) <= 7 or row[7] != 'C':
-        return None
-
-    row_data = {}
-
-    # Process CSV fields
-    for field_key, field_info in KOONDAJA_COLUMNS.items():
-        if field_info["source"] == "csv" and "index" in field_info:
-            idx = field_info["index"]
-            row_data[field_key] = row[idx] if len(row) > idx else ""
-        elif field_info["source"] == "empty":
-            row_data[field_key] = ""
-        elif field_info["source"] == "fixed":
-            row_data[field_key] = field_info.get("value", "")
-
-    # Extract toimiku number from selgitus (makse_selgitus = CSV index 11)
-    makse_selgitus = row_data.get("makse_selgitus", "")
-    toimiku_from_selgitus = extract_toimiku_number(makse_selgitus)
-    row_data["toimiku_nr_selgituses"] = toimiku_from_selgitus or ""
-
-    # Determine final toimiku number using extended validation logic
-    toimiku_nr_loplik, has_valid_toimiku, match_source = determine_toimiku_nr_loplik(row_data, db_info)
-    row_data["toimiku_nr_loplik"] = toimiku_nr_loplik
-    row_data["has_valid_toimiku"] = has_valid_toimiku  # Flag for frontend styling
-    row_data[
-        "match_source"] = match_source  # Track how the toimiku was found ('viitenumber', 'registrikood', 'name', None)
-
-    # Find the best database record for additional data
-    viitenumber = row_data.get("viitenumber", "")
-    isiku_registrikood = row_data.get("isiku_registrikood", "")
-    db_record = None
-
-    # Priority: 1) by final toimiku_nr, 2) by viitenumber, 3) by registrikood
-    if toimiku_nr_loplik and toimiku_nr_loplik in db_info["by_toimiku"]:
-        db_record = db_info["by_toimiku"][toimiku_nr_loplik]
-    elif viitenumber and viitenumber in db_info["by_viitenumber"]:
-        db_record = db_info["by_viitenumber"][viitenumber]
-    elif isiku_registrikood and isiku_registrikood in db_info["by_registrikood"]:
-        db_record = db_info["by_registrikood"][isiku_registrikood]
-
-    # Fill in database fields
-    if db_record:
-        row_data["nimi_baasis"] = db_record.get("võlgnik", "")
-        row_data["noude_sisu"] = db_record.get("nõude_sisu", "")
-        row_data["toimiku_jaak"] = db_record.get("võla_jääk", 0.0)
-        row_data["staatus_baasis"] = db_record.get("staatus", "")
-        row_data["em_markus"] = db_record.get("rmp_märkused", "")
-        row_data["toimiku_markused"] = db_record.get("märkused", "")
-
-        # Get aggregates for this võlgnik
-        volgnik_name = db_record.get("võlgnik", "")
-        if volgnik_name and volgnik_name in aggregates:
-            row_data["toimikute_arv"] = aggregates[volgnik_name]["count"]
-            row_data["toimikute_jaakide_summa"] = aggregates[volgnik_name]["sum"]
-        else:
-            row_data["toimikute_arv"] = 0
-            row_data["toimikute_jaakide_summa"] = 0.0
-
-        # Calculate Vahe (difference between database balance and CSV amount)
-        csv_summa = safe_number_conversion(row_data.get("summa", 0))
-        db_jaak = safe_number_conversion(db_record.get("võla_jääk", 0))
-        row_data["vahe"] = db_jaak - csv_summa
-    else:
-        # No database record found
-        row_data["nimi_baasis"] = ""
-        row_data["noude_sisu"] = ""
-        row_data["toimiku_jaak"] = 0.0
-        row_data["staatus_baasis"] = ""
-        row_data["em_markus"] = ""
-        row_data["toimiku_markused"] = ""
-        row_data["toimikute_arv"] = 0
-        row_data["toimikute_jaakide_summa"] = 0.0
-        row_data["vahe"] = 0.0
-
-    # Add payment statistics based on "Toimiku nr selgituses"
-    toimiku_selgituses = row_data.get("toimiku_nr_selgituses", "")
-    if toimiku_selgituses and toimiku_selgituses in payment_stats:
-        row_data["laekumiste_arv"] = payment_stats[toimiku_selgituses]["count"]
-        # Format the total back to Estonian format for display
-        total_amount = payment_stats[toimiku_selgituses]["total"]
-        if isinstance(total_amount, (int, float)):
-            # Convert back to Estonian format (comma as decimal separator)
-            row_data["laekumised_kokku"] = str(total_amount).replace('.', ',')
-        else:
-            row_data["laekumised_kokku"] = str(total_amount)
-    else:
-        row_data["laekumiste_arv"] = 1  # Current row counts as 1
-        row_data["laekumised_kokku"] = row_data.get("summa", "")
-
-    return row_data
+    try:
+        # The request's session is closed before a streaming body is sent, so use a dedicated one
+        async with get_db_context() as db:
+            async for record in iter_konto_vv_records(db, file_path, folder_name, encoding):
+                yield ndjson_line(record)
+    except Exception as e:
+        logger.exception(f"Error streaming Koondaja CSV import: {str(e)}")
+        yield ndjson_line({"type": "error", "detail": f"Unexpected error importing CSV: {str(e)}"})
 
 
 @router.get("/browse-koondaja-folder")
@@ -545,152 +556,124 @@ async def list_koondaja_files(
         raise HTTPException(status_code=500, detail=f"Error listing files: {str(e)}")
 
 
-@router.post("/import-koondaja-csv")
-async def import_koondaja_csv(
-        request: Request,
-        db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(get_current_active_user)
-):
-    """Import CSV file for Koondaja data with new column structure"""
-    try:
-        body = await request.json()
-        file_path = body.get('file_path')
-        folder_name = body.get('folder_name')
+def resolve_import_file(body: Dict[str, Any]) -> Tuple[str, str]:
+    """Validated file path and folder name of an import request"""
+    file_path = body.get('file_path')
+    folder_name = body.get('folder_name')
 
-        if not file_path:
-            raise HTTPException(status_code=400, detail="File path is required")
+    if not file_path:
+        raise HTTPException(status_code=400, detail="File path is required")
 
-        logger.info(f"Attempting to import Koondaja CSV file: {file_path}")
+    logger.info(f"Attempting to import Koondaja CSV file: {file_path}")
 
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
+    if not os.path.exists(file_path):
+        raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
 
-        if not os.path.isfile(file_path):
-            raise HTTPException(status_code=400, detail=f"Path is not a file: {file_path}")
+    if not os.path.isfile(file_path):
+        raise HTTPException(status_code=400, detail=f"Path is not a file: {file_path}")
 
-        if not folder_name:
-            folder_name = os.path.basename(os.path.dirname(file_path))
-        logger.info(f"Processing file from folder: {folder_name}")
+    if not folder_name:
+        folder_name = os.path.basename(os.path.dirname(file_path))
+    logger.info(f"Processing file from folder: {folder_name}")
 
-        # Skip if not Konto vv
-        if folder_name.lower() != "konto vv":
-            logger.info(f"Skipping folder '{folder_name}' - not implemented yet")
-            return {
-                "success": True,
-                "message": f"Folder '{folder_name}' processing not implemented yet",
-                "data": [],
-                "folder_type": folder_name.lower(),
-                "valid_rows": 0
-            }
+    return file_path, folder_name
 
-        data = []
 
-        # Try different encodings
-        encodings = ['utf-8-sig', 'utf-8', 'windows-1252', 'iso-8859-15', 'cp1257']
-        content = None
-        used_encoding = None
+def skipped_folder_result(folder_name: str) -> Dict[str, Any]:
+    """Import result of a folder without a processor"""
+    logger.info(f"Skipping folder '{folder_name}' - not implemented yet")
+    return {
+        "success": True,
+        "message": f"Folder '{folder_name}' processing not implemented yet",
+        "data": [],
+        "folder_type": folder_name.lower(),
+        "valid_rows": 0
+    }
 
-        for encoding in encodings:
-            try:
-                with open(file_path, 'r', encoding=encoding) as csvfile:
-                    content = csvfile.read()
-                    used_encoding = encoding
-                    logger.info(f"Successfully read file with encoding: {encoding}")
-                    break
-            except UnicodeDecodeError:
-                continue
-
-        if content is None:
-            raise HTTPException(status_code=400, detail="Unable to decode file with supported encodings")
-
-        if not content.strip():
-            raise HTTPException(status_code=400, detail="File is empty")
-
-        # First pass: collect all toimiku numbers, viitenumbers, and registrikoodid for database lookup
-        lines = content.split('\n')
-        csv_reader = csv.reader(lines, delimiter=';')
-
-        all_toimiku_numbers = []
-        all_viitenumbers = []
-        all_registrikoodid = []
-        all_rows = []
-        payment_stats = defaultdict(lambda: {"count": 0, "total": 0.0})
-
-        for row in csv_reader:
-            if not row or len(row) < 10:
-                continue
-
-            # Clean row data
-            cleaned_row = [str(field).strip() if field is not None else "" for field in row]
-
-            # Only process rows where S/V = 'C'
-            if len(cleaned_row) > 7 and cleaned_row[7] == 'C':
-                all_rows.append(cleaned_row)
-
-                # Extract toimiku number from selgitus
-                if len(cleaned_row) > 11:
-                    toimiku_num = extract_toimiku_number(cleaned_row[11])
-                    if toimiku_num:
-                        all_toimiku_numbers.append(toimiku_num)
-
-                # Get viitenumber
-                if len(cleaned_row) > 9 and cleaned_row[9]:
-                    all_viitenumbers.append(cleaned_row[9])
-
-                # Get registrikood
-                if len(cleaned_row) > 14 and cleaned_row[14]:
-                    all_registrikoodid.append(cleaned_row[14])
-
-                # Calculate payment statistics
-                identifier = None
-                if len(cleaned_row) > 9 and cleaned_row[9]:  # viitenumber
-                    identifier = cleaned_row[9]
-                elif len(cleaned_row) > 11:  # toimiku from selgitus
-                    identifier = extract_toimiku_number(cleaned_row[11])
-
-                if identifier and len(cleaned_row) > 8:
-                    payment_amount = safe_number_conversion(cleaned_row[8], 0.0)
-                    payment_stats[identifier]["count"] += 1
-                    payment_stats[identifier]["total"] += payment_amount
-
-        # Get all database info at once
-        db_info = await get_database_info(db, all_toimiku_numbers, all_viitenumbers, all_registrikoodid)
-
-        # Get aggregates
-        temp_rows = []
-        for row in all_rows:
-            temp_data = process_konto_vv_row(row, 0, db_info, {}, {})
-            if temp_data:
-                temp_rows.append(temp_data)
-
-        aggregates = await calculate_aggregates(db, temp_rows)
-
-        # Process each row with all the data
-        row_count = 0
-        processed_rows = 0
 
-        for row_num, row in enumerate(all_rows, start=1):
-            row_count += 1
+def detect_import_encoding(file_path: str) -> str:
+    """Encoding of an import file from a byte prefix - the file itself is parsed incrementally"""
+    used_encoding = detect_encoding(file_path)
+    if used_encoding is None:
+        raise HTTPException(status_code=400, detail="Unable to decode file with supported encodings")
+    logger.info(f"Detected encoding: {used_encoding}")
 
-            row_data = process_konto_vv_row(row, row_num, db_info, aggregates, dict(payment_stats))
+    if os.path.getsize(file_path) == 0:
+        raise HTTPException(status_code=400, detail="File is empty")
 
-            if row_data:
-                data.append(row_data)
-                processed_rows += 1
+    return used_encoding
 
-        logger.info(
-            f"Successfully processed {processed_rows} out of {row_count} rows from {os.path.basename(file_path)}")
 
-        return {
-            "success": True,
-            "message": f"Successfully imported {len(data)} rows from {os.path.basename(file_path)}",
-            "data": data,
-            "folder_type": folder_name.lower(),
-            "encoding_used": used_encoding,
-            "total_rows_processed": row_count,
-            "valid_rows": len(data),
-            "columns": KOONDAJA_COLUMNS  # Send column definitions to frontend
-        }
+async def import_konto_vv_file(
+        db: AsyncSession,
+        file_path: str,
+        folder_name: str,
+        encoding: str,
+        job: Optional[JobContext] = None
+) -> Dict[str, Any]:
+    """Full Konto vv import result as a single document"""
+    data = []
+    summary: Dict[str, Any] = {}
+    async for record in iter_konto_vv_records(db, file_path, folder_name, encoding, job):
+        if record["type"] == "rows":
+            data.extend(record["rows"])
+        elif record["type"] == "summary":
+            summary = record
+
+    return {
+        "success": True,
+        "message": summary["message"],
+        "data": data,
+        "folder_type": folder_name.lower(),
+        "encoding_used": encoding,
+        "total_rows_processed": summary["total_rows_processed"],
+        "valid_rows": len(data),
+        "columns": KOONDAJA_COLUMNS  # Send column definitions to frontend
+    }
+
+
+async def run_koondaja_import_job(job: JobContext, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Background job: the /import-koondaja-csv result for params {file_path, folder_name}"""
+    file_path, folder_name = resolve_import_file(params)
+    if folder_name.lower() != "konto vv":
+        return skipped_folder_result(folder_name)
+
+    encoding = detect_import_encoding(file_path)
+    await job.progress(None, f"Reading {os.path.basename(file_path)}")
+
+    # Jobs outlive the request, so they use their own session
+    async with get_db_context() as db:
+        return await import_konto_vv_file(db, file_path, folder_name, encoding, job)
+
+
+job_queue.register("koondaja_import", run_koondaja_import_job, concurrency=KOONDAJA_IMPORT_JOBS)
+
+
+@router.post("/import-koondaja-csv")
+async def import_koondaja_csv(
+        request: Request,
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_active_user)
+):
+    """Import CSV file for Koondaja data with new column structure (format=ndjson streams the rows)"""
+    try:
+        body = await request.json()
+        file_path, folder_name = resolve_import_file(body)
+
+        # Skip if not Konto vv
+        if folder_name.lower() != "konto vv":
+            return skipped_folder_result(folder_name)
+
+        used_encoding = detect_import_encoding(file_path)
+
+        # Streaming mode: header, row batches and summary as NDJSON records
+        if wants_ndjson(request, body.get('format')):
+            return StreamingResponse(
+                stream_konto_vv_import(file_path, folder_name, used_encoding),
+                media_type=NDJSON_MEDIA_TYPE
+            )
+
+        return await import_konto_vv_file(db, file_path, folder_name, used_encoding)
 
     except HTTPException:
         raise
@@ -710,6 +693,7 @@ async def fetch_koondaja_columns(
         body = await request.json()
         toimiku_numbers = body.get('toimiku_numbers', [])
         fields = body.get('fields', [])
+        columnar = wants_columnar(request, body.get('format'))
 
         if not toimiku_numbers or not fields:
             return {
@@ -717,6 +701,11 @@ async def fetch_koondaja_columns(
                 "data": []
             }
 
+        # Field names end up in the SQL text, so only known columns are allowed
+        unknown = [field for field in fields if not schema_registry.has_column(field)]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}")
+
         # Build query to fetch requested fields
         field_list = ', '.join([f'"{field}"' for field in fields])
         placeholders = ', '.join([f':tn_{i}' for i in range(len(toimiku_numbers))])
@@ -733,18 +722,14 @@ async def fetch_koondaja_columns(
         result = await db.execute(text(query), params)
         rows = result.fetchall()
 
-        # Convert to list of dicts
-        data = []
-        for row in rows:
-            row_dict = {}
-            for key in row._mapping.keys():
-                value = row._mapping[key]
-                # Handle datetime objects
-                if hasattr(value, 'isoformat'):
-                    row_dict[str(key)] = value.isoformat()
-                else:
-                    row_dict[str(key)] = value
-            data.append(row_dict)
+        if columnar:
+            logger.info(f"Fetched {len(rows)} rows with additional columns")
+            return {
+                "success": True,
+                "columns": rows_to_columnar(result.keys(), rows)
+            }
+
+        data = materialize_rows(result.keys(), rows)
 
         logger.info(f"Fetched {len(data)} rows with additional columns")
 
@@ -753,6 +738,8 @@ async def fetch_koondaja_columns(
             "data": data
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"Error fetching Koondaja columns: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching columns: {str(e)}")
@@ -1,5 +1,5 @@
 # app/api/v1/endpoints/table.py
-import csv
+import asyncio
 import datetime
 import json
 import logging
@@ -13,28 +13,43 @@ import traceback
 import uuid
 from datetime import date
 from datetime import datetime
-from io import StringIO
 from typing import Optional
 
 import orjson
 from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi import Query, Response, Form
+from fastapi.responses import StreamingResponse
 from sqlalchemy import or_
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session  # Add this import
 
-from app.api.dependencies import get_current_active_user
-from app.core.cache import get_cache, set_cache
-from app.core.db import get_db
+from app.api.dependencies import get_current_active_user, get_current_admin_user
+from app.core.cache import get_cache, set_cache, get_data_version, single_flight
+from app.core.db import get_db, get_db_context, get_dialect_name, refresh_schema, table_fingerprint
+from app.core.jobs import JobContext, job_queue
+from app.core.schema_registry import schema_registry
 from app.core.user_db import get_user_db
 from app.models.saved_filter import SavedFilter
 from app.models.table import BigTable
 from app.models.user import User
+from app.services.block_cache import (
+    BLOCK_CACHE_TTL, ESTIMATE_BLOCK_CACHE_TTL, block_cache_key, cache_block, get_cached_block
+)
+from app.services.csv_stream import detect_encoding, iter_csv_rows, sniff_delimiter
 from app.services.edit_service import (
     verify_edit_permission, get_editable_columns, update_cell_value,
     get_session_changes, undo_change, check_for_changes
 )
+from app.services.export_service import EXPORT_FORMATS, encode_export, missing_dependency, stream_batches
+from app.services.filter_compiler import compile_filter_model, build_search_clause
+from app.services.index_advisor import index_advisor
+from app.services.pagination import (
+    KEY_COLUMN, normalize_sort, build_order_by, build_seek_clause, encode_cursor, decode_cursor
+)
+from app.services.row_count import get_row_count
+from app.services.row_materializer import materialize_rows
+from app.services.wire_format import COLUMNAR_MEDIA_TYPE, rows_to_columnar, wants_columnar
 
 # Make sure these are imported for the Koondaja functionality
 
@@ -44,6 +59,31 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/table", tags=["table"])
 
+# Background jobs run at once per worker process (LibreOffice cannot convert concurrently)
+PDF_CONVERSION_JOBS = 1
+DOCUMENT_JOBS = 2
+
+
+def build_select_list(columns: Optional[str], sort_field: Optional[str]) -> str:
+    """Build the SELECT list for a comma separated column projection ("*" when none is requested)"""
+    if not columns:
+        return "*"
+
+    requested = [name.strip() for name in columns.split(",") if name.strip()]
+    unknown = [name for name in requested if not schema_registry.has_column(name)]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}")
+
+    # The key and sort columns are needed for row identity and the next cursor
+    selected = [KEY_COLUMN]
+    if sort_field:
+        selected.append(sort_field)
+    for name in requested:
+        if name not in selected:
+            selected.append(name)
+
+    return ", ".join(f'"{name}"' for name in selected)
+
 
 @router.get("/data")
 async def get_table_data(
@@ -54,443 +94,237 @@ async def get_table_data(
         sort_field: Optional[str] = None,
         sort_dir: Optional[str] = None,
         filter_model: Optional[str] = None,
+        after: Optional[str] = None,
+        columns: Optional[str] = None,
+        response_format: Optional[str] = Query(None, alias="format"),
         db: AsyncSession = Depends(get_db)
 ):
     """
-    Get paginated table data with filtering and sorting
+    Get paginated table data with filtering and sorting.
+
+    Pass the previous response's nextCursor as ``after`` to seek past the last
+    row instead of using OFFSET, which keeps deep pages as fast as the first one.
+    Pass a comma separated ``columns`` list to only read and return those columns
+    (the id and the sort column are always included). ``format=columnar`` or an
+    Accept header of application/vnd.bigtable.columnar+json returns the block as
+    {"fields": [...], "values": [[...], ...]} under "columns" instead of rowData.
     """
     start_time = time.time()
     try:
-        # Detect database type
-        from app.core.db import is_using_local_db
-        using_sqlite = is_using_local_db()
+        # Compile the filter model; the SQL for a given filter shape is built once and cached
+        dialect = get_dialect_name()
+        try:
+            filter_plan, query_params = compile_filter_model(filter_model, dialect)
+        except ValueError as e:
+            # Best effort filtering - an unreadable filter model means no filters
+            logger.error(f"Error processing filter model: {str(e)}")
+            filter_plan, query_params = compile_filter_model(None, dialect)
+
+        # Global search goes through the trigram/FTS5 search index when one is available
+        where_clauses = list(filter_plan.clauses)
+        search_clause = build_search_clause(search, dialect, query_params)
+        if search_clause:
+            where_clauses.append(search_clause)
+        where_sql = f" WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+        logger.debug(f"Filter plan {filter_plan.key}: {where_sql} {query_params}")
+
+        # Sort order always ends with the id tiebreaker so every page boundary is a unique seek key
+        if sort_field and not schema_registry.is_sortable(sort_field):
+            raise HTTPException(status_code=400, detail=f"Cannot sort by column: {sort_field}")
+        sort_field, sort_direction = normalize_sort(sort_field, sort_dir)
+        index_advisor.record(sort_field, "sort_desc" if sort_direction == "DESC" else "sort")
+        page_size = end_row - start_row
+        columnar = wants_columnar(request, response_format)
+        media_type = COLUMNAR_MEDIA_TYPE if columnar else "application/json"
+
+        # Serve the encoded block from Redis if nothing changed since it was built
+        block_key = await block_cache_key(
+            await get_data_version(), await table_fingerprint(db), filter_plan.key, query_params,
+            sort_field=sort_field, sort_dir=sort_direction, start_row=start_row, end_row=end_row,
+            after=after, columns=columns, search=search, columnar=columnar
+        )
+        cached_body = await get_cached_block(block_key)
+        if cached_body is not None:
+            logger.info(f"Block cache hit for rows {start_row}-{end_row} in {time.time() - start_time:.3f}s")
+            return Response(content=cached_body, media_type=media_type, headers={"Vary": "Accept"})
+
+        async def build_block() -> bytes:
+            """Run the count and page queries and encode the response body"""
+            # Cached exact count, or a planner estimate while the exact count runs in the background
+            total_rows, row_count_exact = await get_row_count(db, filter_plan.key, where_sql, query_params)
+
+            # Keyset mode: continue right after the cursor row instead of skipping start_row rows
+            data_clauses = list(where_clauses)
+            data_params = dict(query_params)
+            if after:
+                try:
+                    cursor_value, cursor_id = decode_cursor(after, sort_field, sort_direction)
+                except ValueError as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+                data_clauses.append(build_seek_clause(sort_field, sort_direction, cursor_value, cursor_id, data_params))
+
+            # Build and execute data query with sorting and pagination
+            select_list = build_select_list(columns, sort_field)
+            data_sql = f'SELECT {select_list} FROM "{BigTable.name}"'
+            if data_clauses:
+                data_sql += f" WHERE {' AND '.join(data_clauses)}"
+            data_sql += build_order_by(sort_field, sort_direction)
+
+            # Add pagination
+            data_params["limit"] = page_size
+            if after:
+                data_sql += ' LIMIT :limit'
+            else:
+                data_sql += ' LIMIT :limit OFFSET :offset'
+                data_params["offset"] = start_row
 
-        # Build SQL query components
-        where_clauses = []
-        query_params = {}
+            # Execute data query
+            result = await db.execute(text(data_sql), data_params)
+            rows = result.fetchall()
 
-        # Get column data types for proper type conversion - cache this to improve performance
-        column_types = {}
-        try:
-            if using_sqlite:
-                # Get column types from SQLite
-                schema_query = "PRAGMA table_info('taitur_data')"
-                schema_result = await db.execute(text(schema_query))
-
-                for row in schema_result:
-                    column_name = row[1]  # name is at index 1
-                    data_type = row[2]  # type is at index 2
-                    column_types[column_name] = {
-                        "data_type": data_type.lower(),
-                        "udt_name": data_type.lower()
-                    }
+            # A full page means there may be more rows - hand out a cursor for the next block
+            next_cursor = None
+            if rows and len(rows) == page_size:
+                last_row = rows[-1]._mapping
+                next_cursor = encode_cursor(
+                    sort_field,
+                    sort_direction,
+                    last_row[sort_field] if sort_field else None,
+                    last_row[KEY_COLUMN]
+                )
+
+            # Create response with row count info
+            response_data = {
+                "rowCount": total_rows,
+                "rowCountExact": row_count_exact,
+                "startRow": start_row,
+                "endRow": start_row + len(rows),
+                "nextCursor": next_cursor
+            }
+
+            if columnar:
+                # Field names once, one value array per column
+                response_data["columns"] = rows_to_columnar(result.keys(), rows)
             else:
-                # Get table column information including data types from PostgreSQL
-                schema_query = """
-                    SELECT column_name, data_type, udt_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = :table_name
-                """
-                schema_result = await db.execute(text(schema_query), {"table_name": BigTable.name})
-
-                for row in schema_result:
-                    column_name = row[0]
-                    data_type = row[1]
-                    udt_name = row[2]
-                    column_types[column_name] = {
-                        "data_type": data_type,
-                        "udt_name": udt_name
-                    }
+                # Row dicts with native datetimes - orjson encodes them itself
+                response_data["rowData"] = materialize_rows(result.keys(), rows)
 
-            logger.info(f"Retrieved column types: {column_types}")
-        except Exception as e:
-            logger.error(f"Error getting column types: {str(e)}")
-            # Continue without type information - we'll try to guess types
+            logger.info(f"Query returned {len(rows)} rows out of {total_rows} total in {time.time() - start_time:.3f}s")
 
-        # Log received filter model for debugging
-        logger.info(f"Received filter_model: {filter_model}")
+            # Encode once with orjson; blocks with an estimated count only live briefly
+            body = orjson.dumps(response_data)
+            await cache_block(block_key, body, BLOCK_CACHE_TTL if row_count_exact else ESTIMATE_BLOCK_CACHE_TTL)
+            return body
 
-        # Add search filters if provided
-        if filter_model:
-            try:
-                # Parse the filter model
-                try:
-                    filters = json.loads(filter_model)
-                    logger.info(f"Successfully parsed filter_model: {filters}")
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON in filter_model: {filter_model}")
-                    raise ValueError("Invalid filter model format")
-
-                # Process each filter
-                filter_idx = 0
-                for field, filter_config in filters.items():
-                    filter_type = filter_config.get('type')
-                    filter_value = filter_config.get('filter')
-
-                    logger.info(f"Processing filter: field={field}, type={filter_type}, value={filter_value}")
-
-                    # Skip if field doesn't exist in the table
-                    if field not in column_types and field != "id":  # Always allow "id"
-                        logger.warning(f"Field {field} not found in table schema, skipping filter")
-                        continue
+        # Identical concurrent requests (same plan, sort, block) share one database round trip
+        body = await single_flight(block_key, build_block, lambda: get_cached_block(block_key))
 
-                    # Determine the appropriate cast expression based on DB type
-                    cast_expr = "" if using_sqlite else "::text"
+        return Response(
+            content=body,
+            media_type=media_type,
+            headers={"Vary": "Accept"}
+        )
 
-                    try:
-                        # Handle each filter type with better type handling
-                        if filter_type == 'contains':
-                            param_name = f"filter_{filter_idx}"
-                            where_clauses.append(f'"{field}"{cast_expr} LIKE :{param_name}')
-                            query_params[param_name] = f"%{filter_value}%"
-                            filter_idx += 1
-
-                        elif filter_type == 'notContains':
-                            param_name = f"filter_{filter_idx}"
-                            where_clauses.append(f'("{field}" IS NULL OR "{field}"{cast_expr} NOT LIKE :{param_name})')
-                            query_params[param_name] = f"%{filter_value}%"
-                            filter_idx += 1
-
-                        elif filter_type == 'equals':
-                            param_name = f"filter_{filter_idx}"
-                            where_clauses.append(f'"{field}" = :{param_name}')
-
-                            # Try to convert values based on column type
-                            col_type_info = column_types.get(field, {})
-                            col_type = col_type_info.get("data_type", "").lower()
-
-                            # Handle numeric types
-                            if field == "id" or col_type in ("integer", "int", "bigint", "smallint"):
-                                try:
-                                    query_params[param_name] = int(filter_value)
-                                except (ValueError, TypeError):
-                                    query_params[param_name] = filter_value
-                            elif col_type in ("numeric", "decimal", "real", "double", "float"):
-                                try:
-                                    query_params[param_name] = float(filter_value)
-                                except (ValueError, TypeError):
-                                    query_params[param_name] = filter_value
-                            # Handle date types
-                            elif col_type in ("date", "timestamp"):
-                                query_params[param_name] = filter_value
-                            else:
-                                query_params[param_name] = filter_value
-
-                            filter_idx += 1
-
-                        elif filter_type == 'notEqual':
-                            param_name = f"filter_{filter_idx}"
-                            where_clauses.append(f'("{field}" IS NULL OR "{field}" != :{param_name})')
-
-                            # Type conversion similar to equals
-                            col_type_info = column_types.get(field, {})
-                            col_type = col_type_info.get("data_type", "").lower()
-
-                            if field == "id" or col_type in ("integer", "int", "bigint", "smallint"):
-                                try:
-                                    query_params[param_name] = int(filter_value)
-                                except (ValueError, TypeError):
-                                    query_params[param_name] = filter_value
-                            elif col_type in ("numeric", "decimal", "real", "double", "float"):
-                                try:
-                                    query_params[param_name] = float(filter_value)
-                                except (ValueError, TypeError):
-                                    query_params[param_name] = filter_value
-                            else:
-                                query_params[param_name] = filter_value
-
-                            filter_idx += 1
-
-                        elif filter_type == 'startsWith':
-                            param_name = f"filter_{filter_idx}"
-                            where_clauses.append(f'"{field}"{cast_expr} LIKE :{param_name}')
-                            query_params[param_name] = f"{filter_value}%"
-                            filter_idx += 1
-
-                        elif filter_type == 'endsWith':
-                            param_name = f"filter_{filter_idx}"
-                            where_clauses.append(f'"{field}"{cast_expr} LIKE :{param_name}')
-                            query_params[param_name] = f"%{filter_value}"
-                            filter_idx += 1
-
-                        elif filter_type == 'notBlank':
-                            # Improved notBlank filter to correctly filter out ALL types of blank values
-                            if using_sqlite:
-                                # SQLite implementation - more robust check including whitespace-only strings
-                                where_clauses.append(
-                                    f'("{field}" IS NOT NULL AND "{field}" != "" AND TRIM("{field}") != "")')
-                                logger.info(f"Added improved notBlank filter for {field} using SQLite syntax")
-                            else:
-                                # PostgreSQL implementation - handle all types of blank values and type-specific checks
-                                col_type_info = column_types.get(field, {})
-                                col_type = col_type_info.get("data_type", "").lower()
-                                if col_type in (
-                                        "integer", "int", "bigint", "smallint", "numeric", "decimal", "real", "double",
-                                        "float"):
-                                    # For numeric types, IS NOT NULL is sufficient
-                                    where_clauses.append(f'"{field}" IS NOT NULL')
-                                elif col_type in ("date", "timestamp", "timestamp with time zone"):
-                                    # For date/timestamp types, IS NOT NULL is sufficient
-                                    where_clauses.append(f'"{field}" IS NOT NULL')
-                                else:
-                                    # For string and other types, check NULL, empty string, and whitespace-only
-                                    where_clauses.append(
-                                        f'("{field}" IS NOT NULL AND "{field}"::text != \'\' AND TRIM(COALESCE("{field}"::text, \'\')) != \'\')')
-                                logger.info(
-                                    f"Added improved notBlank filter for {field} using PostgreSQL syntax for type {col_type}")
-
-                        elif filter_type == 'blank':
-                            # Improved blank filter to correctly match ALL types of blank values
-                            if using_sqlite:
-                                # SQLite implementation - including whitespace-only strings
-                                where_clauses.append(f'("{field}" IS NULL OR "{field}" = "" OR TRIM("{field}") = "")')
-                                logger.info(f"Added improved blank filter for {field} using SQLite syntax")
-                            else:
-                                # PostgreSQL implementation - type-specific handling
-                                col_type_info = column_types.get(field, {})
-                                col_type = col_type_info.get("data_type", "").lower()
-
-                                if col_type in (
-                                        "integer", "int", "bigint", "smallint", "numeric", "decimal", "real", "double",
-                                        "float"):
-                                    # For numeric types, IS NULL is sufficient
-                                    where_clauses.append(f'"{field}" IS NULL')
-                                elif col_type in ("date", "timestamp", "timestamp with time zone"):
-                                    # For date/timestamp types, IS NULL is sufficient
-                                    where_clauses.append(f'"{field}" IS NULL')
-                                else:
-                                    # For string and other types, check NULL, empty string, and whitespace-only
-                                    where_clauses.append(
-                                        f'("{field}" IS NULL OR "{field}"::text = \'\' OR TRIM(COALESCE("{field}"::text, \'\')) = \'\')')
-
-                                logger.info(
-                                    f"Added improved blank filter for {field} using PostgreSQL syntax for type {col_type}")
-
-                        elif filter_type == 'greaterThan':
-                            param_name = f"filter_{filter_idx}"
-                            where_clauses.append(f'"{field}" > :{param_name}')
-
-                            # Type conversion
-                            col_type_info = column_types.get(field, {})
-                            col_type = col_type_info.get("data_type", "").lower()
-
-                            if col_type in ("integer", "int", "bigint", "smallint"):
-                                try:
-                                    query_params[param_name] = int(filter_value)
-                                except (ValueError, TypeError):
-                                    query_params[param_name] = filter_value
-                            elif col_type in ("numeric", "decimal", "real", "double", "float"):
-                                try:
-                                    query_params[param_name] = float(filter_value)
-                                except (ValueError, TypeError):
-                                    query_params[param_name] = filter_value
-                            else:
-                                query_params[param_name] = filter_value
-
-                            filter_idx += 1
-
-                        elif filter_type == 'greaterThanOrEqual':
-                            param_name = f"filter_{filter_idx}"
-                            where_clauses.append(f'"{field}" >= :{param_name}')
-
-                            # Type conversion
-                            col_type_info = column_types.get(field, {})
-                            col_type = col_type_info.get("data_type", "").lower()
-
-                            if col_type in ("integer", "int", "bigint", "smallint"):
-                                try:
-                                    query_params[param_name] = int(filter_value)
-                                except (ValueError, TypeError):
-                                    query_params[param_name] = filter_value
-                            elif col_type in ("numeric", "decimal", "real", "double", "float"):
-                                try:
-                                    query_params[param_name] = float(filter_value)
-                                except (ValueError, TypeError):
-                                    query_params[param_name] = filter_value
-                            else:
-                                query_params[param_name] = filter_value
-
-                            filter_idx += 1
-
-                        elif filter_type == 'lessThan':
-                            param_name = f"filter_{filter_idx}"
-                            where_clauses.append(f'"{field}" < :{param_name}')
-
-                            # Type conversion
-                            col_type_info = column_types.get(field, {})
-                            col_type = col_type_info.get("data_type", "").lower()
-
-                            if col_type in ("integer", "int", "bigint", "smallint"):
-                                try:
-                                    query_params[param_name] = int(filter_value)
-                                except (ValueError, TypeError):
-                                    query_params[param_name] = filter_value
-                            elif col_type in ("numeric", "decimal", "real", "double", "float"):
-                                try:
-                                    query_params[param_name] = float(filter_value)
-                                except (ValueError, TypeError):
-                                    query_params[param_name] = filter_value
-                            else:
-                                query_params[param_name] = filter_value
-
-                            filter_idx += 1
-
-                        elif filter_type == 'lessThanOrEqual':
-                            param_name = f"filter_{filter_idx}"
-                            where_clauses.append(f'"{field}" <= :{param_name}')
-
-                            # Type conversion
-                            col_type_info = column_types.get(field, {})
-                            col_type = col_type_info.get("data_type", "").lower()
-
-                            if col_type in ("integer", "int", "bigint", "smallint"):
-                                try:
-                                    query_params[param_name] = int(filter_value)
-                                except (ValueError, TypeError):
-                                    query_params[param_name] = filter_value
-                            elif col_type in ("numeric", "decimal", "real", "double", "float"):
-                                try:
-                                    query_params[param_name] = float(filter_value)
-                                except (ValueError, TypeError):
-                                    query_params[param_name] = filter_value
-                            else:
-                                query_params[param_name] = filter_value
-
-                            filter_idx += 1
-
-                        elif filter_type == 'inRange' and isinstance(filter_value, dict):
-                            from_value = filter_value.get('from')
-                            to_value = filter_value.get('to')
-
-                            # Type conversion
-                            col_type_info = column_types.get(field, {})
-                            col_type = col_type_info.get("data_type", "").lower()
-
-                            # Only add range conditions if values are provided
-                            if from_value is not None and from_value != "":
-                                param_name = f"filter_{filter_idx}"
-                                where_clauses.append(f'"{field}" >= :{param_name}')
-
-                                if col_type in ("integer", "int", "bigint", "smallint"):
-                                    try:
-                                        query_params[param_name] = int(from_value)
-                                    except (ValueError, TypeError):
-                                        query_params[param_name] = from_value
-                                elif col_type in ("numeric", "decimal", "real", "double", "float"):
-                                    try:
-                                        query_params[param_name] = float(from_value)
-                                    except (ValueError, TypeError):
-                                        query_params[param_name] = from_value
-                                elif col_type in ("date", "timestamp"):
-                                    query_params[param_name] = from_value
-                                else:
-                                    query_params[param_name] = from_value
-
-                                filter_idx += 1
-
-                            if to_value is not None and to_value != "":
-                                param_name = f"filter_{filter_idx}"
-                                where_clauses.append(f'"{field}" <= :{param_name}')
-
-                                if col_type in ("integer", "int", "bigint", "smallint"):
-                                    try:
-                                        query_params[param_name] = int(to_value)
-                                    except (ValueError, TypeError):
-                                        query_params[param_name] = to_value
-                                elif col_type in ("numeric", "decimal", "real", "double", "float"):
-                                    try:
-                                        query_params[param_name] = float(to_value)
-                                    except (ValueError, TypeError):
-                                        query_params[param_name] = to_value
-                                elif col_type in ("date", "timestamp"):
-                                    query_params[param_name] = to_value
-                                else:
-                                    query_params[param_name] = to_value
-
-                                filter_idx += 1
-
-                        else:
-                            logger.warning(f"Unsupported filter type: {filter_type}")
-
-                        logger.info(f"Successfully processed filter: {field} {filter_type}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error getting table data: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-                    except Exception as e:
-                        logger.error(f"Error processing specific filter '{field}' with type '{filter_type}': {str(e)}")
-                        logger.error(traceback.format_exc())
-                        # Continue with other filters but log the error
 
-            except Exception as e:
-                logger.error(f"Error processing filter model: {str(e)}", exc_info=True)
-                # Continue without failing - best effort filtering
+@router.get("/count")
+async def get_table_count(
+        filter_model: Optional[str] = None,
+        search: Optional[str] = None,
+        db: AsyncSession = Depends(get_db)
+):
+    """
+    Get the exact row count for a filter model and search term.
 
-            # After processing filters, log complete SQL info
-            if where_clauses:
-                logger.info(f"Final WHERE clauses: {where_clauses}")
-                logger.info(f"Final query params: {query_params}")
+    The grid calls this after /data answered with an estimate (rowCountExact=false);
+    it returns immediately once the background count has been cached.
+    """
+    try:
+        try:
+            dialect = get_dialect_name()
+            filter_plan, query_params = compile_filter_model(filter_model, dialect)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        where_clauses = list(filter_plan.clauses)
+        search_clause = build_search_clause(search, dialect, query_params)
+        if search_clause:
+            where_clauses.append(search_clause)
+        where_sql = f" WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+
+        total_rows, row_count_exact = await get_row_count(
+            db, filter_plan.key, where_sql, query_params, allow_estimate=False
+        )
+        return {"rowCount": total_rows, "rowCountExact": row_count_exact}
 
-        # Combine WHERE clauses
-        where_sql = ""
-        if where_clauses:
-            where_sql = f" WHERE {' AND '.join(where_clauses)}"
-
-        # Log the final SQL for debugging
-        logger.info(f"WHERE clause: {where_sql}")
-        logger.info(f"Query params: {query_params}")
-
-        # Build and execute count query
-        count_sql = f'SELECT COUNT(*) FROM "{BigTable.name}"{where_sql}'
-        count_result = await db.execute(text(count_sql), query_params)
-        total_rows = count_result.scalar() or 0
-
-        # Build and execute data query with sorting and pagination
-        data_sql = f'SELECT * FROM "{BigTable.name}"{where_sql}'
-        if sort_field:
-            sort_direction = "DESC" if sort_dir and sort_dir.lower() == "desc" else "ASC"
-            data_sql += f' ORDER BY "{sort_field}" {sort_direction}'
-        else:
-            data_sql += ' ORDER BY 1'  # Default sort
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"Error counting table rows: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-        # Add pagination
-        data_sql += ' LIMIT :limit OFFSET :offset'
-        query_params["limit"] = end_row - start_row
-        query_params["offset"] = start_row
 
-        # Execute data query
-        result = await db.execute(text(data_sql), query_params)
-        rows = result.fetchall()
+@router.get("/export")
+async def export_table_data(
+        export_format: str = Query("csv", alias="format", pattern="^(csv|xlsx|parquet)$"),
+        search: Optional[str] = None,
+        sort_field: Optional[str] = None,
+        sort_dir: Optional[str] = None,
+        filter_model: Optional[str] = None,
+        columns: Optional[str] = None
+):
+    """
+    Stream every row of the current grid view as CSV, XLSX or Parquet.
 
-        # Convert to list of dicts for JSON response
-        data = []
-        for row in rows:
-            row_dict = {}
-            for key in row._mapping.keys():
-                value = row._mapping[key]
-                # Handle datetime objects for JSON serialization
-                if isinstance(value, (datetime, date)):
-                    row_dict[str(key)] = value.isoformat()
-                else:
-                    row_dict[str(key)] = value
-            data.append(row_dict)
+    Takes the same filter_model, search, sort and columns parameters as /data.
+    Rows are read with a server-side cursor and sent batch by batch, so large
+    extracts do not have to fit in the worker's memory.
+    """
+    try:
+        missing = missing_dependency(export_format)
+        if missing:
+            raise HTTPException(status_code=400, detail=f"{export_format.upper()} export requires the {missing} package")
 
-        logger.info(f"Query returned {len(data)} rows out of {total_rows} total in {time.time() - start_time:.3f}s")
+        dialect = get_dialect_name()
+        try:
+            filter_plan, query_params = compile_filter_model(filter_model, dialect)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-        # Create response with row count info
-        response_data = {
-            "rowData": data,
-            "rowCount": total_rows,
-            "startRow": start_row,
-            "endRow": min(start_row + len(data), total_rows)
-        }
+        where_clauses = list(filter_plan.clauses)
+        search_clause = build_search_clause(search, dialect, query_params)
+        if search_clause:
+            where_clauses.append(search_clause)
 
-        # Return using orjson for faster serialization
-        return Response(
-            content=orjson.dumps(response_data),
-            media_type="application/json"
+        if sort_field and not schema_registry.is_sortable(sort_field):
+            raise HTTPException(status_code=400, detail=f"Cannot sort by column: {sort_field}")
+        sort_field, sort_direction = normalize_sort(sort_field, sort_dir)
+
+        export_sql = f'SELECT {build_select_list(columns, sort_field)} FROM "{BigTable.name}"'
+        if where_clauses:
+            export_sql += f" WHERE {' AND '.join(where_clauses)}"
+        export_sql += build_order_by(sort_field, sort_direction)
+
+        media_type, extension, _ = EXPORT_FORMATS[export_format]
+        filename = f"{BigTable.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+        logger.info(f"Starting {export_format} export: {export_sql}")
+
+        return StreamingResponse(
+            encode_export(export_format, stream_batches(export_sql, query_params), dialect),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.exception(f"Error getting table data: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        logger.exception(f"Error exporting table data: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Export error: {str(e)}")
 
 
 @router.get("/columns")
@@ -503,8 +337,11 @@ async def get_columns(
     """
     start_time = time.time()
     try:
+        # Cache key follows the schema fingerprint so a schema change never serves stale columns
+        cache_key = f"table_columns:{schema_registry.fingerprint}"
+
         # Try to get from cache
-        cached_columns = await get_cache("table_columns")
+        cached_columns = await get_cache(cache_key)
         if cached_columns:
             logger.info(f"Returning cached columns in {time.time() - start_time:.3f}s")
             # Set cache control header for browser caching
@@ -516,70 +353,25 @@ async def get_columns(
                 headers={"Cache-Control": "public, max-age=86400"}
             )
 
-        # Detect database type by checking connection driver
-        from app.core.db import is_using_local_db
-        using_sqlite = is_using_local_db()
-
+        # Build column info from the schema registry - no catalog query needed
         columns = []
-
-        if using_sqlite:
-            # SQLite schema query using PRAGMA
-            sql = "PRAGMA table_info('taitur_data')"
-            result = await db.execute(text(sql))
-            rows = result.fetchall()
-
-            # Process SQLite column info
-            # PRAGMA table_info returns: cid, name, type, notnull, dflt_value, pk
-            for row in rows:
-                column_info = {
-                    "field": row[1],  # name
-                    "title": row[1].capitalize().replace("_", " "),
-                    "type": row[2],  # type
-                    "nullable": row[3] == 0,  # notnull (0 = nullable, 1 = not null)
-                    "hasDefault": row[4] is not None,  # dflt_value
-                    "primary_key": row[5] == 1  # pk
-                }
-                columns.append(column_info)
-        else:
-            # PostgreSQL schema query using information_schema
-            sql = f"""
-                SELECT 
-                    column_name,
-                    data_type,
-                    column_default,
-                    is_nullable
-                FROM 
-                    information_schema.columns
-                WHERE 
-                    table_name = '{BigTable.name}'
-                ORDER BY 
-                    ordinal_position
-            """
-
-            result = await db.execute(text(sql))
-            rows = result.fetchall()
-
-            # Process PostgreSQL column info
-            for row in rows:
-                column_name = row[0]
-                data_type = row[1]
-                column_default = row[2]
-                is_nullable = row[3]
-
-                column_info = {
-                    "field": column_name,
-                    "title": column_name.capitalize().replace("_", " "),
-                    "type": data_type,
-                    "nullable": is_nullable == "YES",
-                    "hasDefault": column_default is not None
-                }
-                columns.append(column_info)
+        for col in schema_registry.columns():
+            columns.append({
+                "field": col["name"],
+                "title": col["name"].capitalize().replace("_", " "),
+                "type": col["data_type"],
+                "nullable": col["nullable"],
+                "hasDefault": col["has_default"],
+                "primary_key": col["primary_key"],
+                "sortable": col["sortable"],
+                "filterable": col["filterable"]
+            })
 
         logger.info(f"Returning {len(columns)} columns in {time.time() - start_time:.3f}s")
 
         # Create response and cache it (24 hour TTL for schema info)
         response_data = {"columns": columns}
-        await set_cache("table_columns", response_data, expire=86400)
+        await set_cache(cache_key, response_data, expire=86400)
 
         # Set cache control header for browser caching
         return Response(
@@ -593,6 +385,26 @@ async def get_columns(
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
+@router.post("/schema/refresh")
+async def refresh_schema_endpoint(
+        current_user: User = Depends(get_current_admin_user)
+):
+    """Re-read the table structure after a schema change (bumps the schema registry version)"""
+    try:
+        version = await refresh_schema()
+
+        return {
+            "success": True,
+            "version": version,
+            "fingerprint": schema_registry.fingerprint,
+            "columns": len(schema_registry.column_names())
+        }
+
+    except Exception as e:
+        logger.exception(f"Error refreshing schema: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error refreshing schema: {str(e)}")
+
+
 @router.get("/editable-columns")
 async def get_editable_columns_endpoint(
         db: Session = Depends(get_user_db),
@@ -730,18 +542,22 @@ async def get_filter_values(
         column_name: str,
         search: Optional[str] = None,
         limit: int = Query(100, ge=1, le=1000),
+        offset: int = Query(0, ge=0),
+        match: str = Query("contains", pattern="^(contains|prefix)$"),
         db: AsyncSession = Depends(get_db)
 ):
-    """Get available values for a column to populate filter dropdowns"""
+    """
+    Get available values for a column to populate filter dropdowns.
+
+    Values come from the column's precomputed value dictionary (with row counts);
+    ``match`` selects substring or prefix search and ``offset`` pages through the matches.
+    """
     try:
         from app.services.data_loader import get_available_filter_values
 
-        values = await get_available_filter_values(db, column_name, search, limit)
-
-        return {
-            "values": values,
-            "count": len(values)
-        }
+        page = await get_available_filter_values(db, column_name, search, limit, offset, match)
+        page["count"] = len(page["values"])
+        return page
 
     except Exception as e:
         logger.exception(f"Error getting filter values: {str(e)}")
@@ -1275,12 +1091,8 @@ async def get_document_drafts(
         raise HTTPException(status_code=500, detail=f"Error getting document drafts: {str(e)}")
 
 
-@router.post("/convert-to-pdf")
-async def convert_to_pdf(
-        source_path: str = Form(...),
-        current_user: User = Depends(get_current_active_user)
-):
-    """Convert a Word document to PDF"""
+def convert_document_to_pdf(source_path: str) -> dict:
+    """Convert a Word document to PDF next to the source (blocks until LibreOffice or Word is done)"""
     try:
         logger.info(f"Converting document to PDF: {source_path}")
 
@@ -1350,16 +1162,22 @@ async def convert_to_pdf(
 
             # Fallback: Try to use Word via COM automation (Windows only)
             try:
+                import pythoncom
                 import win32com.client
 
                 logger.info("Attempting conversion using Word COM automation")
-                word = win32com.client.Dispatch("Word.Application")
-                word.Visible = False
+                # Background jobs run this on an executor thread, which has no COM apartment yet
+                pythoncom.CoInitialize()
+                try:
+                    word = win32com.client.Dispatch("Word.Application")
+                    word.Visible = False
 
-                doc = word.Documents.Open(source_path)
-                doc.SaveAs(pdf_path, FileFormat=17)  # 17 is the PDF format code
-                doc.Close()
-                word.Quit()
+                    doc = word.Documents.Open(source_path)
+                    doc.SaveAs(pdf_path, FileFormat=17)  # 17 is the PDF format code
+                    doc.Close()
+                    word.Quit()
+                finally:
+                    pythoncom.CoUninitialize()
 
                 return {
                     "success": True,
@@ -1382,6 +1200,29 @@ async def convert_to_pdf(
         }
 
 
+async def run_convert_to_pdf_job(job: JobContext, params: dict) -> dict:
+    """Background job: convert_document_to_pdf for params {source_path}"""
+    source_path = params.get("source_path")
+    if not source_path:
+        raise ValueError("source_path is required")
+
+    await job.progress(None, f"Converting {os.path.basename(source_path)}")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, convert_document_to_pdf, source_path)
+
+
+job_queue.register("convert_to_pdf", run_convert_to_pdf_job, concurrency=PDF_CONVERSION_JOBS)
+
+
+@router.post("/convert-to-pdf")
+async def convert_to_pdf(
+        source_path: str = Form(...),
+        current_user: User = Depends(get_current_active_user)
+):
+    """Convert a Word document to PDF"""
+    return convert_document_to_pdf(source_path)
+
+
 @router.post("/open-for-editing")
 async def open_for_editing(
         file_path: str = Form(...),
@@ -1426,26 +1267,41 @@ async def open_for_editing(
         }
 
 
-@router.post("/generate-document")
-async def generate_document(
-        template_path: str = Form(...),
-        row_data_json: str = Form(...),
-        current_user: User = Depends(get_current_active_user)
-):
-    """Generate a document from a template, replacing placeholders with row data values"""
+async def complete_main_table_row(db: AsyncSession, row_data: dict) -> dict:
+    """Fill in columns missing from a projected main table row, leaving other rows untouched"""
+    row_id = row_data.get(KEY_COLUMN)
+    if row_id is None or not all(schema_registry.has_column(key) for key in row_data):
+        return row_data
+    if len(row_data) >= len(schema_registry.column_names()):
+        return row_data
+
+    try:
+        result = await db.execute(
+            text(f'SELECT * FROM "{BigTable.name}" WHERE "{KEY_COLUMN}" = :row_id'),
+            {"row_id": int(row_id)}
+        )
+        full_row = result.mappings().first()
+    except Exception as e:
+        logger.warning(f"Could not load full row {row_id}: {str(e)}")
+        return row_data
+
+    if not full_row:
+        return row_data
+
+    completed = {}
+    for key, value in full_row.items():
+        completed[key] = value.isoformat() if isinstance(value, (datetime, date)) else value
+    completed.update(row_data)
+    return completed
+
+
+async def build_document(db: AsyncSession, template_path: str, row_data: dict) -> dict:
+    """Generate a document from a template into the drafts directory"""
     try:
         logger.info(f"Generating document from template: {template_path}")
 
-        # Parse row data
-        try:
-            row_data = json.loads(row_data_json)
-            logger.info(f"Row data loaded successfully with {len(row_data)} fields")
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing row data JSON: {str(e)}")
-            return {
-                "success": False,
-                "message": f"Viga andmete töötlemisel: {str(e)}"
-            }
+        # The grid may only have loaded the visible columns - fill in the rest of the row
+        row_data = await complete_main_table_row(db, row_data)
 
         # Verify the template file exists
         if not os.path.exists(template_path):
@@ -1533,6 +1389,44 @@ async def generate_document(
         }
 
 
+async def run_generate_document_job(job: JobContext, params: dict) -> dict:
+    """Background job: build_document for params {template_path, row_data}"""
+    template_path = params.get("template_path")
+    if not template_path:
+        raise ValueError("template_path is required")
+
+    await job.progress(None, f"Generating {os.path.basename(template_path)}")
+
+    # Jobs outlive the request, so they use their own session
+    async with get_db_context() as db:
+        return await build_document(db, template_path, params.get("row_data") or {})
+
+
+job_queue.register("generate_document", run_generate_document_job, concurrency=DOCUMENT_JOBS)
+
+
+@router.post("/generate-document")
+async def generate_document(
+        template_path: str = Form(...),
+        row_data_json: str = Form(...),
+        current_user: User = Depends(get_current_active_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """Generate a document from a template, replacing placeholders with row data values"""
+    # Parse row data
+    try:
+        row_data = json.loads(row_data_json)
+        logger.info(f"Row data loaded successfully with {len(row_data)} fields")
+    except json.JSONDecodeError as e:
+        logger.error(f"Error parsing row data JSON: {str(e)}")
+        return {
+            "success": False,
+            "message": f"Viga andmete töötlemisel: {str(e)}"
+        }
+
+    return await build_document(db, template_path, row_data)
+
+
 async def process_docx_template(template_path, output_path, row_data):
     """Process a DOCX template, replacing placeholders with row data values"""
     try:
@@ -1891,64 +1785,23 @@ async def import_koondaja_csv(request: Request, db: AsyncSession = Depends(get_d
 
         data = []
 
-        # Try different encodings to handle Estonian characters
-        encodings = ['utf-8-sig', 'utf-8', 'windows-1252', 'iso-8859-15', 'cp1257']
-        content = None
-        used_encoding = None
-
-        for encoding in encodings:
-            try:
-                logger.debug(f"Trying encoding for Koondaja: {encoding}")
-                with open(full_file_path, 'r', encoding=encoding) as csvfile:
-                    content = csvfile.read()
-                    used_encoding = encoding
-                    logger.info(f"Successfully read Koondaja file with encoding: {encoding}")
-                    break
-            except UnicodeDecodeError as e:
-                logger.debug(f"Failed to read Koondaja file with encoding {encoding}: {str(e)}")
-                continue
-            except Exception as e:
-                logger.error(f"Unexpected error reading Koondaja file with encoding {encoding}: {str(e)}")
-                continue
-
-        if content is None:
+        # Encoding from a byte prefix and delimiter from the first KB - the file itself is parsed incrementally
+        used_encoding = detect_encoding(full_file_path)
+        if used_encoding is None:
             logger.error("Could not read Koondaja file with any encoding")
             raise HTTPException(status_code=400, detail="Could not decode file with any supported encoding")
+        logger.info(f"Detected encoding for Koondaja: {used_encoding}")
 
-        # Parse CSV content
-        try:
-            # Try to detect delimiter
-            csv_sniffer = csv.Sniffer()
-            delimiter = csv_sniffer.sniff(content[:1024]).delimiter
-            logger.info(f"Detected delimiter for Koondaja: '{delimiter}'")
-        except Exception as e:
-            logger.warning(f"Could not detect delimiter for Koondaja, using default ';': {str(e)}")
-            delimiter = ';'
+        delimiter = sniff_delimiter(full_file_path, used_encoding)
+        logger.info(f"Detected delimiter for Koondaja: '{delimiter}'")
 
         try:
-            csv_reader = csv.reader(StringIO(content), delimiter=delimiter)
-            rows = list(csv_reader)
-
-            logger.info(f"Koondaja CSV parsing successful. Total rows: {len(rows)}")
-
-            if not rows:
-                logger.warning("Koondaja CSV file is empty")
-                return {
-                    "success": True,
-                    "message": "File is empty",
-                    "data": [],
-                    "folder_type": folder_type,
-                    "encoding_used": used_encoding,
-                    "total_rows_processed": 0,
-                    "valid_rows": 0,
-                    "lookup_data": {"viitenumber_lookup": {}, "isikukood_lookup": {}}
-                }
-
             # Process rows based on folder type
             processed_rows = 0
-            row_count = len(rows)
+            row_count = 0
 
-            for row_num, row in enumerate(rows, 1):
+            for row_num, row in enumerate(iter_csv_rows(full_file_path, used_encoding, delimiter), 1):
+                row_count = row_num
                 try:
                     # Skip empty rows
                     if not any(cell.strip() for cell in row if cell):
@@ -1977,6 +1830,19 @@ async def import_koondaja_csv(request: Request, db: AsyncSession = Depends(get_d
                     logger.warning(f"Error processing Koondaja row {row_num}: {str(e)}")
                     continue
 
+            if not row_count:
+                logger.warning("Koondaja CSV file is empty")
+                return {
+                    "success": True,
+                    "message": "File is empty",
+                    "data": [],
+                    "folder_type": folder_type,
+                    "encoding_used": used_encoding,
+                    "total_rows_processed": 0,
+                    "valid_rows": 0,
+                    "lookup_data": {"viitenumber_lookup": {}, "isikukood_lookup": {}}
+                }
+
             logger.info(
                 f"Successfully processed {processed_rows} out of {row_count} Koondaja rows from {os.path.basename(full_file_path)}")
 
@@ -1,12 +1,14 @@
 # app/core/cache.py
 import orjson
+import uuid
+from collections import OrderedDict
 from redis import asyncio as aioredis
 from redis.asyncio.connection import ConnectionPool
 from redis.asyncio.client import Redis
 from app.core.config import settings
 import hashlib
 import logging
-from typing import Any, Optional, Dict, List, Union
+from typing import Any, Awaitable, Callable, Optional, Dict, List, Tuple, Union
 from functools import wraps
 import asyncio
 import inspect
@@ -20,10 +22,120 @@ logger = logging.getLogger(__name__)
 redis_pool: Optional[ConnectionPool] = None
 redis_client: Optional[Redis] = None
 
+# Namespace generation counters live under this prefix; the generation is part of every key
+NAMESPACE_PREFIX = "bigtable:ns:"
+
+# Namespace whose generation is the table data version, part of every data-derived cache key
+DATA_NAMESPACE = "data"
+
+# The data version keeps its original counter key so it survives upgrades instead of restarting at 0
+DATA_VERSION_KEY = "bigtable:data_version"
+
+# Keys deleted per UNLINK when reaping an old namespace generation
+REAP_BATCH_SIZE = 500
+
+# In-process L1 cache bounds; entries never outlive LOCAL_CACHE_TTL seconds
+LOCAL_CACHE_MAX_ENTRIES = 1024
+LOCAL_CACHE_TTL = 60
+
+# How long a namespace generation read from Redis is trusted without a pub/sub update
+NAMESPACE_VERSION_TTL = 5
+
+# Pub/sub channel used to keep the L1 caches of all workers coherent
+INVALIDATION_CHANNEL = "bigtable:cache_invalidation"
+
+# Identifies this worker's own invalidation messages
+WORKER_ID = uuid.uuid4().hex
+
+# Seconds to wait before reconnecting after Redis was unavailable
+REDIS_RETRY_INTERVAL = 30
+_redis_retry_at = 0.0
+
+# Pub/sub listener task
+_listener_task: Optional[asyncio.Task] = None
+
+# Handlers of invalidation ops published by other modules: op -> handler(message)
+_invalidation_handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+
+# Fire-and-forget tasks, referenced until done so they are not garbage collected mid-run
+_background_tasks: set = set()
+
+# Single-flight: computations in progress in this worker, and the cross-worker lock settings
+_in_flight: Dict[str, asyncio.Future] = {}
+SINGLE_FLIGHT_LOCK_TTL = 10.0
+SINGLE_FLIGHT_POLL_INTERVAL = 0.05
+
+
+class LocalCache:
+    """
+    Size-bounded in-process LRU cache with per-entry TTL (the L1 in front of Redis).
+
+    Values are kept as the serialized JSON string, so every hit returns a fresh
+    object exactly like a Redis hit would.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_ttl: int = 60):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        """Serialized value or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: str, expire: Optional[int] = None) -> None:
+        """Store a serialized value, evicting the least recently used entries beyond max_entries"""
+        ttl = min(expire or self.max_ttl, self.max_ttl)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        """Drop one entry"""
+        self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> int:
+        """Drop all entries whose key starts with prefix"""
+        keys = [key for key in self._entries if key.startswith(prefix)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        """Drop everything"""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Entry count and hit/miss counters"""
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# Process-local L1 cache
+local_cache = LocalCache(max_entries=LOCAL_CACHE_MAX_ENTRIES, max_ttl=LOCAL_CACHE_TTL)
+
+# Namespace generations seen by this worker: namespace -> (version, checked_at)
+_namespace_versions: Dict[str, Tuple[int, float]] = {}
+
 
 async def init_redis_pool() -> Redis:
     """Initialize Redis connection pool with optimized settings"""
-    global redis_pool, redis_client
+    global redis_pool, redis_client, _redis_retry_at
 
     if redis_client is not None:
         return redis_client
@@ -39,48 +151,42 @@ async def init_redis_pool() -> Redis:
             socket_timeout=2.0,  # Socket timeout (seconds)
             socket_connect_timeout=2.0,  # Connection timeout
             socket_keepalive=True,  # Keep connections alive
-            health_check_interval=30  # Health check interval
+            health_check_interval=30  # Pool re-checks idle connections, no PING per call needed
         )
 
         # Create Redis client
-        redis_client = Redis(connection_pool=redis_pool)
+        client = Redis(connection_pool=redis_pool)
 
         # Test connection
-        await redis_client.ping()
+        await client.ping()
         logger.info("Redis connection established successfully")
 
+        redis_client = client
         return redis_client
     except Exception as e:
         logger.error(f"Failed to initialize Redis connection: {str(e)}")
-        # Return a dummy Redis client that doesn't do anything
+        # Use a dummy Redis client that doesn't do anything and retry later
         # This way the app can still function without Redis
-        return DummyRedis()
+        redis_client = DummyRedis()
+        _redis_retry_at = time.monotonic() + REDIS_RETRY_INTERVAL
+        return redis_client
 
 
 async def get_redis() -> Redis:
-    """Get Redis client instance with connection check"""
+    """Get Redis client instance (reconnects periodically while Redis is unavailable)"""
     global redis_client
 
-    if redis_client is None:
-        redis_client = await init_redis_pool()
+    if isinstance(redis_client, DummyRedis) and time.monotonic() >= _redis_retry_at:
+        redis_client = None
 
-    # Check if connection is still valid
-    try:
-        if not isinstance(redis_client, DummyRedis):
-            await redis_client.ping()
-    except Exception as e:
-        logger.warning(f"Redis connection lost, reconnecting: {str(e)}")
+    if redis_client is None:
         redis_client = await init_redis_pool()
 
     return redis_client
 
 
 async def set_cache(key: str, value: Any, expire: int = None) -> bool:
-    """Set a cache value with optimized serialization"""
-    redis = await get_redis()
-    if isinstance(redis, DummyRedis):
-        return False
-
+    """Set a cache value in the local L1 and in Redis"""
     try:
         # Use a consistent key format with a prefix
         cache_key = f"bigtable:{key}"
@@ -89,8 +195,14 @@ async def set_cache(key: str, value: Any, expire: int = None) -> bool:
         if expire is None:
             expire = settings.REDIS_TTL
 
+        # Without Redis there is no pub/sub to invalidate the other workers' L1, so skip it too
+        redis = await get_redis()
+        if isinstance(redis, DummyRedis):
+            return False
+
         # Convert to JSON using orjson for faster serialization
         json_value = orjson.dumps(value).decode('utf-8')
+        local_cache.set(cache_key, json_value, expire)
 
         # Set with expiration
         result = await redis.set(cache_key, json_value, ex=expire)
@@ -105,46 +217,318 @@ async def set_cache(key: str, value: Any, expire: int = None) -> bool:
 
 
 async def get_cache(key: str) -> Optional[Any]:
-    """Get a cached value by key with optimized error handling"""
+    """Get a cached value from the local L1, falling back to Redis"""
+    cache_key = f"bigtable:{key}"
+
+    try:
+        # The L1 is only coherent while Redis carries the invalidations
+        redis = await get_redis()
+        if isinstance(redis, DummyRedis):
+            return None
+
+        data = local_cache.get(cache_key)
+        if data is None:
+            data = await redis.get(cache_key)
+            if not data:
+                return None
+            local_cache.set(cache_key, data)
+
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError as e:
+            logger.error(f"Error decoding cached JSON for {key}: {str(e)}")
+            # If JSON decoding fails, return raw data as fallback
+            return data
+    except Exception as e:
+        logger.error(f"Error getting cache: {str(e)}")
+        return None
+
+
+async def delete_cache(key: str) -> bool:
+    """Delete one cache key everywhere, including the L1 of the other workers"""
+    cache_key = f"bigtable:{key}"
+    local_cache.delete(cache_key)
+    await publish_invalidation({"op": "delete", "key": cache_key})
+
     redis = await get_redis()
     if isinstance(redis, DummyRedis):
-        return None
+        return False
 
     try:
-        cache_key = f"bigtable:{key}"
-        data = await redis.get(cache_key)
+        return bool(await redis.unlink(cache_key))
+    except Exception as e:
+        logger.error(f"Error deleting cache key: {str(e)}")
+        return False
 
-        if data:
+
+async def publish_invalidation(message: Dict[str, Any]) -> None:
+    """Tell the other workers to drop entries from their L1 (or apply a registered op)"""
+    redis = await get_redis()
+    if isinstance(redis, DummyRedis):
+        return
+
+    try:
+        message["origin"] = WORKER_ID
+        await redis.publish(INVALIDATION_CHANNEL, orjson.dumps(message).decode("utf-8"))
+    except Exception as e:
+        logger.error(f"Error publishing cache invalidation: {str(e)}")
+
+
+def _apply_invalidation(message: Dict[str, Any]) -> None:
+    """Apply an invalidation broadcast by another worker to this worker's L1"""
+    if message.get("origin") == WORKER_ID:
+        return
+
+    if message.get("op") == "namespace":
+        namespace = message["namespace"]
+        _namespace_versions[namespace] = (int(message["version"]), time.monotonic())
+        local_cache.delete_prefix(f"bigtable:{namespace}:")
+    elif message.get("op") == "delete":
+        local_cache.delete(message["key"])
+    elif message.get("op") in _invalidation_handlers:
+        try:
+            _invalidation_handlers[message["op"]](message)
+        except Exception as e:
+            logger.error(f"Error applying {message['op']} invalidation: {str(e)}")
+
+
+def register_invalidation_handler(op: str, handler: Callable[[Dict[str, Any]], None]) -> None:
+    """Apply messages of an op published by other workers with publish_invalidation"""
+    _invalidation_handlers[op] = handler
+
+
+async def _listen_for_invalidations() -> None:
+    """Keep this worker's L1 in sync with invalidations from other workers"""
+    while True:
+        redis = await get_redis()
+        if isinstance(redis, DummyRedis):
+            await asyncio.sleep(REDIS_RETRY_INTERVAL)
+            continue
+
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            logger.info(f"Listening for cache invalidations on {INVALIDATION_CHANNEL}")
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message and message.get("type") == "message":
+                    _apply_invalidation(orjson.loads(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Anything may have been missed - start over with an empty L1
+            logger.warning(f"Cache invalidation listener interrupted: {str(e)}")
+            local_cache.clear()
+            _namespace_versions.clear()
+            await asyncio.sleep(REDIS_RETRY_INTERVAL)
+        finally:
             try:
-                return orjson.loads(data)
-            except orjson.JSONDecodeError as e:
-                logger.error(f"Error decoding cached JSON for {key}: {str(e)}")
-                # If JSON decoding fails, return raw data as fallback
-                return data
-        return None
+                await pubsub.close()
+            except Exception:
+                pass
+
+
+def start_invalidation_listener() -> asyncio.Task:
+    """Start the pub/sub listener that keeps the local L1 coherent across workers"""
+    global _listener_task
+
+    if _listener_task is None or _listener_task.done():
+        _listener_task = asyncio.create_task(_listen_for_invalidations())
+    return _listener_task
+
+
+def _namespace_counter_key(namespace: str) -> str:
+    """Redis key holding the generation counter of a namespace"""
+    if namespace == DATA_NAMESPACE:
+        return DATA_VERSION_KEY
+    return f"{NAMESPACE_PREFIX}{namespace}"
+
+
+async def get_namespace_version(namespace: str) -> int:
+    """Current generation of a key namespace; it is part of every key in that namespace"""
+    # Bumps from other workers arrive over pub/sub, so the local copy only needs a short safety TTL
+    known = _namespace_versions.get(namespace)
+    if known and time.monotonic() - known[1] < NAMESPACE_VERSION_TTL:
+        return known[0]
+
+    redis = await get_redis()
+    if isinstance(redis, DummyRedis):
+        return known[0] if known else 0
+
+    try:
+        version = await redis.get(_namespace_counter_key(namespace))
+        version = int(version) if version else 0
+        _namespace_versions[namespace] = (version, time.monotonic())
+        return version
     except Exception as e:
-        logger.error(f"Error getting cache: {str(e)}")
-        return None
+        logger.error(f"Error reading namespace version for {namespace}: {str(e)}")
+        return known[0] if known else 0
 
 
-async def invalidate_cache(key_pattern: str) -> int:
-    """Delete all cache keys matching a pattern and return count of deleted keys"""
+async def bump_namespace(namespace: str) -> int:
+    """Start a new generation of a namespace - O(1) however many keys it holds"""
+    local_cache.delete_prefix(f"bigtable:{namespace}:")
+
     redis = await get_redis()
     if isinstance(redis, DummyRedis):
-        return 0
+        # Without Redis the generation only has to be unique within this worker
+        version = (_namespace_versions.get(namespace, (0, 0))[0]) + 1
+        _namespace_versions[namespace] = (version, time.monotonic())
+        return version
 
     try:
-        pattern = f"bigtable:{key_pattern}"
-        keys = await redis.keys(pattern)
+        version = await redis.incr(_namespace_counter_key(namespace))
+        _namespace_versions[namespace] = (version, time.monotonic())
+        await publish_invalidation({"op": "namespace", "namespace": namespace, "version": version})
+        logger.info(f"Cache namespace {namespace} moved to generation {version}")
+        return version
+    except Exception as e:
+        logger.error(f"Error bumping namespace {namespace}: {str(e)}")
+        return 0
 
-        if keys:
-            deleted = await redis.delete(*keys)
-            logger.info(f"Invalidated {deleted} cache keys matching: {key_pattern}")
-            return deleted
+
+async def namespaced_key(namespace: str, key: str) -> str:
+    """Build a cache key inside the current generation of a namespace"""
+    return f"{namespace}:g{await get_namespace_version(namespace)}:{key}"
+
+
+async def _reap_keys(pattern: str, keep_prefix: str) -> int:
+    """Delete keys of old generations with incremental SCAN, never blocking Redis like KEYS"""
+    redis = await get_redis()
+    if isinstance(redis, DummyRedis):
         return 0
+
+    deleted = 0
+    batch = []
+    try:
+        async for key in redis.scan_iter(match=pattern, count=REAP_BATCH_SIZE):
+            if key.startswith(keep_prefix):
+                continue
+            batch.append(key)
+            if len(batch) >= REAP_BATCH_SIZE:
+                deleted += await redis.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += await redis.unlink(*batch)
+        logger.debug(f"Reaped {deleted} cache keys matching {pattern}")
     except Exception as e:
-        logger.error(f"Error invalidating cache: {str(e)}")
-        return 0
+        logger.error(f"Error reaping cache keys: {str(e)}")
+    return deleted
+
+
+async def invalidate_cache(key_pattern: str) -> int:
+    """
+    Invalidate a family of cache keys and return the new namespace generation.
+
+    "namespace:*" patterns bump the namespace generation, which makes every
+    key built with namespaced_key unreachable at once. The old keys are then
+    unlinked in the background with SCAN (they would also expire by TTL).
+    """
+    namespace = key_pattern[:-2] if key_pattern.endswith(":*") else key_pattern.rstrip("*")
+    version = await bump_namespace(namespace)
+
+    # Reclaim memory without delaying the caller
+    task = asyncio.create_task(_reap_keys(f"bigtable:{key_pattern}", f"bigtable:{namespace}:g{version}:"))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return version
+
+
+async def get_data_version() -> int:
+    """Current version of the table data; bumped on every change so versioned cache keys go stale"""
+    return await get_namespace_version(DATA_NAMESPACE)
+
+
+async def bump_data_version() -> int:
+    """Increment the data version instead of deleting every cached block"""
+    return await bump_namespace(DATA_NAMESPACE)
+
+
+async def single_flight(
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        fetch_cached: Optional[Callable[[], Awaitable[Any]]] = None,
+        lock_ttl: float = SINGLE_FLIGHT_LOCK_TTL
+) -> Any:
+    """
+    Run compute() once for all concurrent callers with the same key.
+
+    Callers in this worker await the same future. With fetch_cached, workers
+    also coordinate through a short Redis lock: the lock holder computes (and
+    is expected to cache the result), the others poll fetch_cached until the
+    result appears or the lock goes away, and only then compute themselves.
+    """
+    existing = _in_flight.get(key)
+    if existing is not None:
+        try:
+            return await asyncio.shield(existing)
+        except asyncio.CancelledError:
+            if not existing.cancelled():
+                raise
+            # The leading request was cancelled (client went away) - try again ourselves
+            return await single_flight(key, compute, fetch_cached, lock_ttl)
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[key] = future
+    try:
+        result = await _compute_with_lock(key, compute, fetch_cached, lock_ttl)
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Mark the exception as retrieved in case nobody else was waiting
+        future.exception()
+        raise
+    finally:
+        _in_flight.pop(key, None)
+
+
+async def _compute_with_lock(
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        fetch_cached: Optional[Callable[[], Awaitable[Any]]],
+        lock_ttl: float
+) -> Any:
+    """Cross-worker part of single_flight"""
+    redis = await get_redis()
+    if fetch_cached is None or isinstance(redis, DummyRedis):
+        return await compute()
+
+    lock_key = f"bigtable:lock:{key}"
+    token = uuid.uuid4().hex
+    try:
+        acquired = await redis.set(lock_key, token, nx=True, px=int(lock_ttl * 1000))
+    except Exception as e:
+        logger.error(f"Error acquiring single-flight lock: {str(e)}")
+        return await compute()
+
+    if acquired:
+        try:
+            return await compute()
+        finally:
+            try:
+                if await redis.get(lock_key) == token:
+                    await redis.unlink(lock_key)
+            except Exception as e:
+                logger.error(f"Error releasing single-flight lock: {str(e)}")
+
+    # Another worker is computing the same thing - wait for its cached result
+    deadline = time.monotonic() + lock_ttl
+    while time.monotonic() < deadline:
+        await asyncio.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+        cached = await fetch_cached()
+        if cached is not None:
+            return cached
+        try:
+            if not await redis.exists(lock_key):
+                break
+        except Exception:
+            break
+
+    return await compute()
 
 
 async def compute_cache_key(params: dict) -> str:
@@ -180,6 +564,15 @@ class DummyRedis:
     async def delete(self, *args, **kwargs):
         return 0
 
+    async def incr(self, *args, **kwargs):
+        return 0
+
+    async def unlink(self, *args, **kwargs):
+        return 0
+
+    async def exists(self, *args, **kwargs):
+        return 0
+
     async def publish(self, *args, **kwargs):
         return 0
 
@@ -207,8 +600,8 @@ def async_cache(ttl: int = None, key_prefix: str = None):
             if 'cls' in call_args:
                 del call_args['cls']
 
-            # Get the cache key
-            cache_key = f"{prefix}:{await compute_cache_key(call_args)}"
+            # Get the cache key inside the prefix's current namespace generation
+            cache_key = await namespaced_key(prefix, await compute_cache_key(call_args))
 
             # Try to get from cache
             cached_result = await get_cache(cache_key)
@@ -216,17 +609,20 @@ def async_cache(ttl: int = None, key_prefix: str = None):
                 logger.debug(f"Cache hit for {cache_key}")
                 return cached_result
 
-            # Cache miss - execute function
-            start_time = time.time()
-            result = await func(*args, **kwargs)
-            execution_time = time.time() - start_time
+            # Cache miss - execute function once for all concurrent callers
+            async def compute():
+                start_time = time.time()
+                result = await func(*args, **kwargs)
+                execution_time = time.time() - start_time
+
+                # Cache the result
+                if result is not None:
+                    await set_cache(cache_key, result, expire=ttl)
+                    logger.debug(f"Cached result of {func_name} ({execution_time:.3f}s) with key {cache_key}")
 
-            # Cache the result
-            if result is not None:
-                await set_cache(cache_key, result, expire=ttl)
-                logger.debug(f"Cached result of {func_name} ({execution_time:.3f}s) with key {cache_key}")
+                return result
 
-            return result
+            return await single_flight(cache_key, compute, lambda: get_cache(cache_key))
 
         return wrapper
 
@@ -1,16 +1,18 @@
 # app/core/db.py
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import inspect, create_engine, text
+from sqlalchemy import inspect, create_engine, text, Table
 from asyncio import current_task
 from contextlib import asynccontextmanager
 import logging
 from typing import AsyncGenerator, Tuple, Optional
+import hashlib
 import os
 import time
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.core.config import settings
+from app.core.schema_registry import schema_registry
 from app.models.table import metadata, BigTable
 from app.core.db_base import Base, UserBase  # Updated import
 
@@ -134,6 +136,18 @@ async def create_db_engine() -> Tuple[any, any]:
         return sqlite_engine, sqlite_sync_engine
 
 
+def _reflect_main_table(sync_conn) -> Table:
+    """Load the column definitions of the main table into the pre-declared BigTable"""
+    # metadata.reflect() skips tables that are already declared, so reflect BigTable in place
+    return Table(
+        BigTable.name,
+        metadata,
+        autoload_with=sync_conn,
+        extend_existing=True,
+        autoload_replace=True
+    )
+
+
 async def init_db() -> bool:
     """Initialize database connection and reflect table structure"""
     global engine, sync_engine, async_session_factory
@@ -156,11 +170,16 @@ async def init_db() -> bool:
             # Create user tables
             await conn.run_sync(lambda sync_conn: UserBase.metadata.create_all(sync_conn))
 
-            # Reflect the table structure from the database
-            await conn.run_sync(lambda sync_conn: metadata.reflect(
-                bind=sync_conn,
-                only=['taitur_data']  # Replace with your actual table name
-            ))
+            # Reflect the table structure from the database into the shared BigTable object
+            await conn.run_sync(_reflect_main_table)
+
+        # Fill the process-wide column registry once so requests never introspect the catalog
+        schema_registry.load(BigTable)
+
+        # Detect the global search index; building it is left to db_manager.py so workers never race on it
+        from app.services.search_index import search_index
+        async with engine.begin() as conn:
+            await search_index.ensure(conn, get_dialect_name())
 
         logger.info(
             f"Database initialization completed successfully (using {'local SQLite' if using_local_db else 'PostgreSQL'})")
@@ -209,6 +228,18 @@ async def get_db_context() -> AsyncGenerator[AsyncSession, None]:
         await session.close()
 
 
+async def refresh_schema() -> int:
+    """Re-reflect the main table and bump the schema registry version (after a schema change)"""
+    # Ensure engine is initialized
+    if engine is None:
+        await init_db()
+
+    async with engine.connect() as conn:
+        await conn.run_sync(_reflect_main_table)
+
+    return schema_registry.load(BigTable)
+
+
 async def get_table_schema() -> dict:
     """Get the database schema information with column details"""
     try:
@@ -216,27 +247,20 @@ async def get_table_schema() -> dict:
         if engine is None:
             await init_db()
 
-        async with engine.connect() as conn:
-            # Get table schema information
-            inspector = await conn.run_sync(inspect)
-            columns = await conn.run_sync(lambda sync_conn: inspector.get_columns(BigTable.name))
-
-            # Process column information
-            schema = {
-                "table_name": BigTable.name,
-                "columns": [
-                    {
-                        "name": col["name"],
-                        "type": str(col["type"]),
-                        "nullable": col.get("nullable", True),
-                        "default": col.get("default"),
-                        "primary_key": col.get("primary_key", False)
-                    }
-                    for col in columns
-                ]
-            }
-
-            return schema
+        return {
+            "table_name": BigTable.name,
+            "version": schema_registry.version,
+            "columns": [
+                {
+                    "name": col["name"],
+                    "type": col["data_type"],
+                    "nullable": col["nullable"],
+                    "has_default": col["has_default"],
+                    "primary_key": col["primary_key"]
+                }
+                for col in schema_registry.columns()
+            ]
+        }
     except Exception as e:
         logger.error(f"Error getting table schema: {str(e)}", exc_info=True)
         return {"error": str(e)}
@@ -244,4 +268,52 @@ async def get_table_schema() -> dict:
 
 def is_using_local_db() -> bool:
     """Return whether the application is currently using the local database"""
-    return using_local_db
\ No newline at end of file
+    return using_local_db
+
+
+def get_dialect_name() -> str:
+    """Return the SQL dialect of the active main database ("sqlite" or "postgresql")"""
+    return "sqlite" if using_local_db else "postgresql"
+
+
+# Seconds a computed table fingerprint is reused by this worker. Application writes
+# bump the data version anyway; only outside writes are noticed up to this much later.
+FINGERPRINT_TTL = 5.0
+
+# Last fingerprint computed by this worker and the monotonic time it was taken
+_fingerprint: Tuple[Optional[str], float] = (None, 0.0)
+
+
+async def table_fingerprint(db: AsyncSession) -> str:
+    """
+    Short hash that changes whenever the main table is modified, without scanning it.
+
+    Also catches writes the application never sees (local database syncs,
+    import tools, direct PostgreSQL updates), which do not bump the data version.
+    The value is reused for FINGERPRINT_TTL seconds so not every request queries the catalog.
+    """
+    global _fingerprint
+
+    value, taken_at = _fingerprint
+    now = time.monotonic()
+    if value is not None and now - taken_at < FINGERPRINT_TTL:
+        return value
+
+    if get_dialect_name() == "postgresql":
+        result = await db.execute(
+            text("SELECT n_tup_ins + n_tup_upd + n_tup_del FROM pg_stat_user_tables WHERE relname = :table"),
+            {"table": BigTable.name}
+        )
+        state = str(result.scalar())
+    else:
+        # SQLite: writes land in the WAL file until a checkpoint moves them to the database file
+        parts = []
+        for path in (str(settings.LOCAL_DB_PATH), f"{settings.LOCAL_DB_PATH}-wal"):
+            if os.path.exists(path):
+                stat = os.stat(path)
+                parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+        state = "|".join(parts)
+
+    value = hashlib.sha1(state.encode("utf-8")).hexdigest()[:12]
+    _fingerprint = (value, now)
+    return value
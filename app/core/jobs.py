@@ -0,0 +1,387 @@
+# app/core/jobs.py
+"""
+Background job queue for long-running work (Koondaja imports, PDF conversion,
+document generation).
+
+Jobs are persisted in the user database, so their state outlives the request
+that submitted them and can be read from any worker process. Every job kind
+has its own queue served by a fixed number of asyncio workers in each
+process, which is also its concurrency limit (one LibreOffice conversion at a
+time, a couple of imports, ...). A job is claimed with a conditional UPDATE
+before it runs, so re-enqueueing after a restart never runs it twice.
+
+State and progress changes are pushed to the job owner over /ws. With Redis
+they are relayed through JOB_EVENTS_CHANNEL to the process holding the
+owner's socket, and cancel requests reach the process running the job the
+same way; without Redis both stay within the process.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import orjson
+
+from app.core.cache import DummyRedis, get_redis
+from app.core.config import settings
+from app.core.user_db import SessionLocal
+from app.core.websocket import send_message_to_user
+from app.models.job import Job
+from app.services.wire_format import json_default
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+# Pub/sub channel for job events and cancel requests between worker processes
+JOB_EVENTS_CHANNEL = "bigtable:jobs"
+
+# Result files of finished jobs
+JOB_RESULTS_DIR = settings.DATA_DIR / "jobs"
+
+# Progress is written to the database at most this often (every update still goes to /ws)
+PROGRESS_PERSIST_INTERVAL = 1.0
+
+# A running job not updated for this long belonged to a process that died
+JOB_STALE_SECONDS = 3600
+
+# Finished jobs and their result files are removed after this many days
+JOB_RETENTION_DAYS = 7
+
+# Seconds to wait before resubscribing when Redis is unavailable
+EVENTS_RETRY_INTERVAL = 30
+
+
+class JobContext:
+    """Handle passed to a running job for progress reporting"""
+
+    def __init__(self, job_queue: "JobQueue", job_id: str, user_id: int):
+        self.job_queue = job_queue
+        self.job_id = job_id
+        self.user_id = user_id
+        self._persisted_at = 0.0
+
+    async def progress(self, fraction: Optional[float] = None, message: Optional[str] = None) -> None:
+        """Report progress; raises CancelledError once a cancel was requested from any process"""
+        now = time.monotonic()
+        if now - self._persisted_at >= PROGRESS_PERSIST_INTERVAL:
+            self._persisted_at = now
+            cancel_requested = self.job_queue.update_job(self.job_id, progress=fraction, message=message)
+            if cancel_requested:
+                raise asyncio.CancelledError()
+
+        await self.job_queue.publish_event(self.user_id, {
+            "id": self.job_id,
+            "status": JOB_RUNNING,
+            "progress": fraction,
+            "message": message
+        })
+
+
+JobHandler = Callable[[JobContext, Dict[str, Any]], Awaitable[Any]]
+
+
+def job_to_dict(job: Job) -> Dict[str, Any]:
+    """Public view of a job row"""
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "message": job.message,
+        "error": job.error,
+        "has_result": bool(job.result_path),
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+class JobQueue:
+    """Persisted job queue with a per-kind asyncio worker pool"""
+
+    def __init__(self):
+        self._handlers: Dict[str, JobHandler] = {}
+        self._concurrency: Dict[str, int] = {}
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._stopping = False
+
+    def register(self, kind: str, handler: JobHandler, concurrency: int = 1) -> None:
+        """Register the coroutine that runs jobs of a kind and how many may run at once"""
+        self._handlers[kind] = handler
+        self._concurrency[kind] = max(1, concurrency)
+
+    def has_kind(self, kind: str) -> bool:
+        return kind in self._handlers
+
+    # Persistence
+
+    def update_job(self, job_id: str, **fields) -> bool:
+        """Update a job row; returns whether a cancel has been requested for it"""
+        with SessionLocal() as db:
+            job = db.get(Job, job_id)
+            if job is None:
+                return False
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.updated_at = datetime.utcnow()
+            db.commit()
+            return bool(job.cancel_requested)
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        with SessionLocal() as db:
+            return db.get(Job, job_id)
+
+    def list_jobs(self, user_id: int, limit: int = 50) -> List[Job]:
+        with SessionLocal() as db:
+            return (db.query(Job).filter(Job.user_id == user_id)
+                    .order_by(Job.created_at.desc()).limit(limit).all())
+
+    def _claim(self, job_id: str) -> Optional[Job]:
+        """Atomically move a queued job to running; None if another worker got it first"""
+        with SessionLocal() as db:
+            now = datetime.utcnow()
+            claimed = (db.query(Job).filter(Job.id == job_id, Job.status == JOB_QUEUED)
+                       .update({"status": JOB_RUNNING, "started_at": now, "updated_at": now},
+                               synchronize_session=False))
+            db.commit()
+            return db.get(Job, job_id) if claimed else None
+
+    def _write_result(self, job_id: str, result: Any) -> Optional[str]:
+        """Store a job result as a JSON file; results can be far too large for a table cell"""
+        if result is None:
+            return None
+        os.makedirs(JOB_RESULTS_DIR, exist_ok=True)
+        path = JOB_RESULTS_DIR / f"{job_id}.json"
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(result, default=json_default))
+        return str(path)
+
+    # Events
+
+    async def publish_event(self, user_id: int, job: Dict[str, Any]) -> None:
+        """Send a job update to its owner's sockets, in whichever process they are connected"""
+        message = {"type": "job", "job": job}
+        try:
+            redis = await get_redis()
+            if not isinstance(redis, DummyRedis):
+                payload = {"op": "event", "user_id": user_id, "message": message}
+                await redis.publish(JOB_EVENTS_CHANNEL, orjson.dumps(payload, default=json_default).decode("utf-8"))
+                return
+        except Exception as e:
+            logger.error(f"Error publishing job event: {str(e)}")
+        await send_message_to_user(user_id, message)
+
+    async def _listen_for_events(self) -> None:
+        """Deliver job events to local sockets and apply cancel requests for local jobs"""
+        while True:
+            redis = await get_redis()
+            if isinstance(redis, DummyRedis):
+                await asyncio.sleep(EVENTS_RETRY_INTERVAL)
+                continue
+
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(JOB_EVENTS_CHANNEL)
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if not message or message.get("type") != "message":
+                        continue
+                    payload = orjson.loads(message["data"])
+                    if payload.get("op") == "event":
+                        await send_message_to_user(payload["user_id"], payload["message"])
+                    elif payload.get("op") == "cancel":
+                        self._cancel_local(payload["job_id"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Job event listener interrupted: {str(e)}")
+                await asyncio.sleep(EVENTS_RETRY_INTERVAL)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    # Submit / cancel
+
+    async def submit(self, kind: str, params: Dict[str, Any], user_id: int) -> Dict[str, Any]:
+        """Persist a new job and queue it in this process"""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        job = Job(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            user_id=user_id,
+            status=JOB_QUEUED,
+            params=orjson.dumps(params, default=json_default).decode("utf-8")
+        )
+        with SessionLocal() as db:
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            job_data = job_to_dict(job)
+
+        self._queue(kind).put_nowait(job.id)
+        logger.info(f"Queued {kind} job {job.id} for user {user_id}")
+        await self.publish_event(user_id, job_data)
+        return job_data
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job at once, or ask the process running it to stop"""
+        with SessionLocal() as db:
+            job = db.get(Job, job_id)
+            if job is None:
+                return None
+            if job.status == JOB_QUEUED:
+                job.status = JOB_CANCELLED
+                job.finished_at = datetime.utcnow()
+            elif job.status == JOB_RUNNING:
+                job.cancel_requested = True
+            job.updated_at = datetime.utcnow()
+            db.commit()
+            db.refresh(job)
+            job_data = job_to_dict(job)
+            user_id = job.user_id
+
+        if job_data["status"] == JOB_RUNNING and not self._cancel_local(job_id):
+            redis = await get_redis()
+            if not isinstance(redis, DummyRedis):
+                await redis.publish(JOB_EVENTS_CHANNEL, orjson.dumps({"op": "cancel", "job_id": job_id}).decode("utf-8"))
+        elif job_data["status"] == JOB_CANCELLED:
+            await self.publish_event(user_id, job_data)
+        return job_data
+
+    def _cancel_local(self, job_id: str) -> bool:
+        task = self._running.get(job_id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    # Workers
+
+    def _queue(self, kind: str) -> asyncio.Queue:
+        if kind not in self._queues:
+            self._queues[kind] = asyncio.Queue()
+        return self._queues[kind]
+
+    async def _run_job(self, job_id: str) -> None:
+        job = self._claim(job_id)
+        if job is None:
+            return
+
+        handler = self._handlers[job.kind]
+        context = JobContext(self, job.id, job.user_id)
+        start_time = time.time()
+        logger.info(f"Running {job.kind} job {job.id}")
+        await self.publish_event(job.user_id, job_to_dict(job))
+
+        task = asyncio.create_task(handler(context, orjson.loads(job.params)))
+        self._running[job.id] = task
+        fields: Dict[str, Any]
+        try:
+            result = await task
+            fields = {"status": JOB_SUCCEEDED, "progress": 1.0, "result_path": self._write_result(job.id, result)}
+            if isinstance(result, dict) and result.get("success") is False:
+                # Handlers shared with the synchronous endpoints report failures in the result
+                fields.update(status=JOB_FAILED, error=result.get("error") or result.get("message") or "Failed")
+        except asyncio.CancelledError:
+            if self._stopping:
+                # The worker itself is being stopped - the job did not finish
+                self.update_job(job.id, status=JOB_FAILED, error="Interrupted by server shutdown",
+                                finished_at=datetime.utcnow())
+                raise
+            fields = {"status": JOB_CANCELLED}
+        except Exception as e:
+            logger.exception(f"{job.kind} job {job.id} failed: {str(e)}")
+            fields = {"status": JOB_FAILED, "error": getattr(e, "detail", None) or str(e)}
+        finally:
+            self._running.pop(job.id, None)
+
+        self.update_job(job.id, finished_at=datetime.utcnow(), **fields)
+        logger.info(f"{job.kind} job {job.id} {fields['status']} in {time.time() - start_time:.2f}s")
+
+        finished = self.get_job(job.id)
+        if finished is not None:
+            await self.publish_event(finished.user_id, job_to_dict(finished))
+
+    async def _worker(self, kind: str) -> None:
+        queue = self._queue(kind)
+        while True:
+            job_id = await queue.get()
+            try:
+                await self._run_job(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker error for {job_id}: {str(e)}")
+            finally:
+                queue.task_done()
+
+    def _recover(self) -> None:
+        """Fail jobs orphaned by a dead process, drop expired ones and re-queue queued jobs"""
+        now = datetime.utcnow()
+        with SessionLocal() as db:
+            stale = (db.query(Job).filter(Job.status == JOB_RUNNING,
+                                          Job.updated_at < now - timedelta(seconds=JOB_STALE_SECONDS))
+                     .update({"status": JOB_FAILED, "error": "Interrupted by server restart", "finished_at": now},
+                             synchronize_session=False))
+
+            expired = db.query(Job).filter(Job.status.in_(FINISHED_STATES),
+                                           Job.finished_at < now - timedelta(days=JOB_RETENTION_DAYS)).all()
+            for job in expired:
+                if job.result_path and os.path.exists(job.result_path):
+                    os.remove(job.result_path)
+                db.delete(job)
+
+            queued = db.query(Job.id, Job.kind).filter(Job.status == JOB_QUEUED).order_by(Job.created_at).all()
+            db.commit()
+
+        for job_id, kind in queued:
+            if kind in self._handlers:
+                self._queue(kind).put_nowait(job_id)
+
+        if stale or expired or queued:
+            logger.info(f"Jobs recovered: {stale} stale, {len(expired)} expired, {len(queued)} re-queued")
+
+    def start(self) -> None:
+        """Start the worker pools and the event listener of this process"""
+        if self._tasks:
+            return
+        self._stopping = False
+        try:
+            self._recover()
+        except Exception as e:
+            logger.error(f"Error recovering jobs: {str(e)}")
+
+        for kind, concurrency in self._concurrency.items():
+            for _ in range(concurrency):
+                self._tasks.append(asyncio.create_task(self._worker(kind)))
+        self._tasks.append(asyncio.create_task(self._listen_for_events()))
+        logger.info(f"Job workers started: {self._concurrency}")
+
+    async def stop(self) -> None:
+        """Stop the workers; running jobs are marked as interrupted"""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+# Create a singleton instance
+job_queue = JobQueue()
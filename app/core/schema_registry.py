@@ -0,0 +1,160 @@
+# app/core/schema_registry.py
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Table
+from sqlalchemy import types as sqltypes
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Column kinds that can be compared, sorted and filtered
+SORTABLE_KINDS = ("integer", "numeric", "date", "timestamp", "time", "boolean", "text")
+
+
+def _describe_type(col_type: Any) -> Dict[str, str]:
+    """Map a reflected SQLAlchemy type to an information_schema style data_type and a coarse kind"""
+    # Order matters: BigInteger/SmallInteger subclass Integer, Float subclasses Numeric
+    if isinstance(col_type, sqltypes.Boolean):
+        return {"data_type": "boolean", "kind": "boolean"}
+    if isinstance(col_type, sqltypes.SmallInteger):
+        return {"data_type": "smallint", "kind": "integer"}
+    if isinstance(col_type, sqltypes.BigInteger):
+        return {"data_type": "bigint", "kind": "integer"}
+    if isinstance(col_type, sqltypes.Integer):
+        return {"data_type": "integer", "kind": "integer"}
+    if isinstance(col_type, sqltypes.Float):
+        name = "real" if type(col_type).__name__.upper() == "REAL" else "double precision"
+        return {"data_type": name, "kind": "numeric"}
+    if isinstance(col_type, sqltypes.Numeric):
+        return {"data_type": "numeric", "kind": "numeric"}
+    if isinstance(col_type, sqltypes.DateTime):
+        name = "timestamp with time zone" if getattr(col_type, "timezone", False) else "timestamp"
+        return {"data_type": name, "kind": "timestamp"}
+    if isinstance(col_type, sqltypes.Date):
+        return {"data_type": "date", "kind": "date"}
+    if isinstance(col_type, sqltypes.Time):
+        return {"data_type": "time", "kind": "time"}
+    if isinstance(col_type, sqltypes.Text):
+        return {"data_type": "text", "kind": "text"}
+    if isinstance(col_type, sqltypes.CHAR):
+        return {"data_type": "character", "kind": "text"}
+    if isinstance(col_type, sqltypes.String):
+        return {"data_type": "character varying", "kind": "text"}
+    if isinstance(col_type, (sqltypes.LargeBinary, sqltypes.JSON, sqltypes.ARRAY)):
+        return {"data_type": str(col_type).lower(), "kind": "other"}
+
+    if isinstance(col_type, sqltypes.NullType):
+        # Untyped SQLite column - values are stored as text
+        return {"data_type": "text", "kind": "text"}
+
+    # Unknown or dialect specific type
+    try:
+        name = str(col_type).lower()
+    except Exception:
+        name = "unknown"
+    return {"data_type": name, "kind": "other"}
+
+
+class SchemaRegistry:
+    """
+    Process-wide registry of the main table's columns and types.
+
+    Filled once from the reflected BigTable during init_db, so request handlers
+    never have to query PRAGMA table_info or information_schema themselves.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.table_name: Optional[str] = None
+        self.fingerprint = ""
+        self._columns: Dict[str, Dict[str, Any]] = {}
+        self._ordered: List[str] = []
+        self._text_columns: List[str] = []
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the registry has been filled at least once"""
+        return bool(self._columns)
+
+    def load(self, table: Table) -> int:
+        """Rebuild the registry from a reflected table and bump the schema version"""
+        columns = {}
+        ordered = []
+
+        for position, column in enumerate(table.columns, start=1):
+            described = _describe_type(column.type)
+            kind = described["kind"]
+            columns[column.name] = {
+                "name": column.name,
+                "position": position,
+                "data_type": described["data_type"],
+                "kind": kind,
+                "nullable": bool(column.nullable),
+                "primary_key": bool(column.primary_key),
+                "has_default": column.server_default is not None,
+                "sortable": kind in SORTABLE_KINDS,
+                "filterable": kind in SORTABLE_KINDS
+            }
+            ordered.append(column.name)
+
+        self.table_name = table.name
+        self._columns = columns
+        self._ordered = ordered
+        self._text_columns = [name for name in ordered if columns[name]["kind"] == "text"]
+
+        # Stable across workers, so it can be used in shared cache keys
+        signature = "|".join(f"{name}:{columns[name]['data_type']}" for name in ordered)
+        self.fingerprint = hashlib.md5(signature.encode("utf-8")).hexdigest()[:12]
+        self.version += 1
+
+        logger.info(f"Schema registry loaded {len(ordered)} columns for {table.name} "
+                    f"(version {self.version}, fingerprint {self.fingerprint})")
+        return self.version
+
+    def has_column(self, name: str) -> bool:
+        """Whether the column exists in the table"""
+        return name in self._columns
+
+    def get_column(self, name: str) -> Optional[Dict[str, Any]]:
+        """Column metadata or None if the column does not exist"""
+        return self._columns.get(name)
+
+    def column_names(self) -> List[str]:
+        """Column names in table order"""
+        return list(self._ordered)
+
+    def columns(self) -> List[Dict[str, Any]]:
+        """Column metadata dicts in table order"""
+        return [self._columns[name] for name in self._ordered]
+
+    def text_columns(self) -> List[str]:
+        """Names of string-typed columns, used for global search"""
+        return list(self._text_columns)
+
+    def column_kind(self, name: str) -> str:
+        """Coarse type kind of a column ("integer", "numeric", "date", "timestamp", "text", ...)"""
+        column = self._columns.get(name)
+        return column["kind"] if column else ""
+
+    def is_sortable(self, name: str) -> bool:
+        """Whether the column exists and can be used in ORDER BY"""
+        column = self._columns.get(name)
+        return bool(column and column["sortable"])
+
+    def is_filterable(self, name: str) -> bool:
+        """Whether the column exists and can be used in a WHERE condition"""
+        column = self._columns.get(name)
+        return bool(column and column["filterable"])
+
+    def column_types(self) -> Dict[str, Dict[str, str]]:
+        """Column name -> {"data_type", "udt_name"} in the shape the filter builders expect"""
+        return {
+            name: {"data_type": info["data_type"], "udt_name": info["data_type"]}
+            for name, info in self._columns.items()
+        }
+
+
+# Create singleton instance
+schema_registry = SchemaRegistry()
@@ -42,6 +42,7 @@ def init_user_db():
     from app.models.data_change import DataChange
     from app.models.change_log import ChangeLog
     from app.models.saved_filter import SavedFilter
+    from app.models.job import Job
     from app.core.security import get_password_hash
     from datetime import datetime
 
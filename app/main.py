@@ -12,12 +12,14 @@ from fastapi.security import OAuth2PasswordBearer
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
+from app.api.v1.endpoints import jobs
 from app.api.v1.endpoints import koondaja
 from app.api.v1.endpoints import table
 from app.api.v1.endpoints.auth import router as auth_router
-from app.core.cache import init_redis_pool
+from app.core.cache import init_redis_pool, start_invalidation_listener
 from app.core.config import settings
 from app.core.db import init_db
+from app.core.jobs import job_queue
 from app.core.security import (
     extract_token_from_request, verify_token
 )
@@ -53,6 +55,7 @@ templates.env.globals["versioned_static"] = lambda path: f"/static/{path}?v={cac
 # Include API routers
 app.include_router(table.router, prefix=settings.API_V1_STR)
 app.include_router(koondaja.router)
+app.include_router(jobs.router)
 app.include_router(auth_router)
 
 # OAuth2 scheme for getting token from Authorization header or cookie
@@ -312,6 +315,12 @@ async def startup_event():
             else:
                 logger.info(f"{component} initialized successfully")
 
+        # Keep this worker's in-process cache coherent with the other workers
+        start_invalidation_listener()
+
+        # Background job workers (the jobs table is created with the user database)
+        job_queue.start()
+
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}", exc_info=True)
 
@@ -320,6 +329,12 @@ async def startup_event():
     logger.info(f"Application startup completed in {elapsed:.2f} seconds")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background job workers"""
+    await job_queue.stop()
+
+
 async def init_user_db_async():
     """Async wrapper for the sync user_db initialization"""
     import asyncio
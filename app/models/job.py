@@ -0,0 +1,24 @@
+# app/models/job.py
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, ForeignKey
+from datetime import datetime
+
+from app.core.db_base import UserBase as Base
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True, index=True)  # uuid4 hex
+    kind = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="queued", index=True)
+    params = Column(Text, nullable=False)  # Stored as JSON string
+    progress = Column(Float, nullable=True)  # 0..1, None while unknown
+    message = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    result_path = Column(String, nullable=True)  # JSON file under DATA_DIR/jobs
+    cancel_requested = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,67 @@
+# app/services/block_cache.py
+"""
+Redis cache of encoded /data response blocks.
+
+Keys contain the data version, so an edit only has to bump the version
+(one INCR) instead of finding and deleting every cached block; stale
+versions simply expire. They also contain the table fingerprint, so writes
+that bypass the application (syncs, import tools, direct PostgreSQL updates)
+make old blocks unreachable as well.
+"""
+import logging
+from typing import Any, Dict, Optional
+
+from app.core.cache import get_redis, DummyRedis, compute_cache_key
+from app.core.config import settings
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Blocks of an old data version are never read again, so they only need to live briefly
+BLOCK_CACHE_TTL = 600
+
+# Blocks carrying a planner estimate are kept just long enough for concurrent and
+# single-flight waiters to share them, then rebuilt to pick up the exact count
+ESTIMATE_BLOCK_CACHE_TTL = 5
+
+
+async def block_cache_key(
+        data_version: int,
+        fingerprint: str,
+        plan_key: str,
+        query_params: Dict[str, Any],
+        **request_params: Any
+) -> str:
+    """Cache key of one block: data version, table fingerprint, filter plan, bind values and the paging/sort/format parameters"""
+    params = {name: repr(value) for name, value in query_params.items()}
+    params.update({f"req_{name}": value for name, value in request_params.items()})
+    return f"table_block:v{data_version}:{fingerprint}:{plan_key}:{await compute_cache_key(params)}"
+
+
+async def get_cached_block(key: str) -> Optional[bytes]:
+    """Encoded response body of a cached block, or None"""
+    redis = await get_redis()
+    if isinstance(redis, DummyRedis):
+        return None
+
+    try:
+        body = await redis.get(f"bigtable:{key}")
+        return body.encode("utf-8") if body else None
+    except Exception as e:
+        logger.error(f"Error reading cached block: {str(e)}")
+        return None
+
+
+async def cache_block(key: str, body: bytes, expire: int = BLOCK_CACHE_TTL) -> bool:
+    """Store an encoded response body"""
+    redis = await get_redis()
+    if isinstance(redis, DummyRedis):
+        return False
+
+    try:
+        # Never keep a block longer than the general cache TTL
+        expire = min(expire, settings.REDIS_TTL)
+        return bool(await redis.set(f"bigtable:{key}", body.decode("utf-8"), ex=expire))
+    except Exception as e:
+        logger.error(f"Error caching block: {str(e)}")
+        return False
@@ -0,0 +1,84 @@
+# app/services/csv_stream.py
+"""
+Incremental reading of uploaded/bank CSV files.
+
+The encoding is decided once from the raw bytes - a BOM, else the first chunk
+that contains non-ASCII bytes is test-decoded with each candidate - instead of
+decoding the whole file once per candidate encoding. Rows are then parsed
+lazily with the csv module and handed out in chunks, so memory stays bounded
+by the chunk size rather than the file size.
+"""
+import codecs
+import csv
+import logging
+from typing import Iterator, List, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Encodings tried in order (Estonian bank exports are UTF-8 or a Windows/ISO code page)
+CSV_ENCODINGS = ('utf-8-sig', 'utf-8', 'windows-1252', 'iso-8859-15', 'cp1257')
+
+# Bytes read per step while looking for the first non-ASCII chunk
+SAMPLE_SIZE = 64 * 1024
+
+# Characters given to csv.Sniffer
+SNIFF_SIZE = 1024
+
+# Rows per chunk handed to the processing stage
+CSV_CHUNK_ROWS = 2000
+
+
+def detect_encoding(file_path: str) -> Optional[str]:
+    """Encoding of a CSV file from its bytes; None if no candidate decodes it"""
+    with open(file_path, 'rb') as f:
+        sample = f.read(SAMPLE_SIZE)
+        if sample.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+
+        # Pure ASCII decodes the same in every candidate - look further for the first non-ASCII bytes
+        while sample and sample.isascii():
+            sample = f.read(SAMPLE_SIZE)
+        if not sample:
+            return 'utf-8'
+
+        # Keep a multi-byte character that straddles the end of the sample in one piece
+        sample += f.read(4)
+
+    for encoding in CSV_ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def sniff_delimiter(file_path: str, encoding: str, default: str = ';') -> str:
+    """Delimiter guessed from the beginning of the file"""
+    with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as f:
+        sample = f.read(SNIFF_SIZE)
+    try:
+        return csv.Sniffer().sniff(sample).delimiter
+    except Exception as e:
+        logger.warning(f"Could not detect delimiter, using default '{default}': {str(e)}")
+        return default
+
+
+def iter_csv_rows(file_path: str, encoding: str, delimiter: str = ';') -> Iterator[List[str]]:
+    """Parse a CSV file row by row"""
+    # errors='replace': a stray byte past the detection sample must not abort a half-processed file
+    with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as f:
+        yield from csv.reader(f, delimiter=delimiter)
+
+
+def iter_chunks(rows: Iterator[List[str]], size: int = CSV_CHUNK_ROWS) -> Iterator[List[List[str]]]:
+    """Group rows into lists of at most ``size`` rows"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
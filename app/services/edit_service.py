@@ -13,6 +13,9 @@ from app.models.user import User
 from app.models.column_settings import ColumnSetting
 from app.models.data_change import DataChange
 from app.models.change_log import ChangeLog
+from app.models.table import BigTable
+from app.services.search_index import search_index
+from app.services.value_dictionary import value_dictionary
 from app.core.config import settings
 
 # Set up logging
@@ -96,6 +99,10 @@ async def update_cell_value(
             {"new_value": new_value, "row_id": row_id_value}
         )
 
+        # Keep the row's search document in the same transaction as the edit
+        if table_name == BigTable.name:
+            await search_index.refresh_row(db, row_id_value, column_name)
+
         # Commit the change
         await db.commit()
 
@@ -141,6 +148,10 @@ async def update_cell_value(
         # Also notify other users (using Redis pub/sub)
         await notify_data_change(table_name, row_id, column_name, user.id)
 
+        # Keep the filter dropdown value counts in step with the edit
+        if table_name == BigTable.name:
+            await value_dictionary.apply_edit(column_name, old_value, new_value)
+
         return True
 
     except Exception as e:
@@ -206,6 +217,9 @@ async def undo_change(
             {"old_value": change.old_value, "row_id": row_id_value}
         )
 
+        if change.table_name == BigTable.name:
+            await search_index.refresh_row(db, row_id_value, change.column_name)
+
         await db.commit()
 
         # Log the undo operation
@@ -241,6 +255,9 @@ async def undo_change(
         # Notify other users about the change
         await notify_data_change(change.table_name, change.row_id, change.column_name)
 
+        if change.table_name == BigTable.name:
+            await value_dictionary.apply_edit(change.column_name, change.new_value, change.old_value)
+
         return True
 
     except Exception as e:
@@ -333,11 +350,11 @@ async def notify_data_change(table_name: str, row_id: str, column_name: str, use
     """Notify other users about data changes using both Redis pub/sub and WebSockets"""
     try:
         # Using Redis
-        from app.core.cache import get_redis, invalidate_cache
+        from app.core.cache import get_redis, bump_data_version
         redis = await get_redis()
 
-        # Invalidate relevant cache to ensure fresh data on next query
-        await invalidate_cache(f"table_data:*")
+        # New data version - cached blocks and counts of the old one are no longer read
+        await bump_data_version()
 
         # Create a message with change details
         message = {
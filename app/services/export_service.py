@@ -0,0 +1,281 @@
+# app/services/export_service.py
+"""
+Streaming bulk export of the main table.
+
+Rows are read through a server-side cursor (AsyncSession.stream) one batch at
+a time and each batch is encoded and handed to the StreamingResponse before
+the next one is fetched, so memory stays flat however many rows are exported.
+Encoding runs in the default thread pool so a large export does not stall
+the event loop.
+CSV and Parquet are written straight to the response; XLSX is a zip archive
+that can only be finished at the end, so it is written row by row to a
+temporary file (openpyxl write-only mode) and that file is streamed.
+"""
+import asyncio
+import csv
+import io
+import logging
+import tempfile
+import time
+from datetime import date, time as dt_time
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+from app.core.db import get_db_context
+from app.core.schema_registry import schema_registry
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the server-side cursor and encoded per chunk
+EXPORT_BATCH_SIZE = 5000
+
+# Bytes per chunk when streaming a finished XLSX file
+FILE_CHUNK_SIZE = 1024 * 1024
+
+# Rows per XLSX sheet (Excel's limit minus the header row)
+XLSX_MAX_ROWS = 1048575
+
+# format -> (media type, file extension, optional dependency)
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv", None),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx", "openpyxl"),
+    "parquet": ("application/vnd.apache.parquet", "parquet", "pyarrow"),
+}
+
+Batch = Tuple[List[str], Sequence[Sequence[Any]]]
+
+
+def missing_dependency(export_format: str) -> Optional[str]:
+    """Name of the library the format needs if it is not installed, else None"""
+    dependency = EXPORT_FORMATS[export_format][2]
+    if not dependency:
+        return None
+    try:
+        __import__(dependency)
+        return None
+    except ImportError:
+        return dependency
+
+
+async def stream_batches(sql: str, params: Dict[str, Any]) -> AsyncIterator[Batch]:
+    """Run the query on its own session with a server-side cursor and yield (keys, rows) batches"""
+    start_time = time.time()
+    total = 0
+
+    # The request's session is closed before a streaming body is sent, so use a dedicated one
+    async with get_db_context() as db:
+        result = await db.stream(text(sql), params, execution_options={"yield_per": EXPORT_BATCH_SIZE})
+        keys = list(result.keys())
+        async for partition in result.partitions(EXPORT_BATCH_SIZE):
+            total += len(partition)
+            yield keys, partition
+        await result.close()
+
+    if not total:
+        # Let the encoders write the header of an empty export
+        yield keys, []
+
+    logger.info(f"Exported {total} rows in {time.time() - start_time:.1f}s")
+
+
+def _csv_value(value: Any) -> Any:
+    """Text form of a value for CSV"""
+    if value is None:
+        return ""
+    if isinstance(value, (date, dt_time)):
+        return value.isoformat()
+    return value
+
+
+def _encode_csv_batch(writer, buffer: io.StringIO, rows: Sequence[Sequence[Any]]) -> bytes:
+    """Write one batch through the CSV writer and take the encoded text out of its buffer"""
+    for row in rows:
+        writer.writerow([_csv_value(value) for value in row])
+    data = buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate(0)
+    return data
+
+
+async def csv_chunks(batches: AsyncIterator[Batch], delimiter: str = ";") -> AsyncIterator[bytes]:
+    """Encode batches as CSV (UTF-8 with BOM so Excel reads the Estonian letters)"""
+    loop = asyncio.get_running_loop()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter)
+    header_written = False
+
+    async for keys, rows in batches:
+        if not header_written:
+            buffer.write("\ufeff")
+            writer.writerow(keys)
+            header_written = True
+        yield await loop.run_in_executor(None, _encode_csv_batch, writer, buffer, rows)
+
+
+def _xlsx_value(value: Any) -> Any:
+    """Value openpyxl can write (times and Decimals as numbers/text)"""
+    if isinstance(value, Decimal):
+        try:
+            return float(value)
+        except (ValueError, ArithmeticError):
+            return str(value)
+    if isinstance(value, dt_time):
+        return value.isoformat()
+    return value
+
+
+def _append_xlsx_rows(workbook, sheet, sheet_rows: int, keys: List[str], rows: Sequence[Sequence[Any]]):
+    """Append one batch to the workbook, returning the current sheet and its row count"""
+    for row in rows:
+        if sheet is None or sheet_rows >= XLSX_MAX_ROWS:
+            # Continue on a new sheet once Excel's row limit is reached
+            sheet = workbook.create_sheet(f"Andmed {len(workbook.worksheets) + 1}")
+            sheet.append(keys)
+            sheet_rows = 0
+        sheet.append([_xlsx_value(value) for value in row])
+        sheet_rows += 1
+    return sheet, sheet_rows
+
+
+async def xlsx_chunks(batches: AsyncIterator[Batch]) -> AsyncIterator[bytes]:
+    """Write batches into a write-only workbook on disk, then stream the file"""
+    from openpyxl import Workbook
+
+    loop = asyncio.get_running_loop()
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = 0
+    keys: List[str] = []
+
+    async for keys, rows in batches:
+        sheet, sheet_rows = await loop.run_in_executor(
+            None, _append_xlsx_rows, workbook, sheet, sheet_rows, keys, rows
+        )
+
+    if sheet is None:
+        workbook.create_sheet("Andmed 1").append(keys)
+
+    with tempfile.TemporaryFile() as output:
+        # Saving zips the whole workbook
+        await loop.run_in_executor(None, workbook.save, output)
+        output.seek(0)
+        while True:
+            chunk = await loop.run_in_executor(None, output.read, FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that collects whatever the Parquet writer produced since the last drain"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema(keys: Sequence[str], dialect: str):
+    """Arrow schema from the column kinds (SQLite stores dates as text, so they stay strings there)"""
+    import pyarrow as pa
+
+    types = {
+        "integer": pa.int64(),
+        "numeric": pa.float64(),
+        "boolean": pa.bool_(),
+    }
+    if dialect != "sqlite":
+        types.update({"date": pa.date32(), "timestamp": pa.timestamp("us")})
+
+    fields = []
+    for key in keys:
+        kind = "integer" if key == "id" else schema_registry.column_kind(key)
+        fields.append(pa.field(key, types.get(kind, pa.string())))
+    return pa.schema(fields)
+
+
+def _coerce(value: Any, convert) -> Any:
+    """Convert a value, or None when it does not fit the column type (e.g. text in an SQLite number column)"""
+    if value is None:
+        return None
+    try:
+        return convert(value)
+    except (TypeError, ValueError, ArithmeticError):
+        return None
+
+
+def _parquet_column(values: List[Any], arrow_type) -> List[Any]:
+    """Convert one column of a batch to values the Arrow type accepts"""
+    import pyarrow as pa
+
+    if pa.types.is_string(arrow_type):
+        return [None if value is None else (value.isoformat() if isinstance(value, (date, dt_time)) else str(value))
+                for value in values]
+    if pa.types.is_floating(arrow_type):
+        return [_coerce(value, float) for value in values]
+    if pa.types.is_integer(arrow_type):
+        return [value if isinstance(value, int) else _coerce(value, int) for value in values]
+    return values
+
+
+def _write_parquet_batch(writer, schema, keys: List[str], rows: Sequence[Sequence[Any]]) -> None:
+    """Convert one batch to Arrow arrays and write it as a row group"""
+    import pyarrow as pa
+
+    columns = list(zip(*rows)) if rows else [[] for _ in keys]
+    arrays = [
+        pa.array(_parquet_column(list(column), field.type), type=field.type)
+        for column, field in zip(columns, schema)
+    ]
+    writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+
+async def parquet_chunks(batches: AsyncIterator[Batch], dialect: str) -> AsyncIterator[bytes]:
+    """Encode every batch as one Parquet row group and send it as soon as it is written"""
+    import pyarrow.parquet as pq
+
+    loop = asyncio.get_running_loop()
+    sink = _ChunkSink()
+    writer = None
+
+    async for keys, rows in batches:
+        if writer is None:
+            schema = _parquet_schema(keys, dialect)
+            writer = pq.ParquetWriter(sink, schema, compression="snappy")
+
+        await loop.run_in_executor(None, _write_parquet_batch, writer, schema, keys, rows)
+
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+
+    if writer is not None:
+        await loop.run_in_executor(None, writer.close)
+        yield sink.drain()
+
+
+def encode_export(export_format: str, batches: AsyncIterator[Batch], dialect: str) -> AsyncIterator[bytes]:
+    """Byte stream of the export in the requested format"""
+    if export_format == "xlsx":
+        return xlsx_chunks(batches)
+    if export_format == "parquet":
+        return parquet_chunks(batches, dialect)
+    return csv_chunks(batches)
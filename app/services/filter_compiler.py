@@ -0,0 +1,275 @@
+# app/services/filter_compiler.py
+"""
+Compile AG Grid filter models into parameterized SQL.
+
+A filter model is reduced to its structural shape (field, operator and which
+bounds are present - never the values). The SQL for a shape is compiled once
+per dialect and schema and cached, so identical filters from many users share
+the exact same statement text and only the bind values differ.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.schema_registry import schema_registry
+from app.services.index_advisor import index_advisor
+from app.services.search_index import search_index
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Maximum number of distinct filter shapes kept compiled
+PLAN_CACHE_SIZE = 512
+
+# Operators that compare the column against a single bound value
+COMPARISON_OPERATORS = {
+    "equals": "=",
+    "greaterThan": ">",
+    "greaterThanOrEqual": ">=",
+    "lessThan": "<",
+    "lessThanOrEqual": "<=",
+}
+
+# Operators that match a text pattern, mapped to the LIKE pattern template
+PATTERN_OPERATORS = {
+    "contains": "%{}%",
+    "notContains": "%{}%",
+    "startsWith": "{}%",
+    "endsWith": "%{}",
+}
+
+SUPPORTED_OPERATORS = set(COMPARISON_OPERATORS) | set(PATTERN_OPERATORS) | {
+    "notEqual", "blank", "notBlank", "inRange"
+}
+
+
+class FilterPlan:
+    """Compiled WHERE clauses for one filter-model shape, plus how to bind its values"""
+
+    def __init__(self, key: str, clauses: List[str], binders: List[Tuple[str, str, str, str]]):
+        self.key = key
+        self.clauses = clauses
+        # (param_name, field, value_slot, transform) per bind parameter
+        self.binders = binders
+
+    @property
+    def where_sql(self) -> str:
+        """The combined WHERE clause with a leading space, or an empty string"""
+        if not self.clauses:
+            return ""
+        return f" WHERE {' AND '.join(self.clauses)}"
+
+    def bind(self, filters: Dict[str, Dict[str, Any]], dialect: str) -> Dict[str, Any]:
+        """Extract and convert the bind values for this plan from a normalized filter model"""
+        params = {}
+        for param_name, field, slot, transform in self.binders:
+            value = _slot_value(filters[field], slot)
+            if transform in PATTERN_OPERATORS:
+                params[param_name] = PATTERN_OPERATORS[transform].format(value)
+            else:
+                params[param_name] = coerce_value(field, value, dialect)
+        return params
+
+
+def parse_filter_model(filter_model: Any) -> Dict[str, Dict[str, Any]]:
+    """Parse a filter model (JSON string or dict) and drop entries that cannot be compiled"""
+    if not filter_model:
+        return {}
+
+    if isinstance(filter_model, str):
+        try:
+            filter_model = json.loads(filter_model)
+        except json.JSONDecodeError:
+            logger.error(f"Invalid JSON in filter_model: {filter_model}")
+            raise ValueError("Invalid filter model format")
+
+    if not isinstance(filter_model, dict):
+        raise ValueError("Invalid filter model format")
+
+    filters = {}
+    for field, filter_config in filter_model.items():
+        if not isinstance(filter_config, dict):
+            logger.warning(f"Skipping malformed filter for field {field}")
+            continue
+
+        filter_type = filter_config.get("type")
+        if filter_type not in SUPPORTED_OPERATORS:
+            logger.warning(f"Unsupported filter type: {filter_type}")
+            continue
+
+        # Always allow "id"; anything else must be a known filterable column
+        if field != "id" and not schema_registry.is_filterable(field):
+            logger.warning(f"Field {field} not found in table schema, skipping filter")
+            continue
+
+        filters[field] = _normalize_filter(filter_type, filter_config)
+
+    return filters
+
+
+def _normalize_filter(filter_type: str, filter_config: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce the different AG Grid value layouts to {type, value, from, to}"""
+    value = filter_config.get("filter")
+    if value is None:
+        # AG Grid date filters carry the value in dateFrom
+        value = filter_config.get("dateFrom")
+
+    normalized = {"type": filter_type, "value": value, "from": None, "to": None}
+
+    if filter_type == "inRange":
+        if isinstance(value, dict):
+            # Our own toolbar filters send {"from": .., "to": ..}
+            normalized["from"] = value.get("from")
+            normalized["to"] = value.get("to")
+        else:
+            # Native AG Grid layout: filter/filterTo or dateFrom/dateTo
+            normalized["from"] = value
+            normalized["to"] = filter_config.get("filterTo", filter_config.get("dateTo"))
+        normalized["value"] = None
+
+    return normalized
+
+
+def _has_value(value: Any) -> bool:
+    """Whether a bound was actually provided"""
+    return value is not None and value != ""
+
+
+def _slot_value(normalized: Dict[str, Any], slot: str) -> Any:
+    """Read one value slot ("value", "from", "to") of a normalized filter"""
+    return normalized.get(slot)
+
+
+def filter_shape(filters: Dict[str, Dict[str, Any]]) -> Tuple:
+    """Structural shape of a normalized filter model - everything except the bound values"""
+    shape = []
+    for field in sorted(filters):
+        normalized = filters[field]
+        filter_type = normalized["type"]
+
+        if filter_type == "inRange":
+            bounds = (_has_value(normalized["from"]), _has_value(normalized["to"]))
+            if not any(bounds):
+                continue
+            shape.append((field, filter_type, bounds))
+        elif filter_type in ("blank", "notBlank"):
+            shape.append((field, filter_type, ()))
+        elif normalized["value"] is not None:
+            shape.append((field, filter_type, ()))
+
+    return tuple(shape)
+
+
+def coerce_value(field: str, value: Any, dialect: str) -> Any:
+    """Convert a filter value to the Python type of the column it is compared with"""
+    if value is None:
+        return None
+
+    kind = "integer" if field == "id" else schema_registry.column_kind(field)
+
+    try:
+        if kind == "integer":
+            return int(value)
+        if kind == "numeric":
+            return float(value)
+        if kind in ("date", "timestamp") and dialect == "postgresql" and isinstance(value, str):
+            # asyncpg binds dates strictly, SQLite stores them as ISO text and compares as strings
+            parsed = datetime.fromisoformat(value.strip())
+            return parsed.date() if kind == "date" else parsed
+    except (ValueError, TypeError):
+        pass
+
+    return value
+
+
+def _blank_clause(field: str, kind: str, dialect: str, negate: bool) -> str:
+    """Build a blank / notBlank condition for a column"""
+    if dialect != "sqlite" and kind in ("integer", "numeric", "date", "timestamp", "time", "boolean"):
+        # Non-text PostgreSQL columns can only be blank by being NULL
+        return f'"{field}" IS NOT NULL' if negate else f'"{field}" IS NULL'
+
+    text_expr = f'"{field}"' if dialect == "sqlite" else f'"{field}"::text'
+    if negate:
+        return f'("{field}" IS NOT NULL AND {text_expr} != \'\' AND TRIM({text_expr}) != \'\')'
+    return f'("{field}" IS NULL OR {text_expr} = \'\' OR TRIM({text_expr}) = \'\')'
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _compile_shape(shape: Tuple, dialect: str, schema_fingerprint: str) -> FilterPlan:
+    """Compile a filter shape into a FilterPlan (cached per dialect and schema)"""
+    cast_expr = "" if dialect == "sqlite" else "::text"
+    clauses = []
+    binders = []
+
+    def next_param() -> str:
+        return f"filter_{len(binders)}"
+
+    for field, filter_type, bounds in shape:
+        kind = "integer" if field == "id" else schema_registry.column_kind(field)
+
+        if filter_type in PATTERN_OPERATORS:
+            param_name = next_param()
+            if filter_type == "notContains":
+                clauses.append(f'("{field}" IS NULL OR "{field}"{cast_expr} NOT LIKE :{param_name})')
+            else:
+                clauses.append(f'"{field}"{cast_expr} LIKE :{param_name}')
+            binders.append((param_name, field, "value", filter_type))
+
+        elif filter_type in COMPARISON_OPERATORS:
+            param_name = next_param()
+            clauses.append(f'"{field}" {COMPARISON_OPERATORS[filter_type]} :{param_name}')
+            binders.append((param_name, field, "value", "coerce"))
+
+        elif filter_type == "notEqual":
+            param_name = next_param()
+            clauses.append(f'("{field}" IS NULL OR "{field}" != :{param_name})')
+            binders.append((param_name, field, "value", "coerce"))
+
+        elif filter_type == "blank":
+            clauses.append(_blank_clause(field, kind, dialect, negate=False))
+
+        elif filter_type == "notBlank":
+            clauses.append(_blank_clause(field, kind, dialect, negate=True))
+
+        elif filter_type == "inRange":
+            has_from, has_to = bounds
+            if has_from:
+                param_name = next_param()
+                clauses.append(f'"{field}" >= :{param_name}')
+                binders.append((param_name, field, "from", "coerce"))
+            if has_to:
+                param_name = next_param()
+                clauses.append(f'"{field}" <= :{param_name}')
+                binders.append((param_name, field, "to", "coerce"))
+
+    key = hashlib.md5(repr((shape, dialect, schema_fingerprint)).encode("utf-8")).hexdigest()
+    logger.debug(f"Compiled filter plan {key} with {len(clauses)} clauses")
+    return FilterPlan(key, clauses, binders)
+
+
+def compile_filter_model(filter_model: Any, dialect: str) -> Tuple[FilterPlan, Dict[str, Any]]:
+    """
+    Compile a filter model for the given dialect ("postgresql" or "sqlite").
+
+    Returns the cached plan for the model's shape and the bind parameters for this model.
+    Raises ValueError if the filter model is not valid JSON.
+    """
+    filters = parse_filter_model(filter_model)
+    shape = filter_shape(filters)
+    index_advisor.record_filters(shape)
+    plan = _compile_shape(shape, dialect, schema_registry.fingerprint)
+    return plan, plan.bind(filters, dialect)
+
+
+def build_search_clause(search: Optional[str], dialect: str, query_params: Dict[str, Any]) -> Optional[str]:
+    """Build the global search condition (trigram/FTS5 index when available, else OR over text columns)"""
+    return search_index.build_clause(search, dialect, query_params)
+
+
+def plan_cache_info() -> Dict[str, int]:
+    """Hit/miss statistics of the compiled plan cache"""
+    info = _compile_shape.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
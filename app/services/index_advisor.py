@@ -0,0 +1,289 @@
+# app/services/index_advisor.py
+"""
+Index advisor for the main table.
+
+The filter planner, the sort handling and the Koondaja lookups record which
+columns they use and how (equality, range, prefix/substring pattern, sort).
+Counts are kept in-process and flushed to a Redis hash so every worker and the
+db_manager CLI see the same totals. From those counts the advisor recommends
+B-tree, expression and trigram indexes and can create them on PostgreSQL and
+on the SQLite fallback.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.cache import get_redis, DummyRedis
+from app.models.table import BigTable
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Redis hash holding "<column>|<usage>" -> number of queries
+USAGE_KEY = "bigtable:index_usage"
+
+# Seconds between flushes of the in-process counters to Redis
+USAGE_FLUSH_INTERVAL = 60
+
+# Columns the Koondaja reconciliation looks rows up by - always worth an index
+LOOKUP_COLUMNS = ("toimiku_nr", "viitenumber", "võlgniku_kood", "võlgnik")
+
+# Recorded uses before a grid filter/sort column earns its own index
+MIN_USES = 20
+
+# How each grid filter operator uses its column (blank checks are not index friendly)
+FILTER_USAGE = {
+    "equals": "equality",
+    "notEqual": "equality",
+    "greaterThan": "range",
+    "greaterThanOrEqual": "range",
+    "lessThan": "range",
+    "lessThanOrEqual": "range",
+    "inRange": "range",
+    "startsWith": "prefix",
+    "contains": "pattern",
+    "notContains": "pattern",
+    "endsWith": "pattern",
+}
+
+# PostgreSQL index statistics of the main table, for the hit-rate report
+PG_INDEX_STATS_SQL = f"""
+    SELECT s.indexrelname, s.idx_scan, s.idx_tup_read, io.idx_blks_hit, io.idx_blks_read,
+           pg_relation_size(s.indexrelid)
+    FROM pg_stat_user_indexes s
+    JOIN pg_statio_user_indexes io ON io.indexrelid = s.indexrelid
+    WHERE s.relname = '{BigTable.name}'
+    ORDER BY s.idx_scan DESC
+"""
+
+PG_TABLE_STATS_SQL = f"""
+    SELECT seq_scan, seq_tup_read, idx_scan, idx_tup_fetch
+    FROM pg_stat_user_tables
+    WHERE relname = '{BigTable.name}'
+"""
+
+
+def _index_name(column: str, suffix: str = "") -> str:
+    """Index name for a column of the main table"""
+    return f"idx_{BigTable.name}_{column}{suffix}"
+
+
+def existing_indexes_sql(dialect: str) -> str:
+    """Query listing the index names of the main table"""
+    if dialect == "sqlite":
+        return f"SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = '{BigTable.name}'"
+    # An interrupted CREATE INDEX CONCURRENTLY leaves an invalid index behind - it does not count
+    return (
+        f"SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        f"WHERE i.indrelid = to_regclass('{BigTable.name}') AND i.indisvalid"
+    )
+
+
+def _create_index_sql(dialect: str, name: str, definition: str) -> str:
+    """CREATE INDEX statement; on PostgreSQL built concurrently so the table stays writable"""
+    concurrently = "CONCURRENTLY " if dialect == "postgresql" else ""
+    return f'CREATE INDEX {concurrently}IF NOT EXISTS "{name}" ON "{BigTable.name}" {definition}'
+
+
+def recommend_indexes(
+        usage: Dict[Tuple[str, str], int],
+        columns: Iterable[str],
+        dialect: str,
+        min_uses: int = MIN_USES
+) -> List[Dict[str, Any]]:
+    """
+    Index recommendations for the given usage counts.
+
+    Returns dicts with name, column, method, reason, uses and the CREATE INDEX
+    statement. Columns missing from ``columns`` are ignored, so stale usage of
+    dropped columns never produces a failing statement.
+    """
+    available = set(columns)
+    recommendations: Dict[str, Dict[str, Any]] = {}
+
+    def add(name: str, column: str, method: str, reason: str, uses: int, sql: str) -> None:
+        if name in recommendations:
+            recommendations[name]["uses"] += uses
+            return
+        recommendations[name] = {
+            "name": name, "column": column, "method": method, "reason": reason, "uses": uses, "sql": sql
+        }
+
+    for column in LOOKUP_COLUMNS:
+        if column in available:
+            add(_index_name(column), column, "btree", "Koondaja lookup", usage.get((column, "lookup"), 0),
+                _create_index_sql(dialect, _index_name(column), f'("{column}")'))
+
+    for (column, kind), uses in sorted(usage.items()):
+        if column not in available or column == "id" or uses < min_uses:
+            continue
+
+        if kind in ("equality", "range", "lookup"):
+            add(_index_name(column), column, "btree", f"{kind} filter", uses,
+                _create_index_sql(dialect, _index_name(column), f'("{column}")'))
+
+        elif kind == "sort" or (kind == "sort_desc" and dialect == "sqlite"):
+            # Matches ORDER BY column ASC NULLS LAST, id and the keyset seek condition; SQLite sorts
+            # NULL first, so its backward scan also serves DESC NULLS LAST
+            name = _index_name(column, "_sort")
+            add(name, column, "btree", "sort", uses,
+                _create_index_sql(dialect, name, f'("{column}", "id")'))
+
+        elif kind == "sort_desc":
+            # A backward scan of the ascending index would return NULLs first on PostgreSQL
+            name = _index_name(column, "_sort_desc")
+            add(name, column, "btree", "descending sort", uses,
+                _create_index_sql(dialect, name, f'("{column}" DESC NULLS LAST, "id" DESC)'))
+
+        elif kind == "prefix" and dialect != "sqlite":
+            # startsWith compiles to "column"::text LIKE 'x%'
+            name = _index_name(column, "_prefix")
+            add(name, column, "expression", "startsWith filter", uses,
+                _create_index_sql(dialect, name, f'(("{column}"::text) text_pattern_ops)'))
+
+        elif kind == "pattern" and dialect != "sqlite":
+            name = _index_name(column, "_trgm")
+            add(name, column, "trigram", "contains/endsWith filter", uses,
+                _create_index_sql(dialect, name, f'USING gin (("{column}"::text) gin_trgm_ops)'))
+
+        # SQLite LIKE is case-insensitive and cannot use a B-tree for patterns; global search uses FTS5
+
+    return sorted(recommendations.values(), key=lambda rec: (-rec["uses"], rec["name"]))
+
+
+def create_indexes(conn, dialect: str, recommendations: List[Dict[str, Any]]) -> List[str]:
+    """Create the missing recommended indexes on a DB-API connection (sqlite3 or psycopg2)"""
+    if dialect == "postgresql":
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        conn.commit()
+        autocommit = conn.autocommit
+        conn.autocommit = True
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(existing_indexes_sql(dialect))
+        existing = {row[0] for row in cursor.fetchall()}
+
+        missing = [rec for rec in recommendations if rec["name"] not in existing]
+        if any(rec["method"] == "trigram" for rec in missing):
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+        created = []
+        for rec in missing:
+            try:
+                start_time = time.time()
+                if dialect == "postgresql":
+                    # Drop what an interrupted concurrent build left behind; IF NOT EXISTS would keep it
+                    cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{rec["name"]}"')
+                cursor.execute(rec["sql"])
+                conn.commit()
+                created.append(rec["name"])
+                logger.info(f"Created index {rec['name']} ({rec['reason']}) in {time.time() - start_time:.1f}s")
+            except Exception as e:
+                conn.rollback()
+                logger.warning(f"Could not create index {rec['name']}: {str(e)}")
+
+        if created and dialect == "sqlite":
+            # Give the SQLite planner statistics for the new indexes
+            cursor.execute("ANALYZE")
+            conn.commit()
+
+        return created
+    finally:
+        cursor.close()
+        if dialect == "postgresql":
+            conn.autocommit = autocommit
+
+
+def read_usage_sync(redis_url: str) -> Dict[Tuple[str, str], int]:
+    """Recorded usage from Redis for the CLI; empty if Redis is unreachable"""
+    try:
+        import redis
+        client = redis.Redis.from_url(redis_url, decode_responses=True, socket_connect_timeout=2)
+        return _parse_usage(client.hgetall(USAGE_KEY))
+    except Exception as e:
+        logger.warning(f"Could not read index usage from Redis: {str(e)}")
+        return {}
+
+
+def _parse_usage(raw: Dict[str, Any]) -> Dict[Tuple[str, str], int]:
+    """Decode the Redis usage hash into {(column, usage): count}"""
+    usage = {}
+    for field, count in (raw or {}).items():
+        column, _, kind = field.rpartition("|")
+        if column:
+            usage[(column, kind)] = int(count)
+    return usage
+
+
+class IndexAdvisor:
+    """Collects column usage from the query paths"""
+
+    def __init__(self):
+        self._pending: Counter = Counter()
+        self._last_flush = time.monotonic()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def record(self, column: Optional[str], usage: str, count: int = 1) -> None:
+        """Count one use of a column ("equality", "range", "prefix", "pattern", "sort", "sort_desc" or "lookup")"""
+        if not column or column == "id":
+            return
+        self._pending[(column, usage)] += count
+        self._schedule_flush()
+
+    def record_filters(self, shape: Tuple) -> None:
+        """Count the columns of a compiled filter shape"""
+        for field, filter_type, _ in shape:
+            usage = FILTER_USAGE.get(filter_type)
+            if usage:
+                self.record(field, usage)
+
+    def _schedule_flush(self) -> None:
+        """Flush to Redis in the background at most once per interval"""
+        if time.monotonic() - self._last_flush < USAGE_FLUSH_INTERVAL:
+            return
+        if self._flush_task and not self._flush_task.done():
+            return
+        try:
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+        except RuntimeError:
+            # No running loop (scripts) - counts stay pending
+            pass
+
+    async def flush(self) -> None:
+        """Add the pending counts to the shared Redis hash"""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+
+        redis = await get_redis()
+        if isinstance(redis, DummyRedis):
+            return
+
+        pending, self._pending = self._pending, Counter()
+        try:
+            pipe = redis.pipeline()
+            for (column, usage), count in pending.items():
+                pipe.hincrby(USAGE_KEY, f"{column}|{usage}", count)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error flushing index usage: {str(e)}")
+            self._pending.update(pending)
+
+    async def usage(self) -> Dict[Tuple[str, str], int]:
+        """Shared usage counts plus this worker's unflushed counts"""
+        totals: Counter = Counter()
+        redis = await get_redis()
+        if not isinstance(redis, DummyRedis):
+            try:
+                totals.update(_parse_usage(await redis.hgetall(USAGE_KEY)))
+            except Exception as e:
+                logger.error(f"Error reading index usage: {str(e)}")
+        totals.update(self._pending)
+        return dict(totals)
+
+
+# Create singleton instance
+index_advisor = IndexAdvisor()
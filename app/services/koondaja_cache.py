@@ -0,0 +1,219 @@
+# app/services/koondaja_cache.py
+"""
+On-disk cache of reconciled Koondaja imports.
+
+An entry is the import's record stream (header, "rows" records, summary)
+stored as gzip-compressed NDJSON under DATA_DIR, so it is written while the
+import runs and read back incrementally - neither side holds the whole file.
+
+The key covers the CSV file (path, size, mtime), the table data version and a
+cheap fingerprint of the main table: PostgreSQL's modification counters, or
+the SQLite database file's size and mtime. Any change to taitur_data therefore
+makes earlier entries unreachable; older entries of the same CSV are removed
+when a new one is stored. This is deliberately coarse: a reconciled line
+depends on every row of its võlgnik (the aggregates) and on every candidate
+row of the file (the name fallback), so only a key over the exact rows an
+import read could be narrower, and finding those rows costs as much as the
+import itself.
+
+An entry is checked (gzip CRC and a final summary record) in the default
+executor before any of it is returned, so a truncated or damaged file counts
+as a miss instead of failing a response half way, and decompressing it never
+blocks the event loop.
+"""
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import zlib
+from typing import IO, Any, AsyncIterator, Dict, Optional
+
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import get_data_version
+from app.core.config import settings
+from app.core.db import table_fingerprint
+from app.services.wire_format import json_default
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Cache entries live here, named <path hash>_<key hash>.ndjson.gz
+KOONDAJA_CACHE_DIR = settings.DATA_DIR / "koondaja_cache"
+
+# Part of every key - bump when the import output or the reconciliation rules change
+KOONDAJA_CACHE_FORMAT = 3
+
+# Most entries kept; the least recently used are removed beyond this
+KOONDAJA_CACHE_MAX_ENTRIES = 200
+
+# Unfinished temporary files older than this (seconds) were left by a crashed import
+KOONDAJA_CACHE_TEMP_TTL = 3600
+
+# Bytes read per step when checking an entry
+VALIDATE_BLOCK_SIZE = 256 * 1024
+
+# What reading a damaged entry raises (gzip.BadGzipFile is an OSError)
+DAMAGED_ENTRY_ERRORS = (OSError, EOFError, zlib.error, orjson.JSONDecodeError, ValueError)
+
+
+def _path_hash(file_path: str) -> str:
+    return hashlib.sha1(os.path.realpath(file_path).encode("utf-8")).hexdigest()[:16]
+
+
+class CacheWriter:
+    """Writes one cache entry; it only becomes visible once committed"""
+
+    def __init__(self, cache: "KoondajaCache", file_path: str, path: str):
+        self.cache = cache
+        self.file_path = file_path
+        self.path = path
+        self.temp_path = None
+        self.file = None
+        try:
+            os.makedirs(KOONDAJA_CACHE_DIR, exist_ok=True)
+            # A unique name per writer - concurrent imports of the same file must not share it
+            fd, self.temp_path = tempfile.mkstemp(dir=KOONDAJA_CACHE_DIR, suffix=".tmp")
+            os.close(fd)
+            self.file = gzip.open(self.temp_path, "wb", compresslevel=5)
+        except Exception as e:
+            logger.warning(f"Koondaja cache disabled for this import: {str(e)}")
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self.file is not None:
+            self.file.write(orjson.dumps(record, default=json_default, option=orjson.OPT_APPEND_NEWLINE))
+
+    def commit(self) -> None:
+        """Publish the entry and drop older entries of the same CSV file"""
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        try:
+            os.replace(self.temp_path, self.path)
+        except OSError as e:
+            # e.g. Windows refuses to replace an entry another request is reading - the import still succeeded
+            logger.warning(f"Could not store Koondaja cache entry: {str(e)}")
+            try:
+                os.remove(self.temp_path)
+            except OSError:
+                pass
+            return
+        self.cache.prune(self.file_path, keep=self.path)
+
+    def close(self) -> None:
+        """Discard the entry unless it was committed"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            try:
+                os.remove(self.temp_path)
+            except OSError:
+                pass
+
+
+class KoondajaCache:
+    """Reconciled import results keyed by CSV file state and table data version"""
+
+    async def key_for(self, db: AsyncSession, file_path: str) -> str:
+        """Cache entry path for the current state of a CSV file and of the table"""
+        stat = os.stat(file_path)
+        parts = [
+            KOONDAJA_CACHE_FORMAT,
+            os.path.realpath(file_path),
+            stat.st_size,
+            stat.st_mtime_ns,
+            await get_data_version(),
+            await table_fingerprint(db),
+        ]
+        key_hash = hashlib.sha1(orjson.dumps(parts)).hexdigest()
+        return str(KOONDAJA_CACHE_DIR / f"{_path_hash(file_path)}_{key_hash}.ndjson.gz")
+
+    async def read(self, key: str) -> Optional[AsyncIterator[Dict[str, Any]]]:
+        """Records of a cached import, or None on a miss; a damaged entry is removed and counts as a miss"""
+        f = await asyncio.get_running_loop().run_in_executor(None, self._open_checked, key)
+        return self._iter_records(f) if f is not None else None
+
+    def _open_checked(self, key: str) -> Optional[IO[bytes]]:
+        """Open and check an entry, positioned at its first record (blocking)"""
+        if not os.path.exists(key):
+            return None
+
+        f = None
+        try:
+            # The open handle keeps the checked file even if another import prunes it meanwhile
+            f = gzip.open(key, "rb")
+            self._validate(f)
+            f.seek(0)
+            # Mark as recently used for pruning
+            os.utime(key)
+        except DAMAGED_ENTRY_ERRORS as e:
+            if f is not None:
+                f.close()
+            logger.warning(f"Discarding damaged Koondaja cache entry {os.path.basename(key)}: {str(e)}")
+            try:
+                os.remove(key)
+            except OSError:
+                pass
+            return None
+        return f
+
+    def _validate(self, f: IO[bytes]) -> None:
+        """Read the whole entry (gzip checks its CRC and length at the end) and check its last record"""
+        tail = b""
+        while True:
+            block = f.read(VALIDATE_BLOCK_SIZE)
+            if not block:
+                break
+            tail = (tail + block)[-VALIDATE_BLOCK_SIZE:]
+
+        last_line = tail.rstrip(b"\n").rpartition(b"\n")[2]
+        if orjson.loads(last_line).get("type") != "summary":
+            raise ValueError("entry does not end with a summary record")
+
+    async def _iter_records(self, f: IO[bytes]) -> AsyncIterator[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                # A "rows" record is a whole reconciled chunk, so decompress it off the event loop
+                line = await loop.run_in_executor(None, f.readline)
+                if not line:
+                    break
+                yield orjson.loads(line)
+        finally:
+            f.close()
+
+    def writer(self, file_path: str, key: str) -> CacheWriter:
+        return CacheWriter(self, file_path, key)
+
+    def prune(self, file_path: str, keep: str) -> None:
+        """Remove stale entries of a CSV file and the least recently used beyond the size limit"""
+        try:
+            prefix = f"{_path_hash(file_path)}_"
+            entries = []
+            for name in os.listdir(KOONDAJA_CACHE_DIR):
+                path = str(KOONDAJA_CACHE_DIR / name)
+                if name.endswith(".tmp"):
+                    if time.time() - os.path.getmtime(path) > KOONDAJA_CACHE_TEMP_TTL:
+                        os.remove(path)
+                    continue
+                if path == keep or not name.endswith(".ndjson.gz"):
+                    continue
+                if name.startswith(prefix):
+                    os.remove(path)
+                else:
+                    entries.append((os.path.getmtime(path), path))
+
+            entries.sort(reverse=True)
+            for _, path in entries[KOONDAJA_CACHE_MAX_ENTRIES - 1:]:
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"Error pruning Koondaja cache: {str(e)}")
+
+
+# Create a singleton instance
+koondaja_cache = KoondajaCache()
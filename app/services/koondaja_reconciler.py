@@ -0,0 +1,270 @@
+# app/services/koondaja_reconciler.py
+"""
+Set-based reconciliation of Koondaja bank statement lines against the main table.
+
+The lookup keys of every CSV line (toimiku number from the payment
+explanation, viitenumber, isiku-/registrikood) are sent as a VALUES list and a
+single statement resolves, per line, the viitenumber and registrikood
+matches, the final toimiku number with its match source, the database record
+used for the display columns and the võlgnik aggregates. Every lookup is an
+index seek on the Koondaja lookup columns, so a statement with tens of
+thousands of lines is reconciled in one pass instead of being probed line by
+line in Python.
+
+The name fallback only considers the rows that the keys of the whole file
+match (the file's candidate rows), so it is resolved once per file by
+load_candidates and handed to every batch.
+"""
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.table import BigTable
+from app.services.index_advisor import index_advisor
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# CSV lines per statement (5 bind parameters each, well below the SQLite and asyncpg limits)
+RECONCILE_BATCH_SIZE = 2000
+
+# Keys per candidate lookup statement
+CANDIDATE_BATCH_SIZE = 5000
+
+# Database fields shown for a matched record
+RECORD_FIELDS = ("võlgnik", "nõude_sisu", "võla_jääk", "staatus", "rmp_märkused", "märkused")
+
+# (line number, toimiku nr from the explanation, viitenumber, isiku-/registrikood)
+LineKeys = Tuple[int, Optional[str], Optional[str], Optional[str]]
+
+# Business rules of the final toimiku number, in order:
+#   1. toimiku nr in the explanation equals the toimiku nr found by viitenumber
+#   2. or equals the toimiku nr found by isiku-/registrikood
+#   3. or the võlgnik of the viitenumber, registrikood or toimiku match (in that
+#      order) has a toimiku with a number among the file's candidate rows - the
+#      rows any toimiku nr, viitenumber or isiku-/registrikood of the file
+#      matches - and the lowest id wins. Searching the file's candidates (not
+#      one batch, not the whole table) keeps the results of the row-by-row
+#      import this replaced; a line's result therefore depends on the other
+#      lines of its file. Resolved in Python by Candidates.name_toimiku.
+#   4. otherwise no final toimiku number
+# The record for the display columns is the one with the final toimiku number,
+# else the viitenumber match, else the registrikood match.
+RECONCILE_SQL = """
+    WITH csv_keys(line_no, toimiku, viitenumber, registrikood, name_toimiku) AS (
+        VALUES {values}
+    ),
+    candidates AS (
+        SELECT k.line_no, k.toimiku, k.name_toimiku,
+            (SELECT d."id" FROM "{table}" d WHERE d."viitenumber" = k.viitenumber
+             ORDER BY d."id" LIMIT 1) AS v_id,
+            (SELECT d."id" FROM "{table}" d WHERE d."võlgniku_kood" = k.registrikood
+             ORDER BY d."id" LIMIT 1) AS r_id
+        FROM csv_keys k
+    ),
+    keyed AS (
+        SELECT c.line_no, c.toimiku, c.name_toimiku, c.v_id, c.r_id,
+            v."toimiku_nr" AS v_toimiku,
+            r."toimiku_nr" AS r_toimiku
+        FROM candidates c
+        LEFT JOIN "{table}" v ON v."id" = c.v_id
+        LEFT JOIN "{table}" r ON r."id" = c.r_id
+    ),
+    resolved AS (
+        SELECT k.line_no, k.v_id, k.r_id, k.v_toimiku,
+            CASE
+                WHEN k.toimiku = k.v_toimiku THEN 'viitenumber'
+                WHEN k.toimiku = k.r_toimiku THEN 'registrikood'
+                WHEN k.name_toimiku IS NOT NULL THEN 'name'
+            END AS match_source,
+            CASE
+                WHEN k.toimiku = k.v_toimiku OR k.toimiku = k.r_toimiku THEN k.toimiku
+                ELSE k.name_toimiku
+            END AS toimiku_loplik
+        FROM keyed k
+    ),
+    final AS (
+        SELECT r.line_no, r.v_toimiku, r.match_source, r.toimiku_loplik,
+            COALESCE(
+                (SELECT d."id" FROM "{table}" d WHERE d."toimiku_nr" = r.toimiku_loplik ORDER BY d."id" LIMIT 1),
+                r.v_id,
+                r.r_id
+            ) AS record_id
+        FROM resolved r
+    ),
+    names AS (
+        SELECT DISTINCT d."võlgnik" AS name
+        FROM final f
+        JOIN "{table}" d ON d."id" = f.record_id
+        WHERE d."võlgnik" IS NOT NULL
+    ),
+    aggregates AS (
+        SELECT d."võlgnik" AS name, COUNT(DISTINCT d."toimiku_nr") AS toimiku_count, SUM(d."võla_jääk") AS total_jaak
+        FROM "{table}" d
+        JOIN names n ON d."võlgnik" = n.name
+        GROUP BY d."võlgnik"
+    )
+    SELECT f.line_no, f.v_toimiku, f.toimiku_loplik, f.match_source, f.record_id,
+        {record_columns},
+        a.toimiku_count, a.total_jaak
+    FROM final f
+    LEFT JOIN "{table}" d ON d."id" = f.record_id
+    LEFT JOIN aggregates a ON a.name = d."võlgnik"
+"""
+
+
+def _key(value: Optional[str]) -> Optional[str]:
+    """Empty keys never match anything"""
+    return value or None
+
+
+def _keep_lowest(entries: Dict[Any, Tuple[int, Any]], key: Any, row_id: int, value: Any) -> None:
+    """Remember value under key unless a row with a lower id is already there"""
+    current = entries.get(key)
+    if current is None or row_id < current[0]:
+        entries[key] = (row_id, value)
+
+
+class Candidates:
+    """The rows matched by the keys of a whole file, reduced to what the name fallback needs"""
+
+    def __init__(self):
+        # key -> (lowest id, võlgnik) of the rows with that key
+        self.by_toimiku: Dict[str, Tuple[int, Optional[str]]] = {}
+        self.by_viitenumber: Dict[str, Tuple[int, Optional[str]]] = {}
+        self.by_registrikood: Dict[str, Tuple[int, Optional[str]]] = {}
+        # võlgnik -> (lowest id, toimiku nr) of its candidate rows with a toimiku number
+        self.by_name: Dict[str, Tuple[int, str]] = {}
+
+    def add(self, row_id: int, toimiku_nr: Optional[str], viitenumber: Optional[str],
+            registrikood: Optional[str], name: Optional[str]) -> None:
+        """Index one candidate row"""
+        if toimiku_nr:
+            _keep_lowest(self.by_toimiku, toimiku_nr, row_id, name)
+            if name:
+                _keep_lowest(self.by_name, name, row_id, toimiku_nr)
+        if viitenumber:
+            _keep_lowest(self.by_viitenumber, viitenumber, row_id, name)
+        if registrikood:
+            _keep_lowest(self.by_registrikood, registrikood, row_id, name)
+
+    def name_toimiku(self, toimiku: Optional[str], viitenumber: Optional[str],
+                     registrikood: Optional[str]) -> Optional[str]:
+        """Rule 3: toimiku nr of the võlgnik of the viitenumber, registrikood or toimiku match"""
+        match = (self.by_viitenumber.get(_key(viitenumber))
+                 or self.by_registrikood.get(_key(registrikood))
+                 or self.by_toimiku.get(_key(toimiku)))
+        if match is None or not match[1]:
+            return None
+        named = self.by_name.get(match[1])
+        return named[1] if named else None
+
+
+async def load_candidates(
+        db: AsyncSession,
+        toimikud: Iterable[Optional[str]],
+        viitenumbers: Iterable[Optional[str]],
+        registrikoodid: Iterable[Optional[str]]
+) -> Candidates:
+    """Fetch the candidate rows of a file: every row any of its toimiku numbers, viitenumbers or registrikoodid matches"""
+    candidates = Candidates()
+    for column, keys in (("toimiku_nr", toimikud), ("viitenumber", viitenumbers), ("võlgniku_kood", registrikoodid)):
+        keys = sorted({key for key in keys if key})
+        for start in range(0, len(keys), CANDIDATE_BATCH_SIZE):
+            batch = keys[start:start + CANDIDATE_BATCH_SIZE]
+            placeholders = ", ".join(f":k{i}" for i in range(len(batch)))
+            result = await db.execute(
+                text(f'SELECT "id", "toimiku_nr", "viitenumber", "võlgniku_kood", "võlgnik" '
+                     f'FROM "{BigTable.name}" WHERE "{column}" IN ({placeholders})'),
+                {f"k{i}": key for i, key in enumerate(batch)}
+            )
+            for row in result.fetchall():
+                candidates.add(*row)
+    return candidates
+
+
+def _build_statement(batch: Sequence[LineKeys], candidates: Candidates) -> Tuple[str, Dict[str, Any]]:
+    """Reconcile statement and parameters for one batch of lines"""
+    values = []
+    params: Dict[str, Any] = {}
+    for i, (line_no, toimiku, viitenumber, registrikood) in enumerate(batch):
+        # Typed placeholders: PostgreSQL cannot infer the types of bare VALUES parameters
+        values.append(
+            f"(CAST(:l{i} AS INTEGER), CAST(:t{i} AS TEXT), CAST(:v{i} AS TEXT), CAST(:r{i} AS TEXT), "
+            f"CAST(:n{i} AS TEXT))"
+        )
+        params.update({
+            f"l{i}": line_no,
+            f"t{i}": _key(toimiku),
+            f"v{i}": _key(viitenumber),
+            f"r{i}": _key(registrikood),
+            f"n{i}": candidates.name_toimiku(toimiku, viitenumber, registrikood),
+        })
+
+    sql = RECONCILE_SQL.format(
+        table=BigTable.name,
+        values=",\n        ".join(values),
+        record_columns=", ".join(f'd."{field}"' for field in RECORD_FIELDS),
+    )
+    return sql, params
+
+
+def _match_from_row(row: Sequence[Any]) -> Dict[str, Any]:
+    """Match dict of one result row"""
+    _, v_toimiku, toimiku_loplik, match_source, record_id = row[:5]
+    record_values = row[5:5 + len(RECORD_FIELDS)]
+    toimiku_count, total_jaak = row[5 + len(RECORD_FIELDS):]
+
+    return {
+        "toimiku_nr_viitenumbris": v_toimiku or "",
+        "toimiku_nr_loplik": toimiku_loplik or "",
+        "match_source": match_source,
+        "record": dict(zip(RECORD_FIELDS, record_values)) if record_id is not None else None,
+        "toimikute_arv": toimiku_count or 0,
+        "toimikute_jaakide_summa": float(total_jaak) if total_jaak else 0.0,
+    }
+
+
+async def reconcile_lines(
+        db: AsyncSession,
+        lines: List[LineKeys],
+        candidates: Optional[Candidates] = None
+) -> Dict[int, Dict[str, Any]]:
+    """
+    Resolve the database matches of CSV lines, keyed by line number.
+
+    Each value holds toimiku_nr_viitenumbris, toimiku_nr_loplik, match_source
+    ('viitenumber', 'registrikood', 'name' or None), the matched record (or
+    None) and the toimikute_arv / toimikute_jaakide_summa aggregates of its
+    võlgnik. Lines without any key are not sent to the database. When the
+    lines are one batch of a file, pass the file's candidates; by default the
+    lines are treated as the whole file.
+    """
+    lines = [line for line in lines if any(line[1:])]
+    if not lines:
+        return {}
+
+    for column in ("toimiku_nr", "viitenumber", "võlgniku_kood", "võlgnik"):
+        index_advisor.record(column, "lookup")
+
+    matches: Dict[int, Dict[str, Any]] = {}
+    try:
+        if candidates is None:
+            candidates = await load_candidates(
+                db, (line[1] for line in lines), (line[2] for line in lines), (line[3] for line in lines)
+            )
+        for start in range(0, len(lines), RECONCILE_BATCH_SIZE):
+            sql, params = _build_statement(lines[start:start + RECONCILE_BATCH_SIZE], candidates)
+            result = await db.execute(text(sql), params)
+            for row in result.fetchall():
+                matches[row[0]] = _match_from_row(row)
+    except Exception as e:
+        logger.error(f"Error reconciling Koondaja lines: {str(e)}")
+        # A failed statement aborts the whole transaction on PostgreSQL - leave the session usable
+        await db.rollback()
+        raise
+
+    logger.info(f"Reconciled {len(lines)} Koondaja lines, {sum(1 for m in matches.values() if m['record'])} matched")
+    return matches
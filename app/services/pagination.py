@@ -0,0 +1,112 @@
+# app/services/pagination.py
+import base64
+import logging
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Unique, always-present column used as the tiebreaker for keyset pagination
+KEY_COLUMN = "id"
+
+# Types a decoded cursor value may have; anything else cannot be bound to the seek predicate
+CURSOR_VALUE_TYPES = (str, int, float, Decimal, date, datetime)
+
+
+def _encode_value(value: Any) -> Any:
+    """Tag values that JSON cannot round-trip so the seek predicate binds the original type"""
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"$d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"$n": str(value)}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    """Reverse of _encode_value"""
+    if isinstance(value, dict):
+        if "$dt" in value:
+            return datetime.fromisoformat(value["$dt"])
+        if "$d" in value:
+            return date.fromisoformat(value["$d"])
+        if "$n" in value:
+            return Decimal(value["$n"])
+    return value
+
+
+def normalize_sort(sort_field: Optional[str], sort_dir: Optional[str]) -> Tuple[Optional[str], str]:
+    """Return (sort_field, direction) with sorting on the key column folded into the tiebreaker"""
+    direction = "DESC" if sort_dir and sort_dir.lower() == "desc" else "ASC"
+    if sort_field == KEY_COLUMN:
+        sort_field = None
+    return sort_field or None, direction
+
+
+def build_order_by(sort_field: Optional[str], direction: str) -> str:
+    """Build a deterministic ORDER BY clause that matches the seek predicate"""
+    if sort_field:
+        # NULLS LAST keeps PostgreSQL and SQLite in the same order
+        return f' ORDER BY "{sort_field}" {direction} NULLS LAST, "{KEY_COLUMN}" {direction}'
+    return f' ORDER BY "{KEY_COLUMN}" {direction}'
+
+
+def build_seek_clause(
+        sort_field: Optional[str],
+        direction: str,
+        sort_value: Any,
+        row_id: Any,
+        query_params: Dict[str, Any]
+) -> str:
+    """Build the WHERE condition that starts right after the cursor row and add its bind values"""
+    op = "<" if direction == "DESC" else ">"
+    query_params["cursor_id"] = row_id
+
+    if not sort_field:
+        return f'"{KEY_COLUMN}" {op} :cursor_id'
+
+    if sort_value is None:
+        # Already inside the trailing NULL block - only the tiebreaker can advance
+        return f'("{sort_field}" IS NULL AND "{KEY_COLUMN}" {op} :cursor_id)'
+
+    query_params["cursor_value"] = sort_value
+    return (f'(("{sort_field}", "{KEY_COLUMN}") {op} (:cursor_value, :cursor_id) '
+            f'OR "{sort_field}" IS NULL)')
+
+
+def encode_cursor(sort_field: Optional[str], direction: str, sort_value: Any, row_id: Any) -> str:
+    """Build an opaque "after" token from the last row of a page"""
+    payload = {
+        "f": sort_field,
+        "d": direction,
+        "v": _encode_value(sort_value),
+        "id": _encode_value(row_id)
+    }
+    return base64.urlsafe_b64encode(orjson.dumps(payload)).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, sort_field: Optional[str], direction: str) -> Tuple[Any, Any]:
+    """Decode an "after" token into (sort_value, row_id), rejecting tokens from another sort order"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = orjson.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(payload, dict) or "id" not in payload:
+            raise ValueError("Malformed cursor payload")
+        sort_value = _decode_value(payload.get("v"))
+        row_id = _decode_value(payload["id"])
+        if (sort_value is not None and not isinstance(sort_value, CURSOR_VALUE_TYPES)) \
+                or not isinstance(row_id, CURSOR_VALUE_TYPES):
+            raise ValueError("Unsupported cursor value type")
+    except (ValueError, TypeError, InvalidOperation, UnicodeEncodeError) as e:
+        logger.warning(f"Invalid pagination cursor: {str(e)}")
+        raise ValueError("Invalid cursor")
+
+    if payload.get("f") != sort_field or payload.get("d") != direction:
+        raise ValueError("Cursor does not match the requested sort order")
+
+    return sort_value, row_id
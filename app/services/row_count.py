@@ -0,0 +1,143 @@
+# app/services/row_count.py
+"""
+Row count strategy for the grid.
+
+Exact counts are cached per data version, table fingerprint, filter plan and
+bind values, so a data change makes them stale without deleting anything. When no exact count
+is cached, PostgreSQL planner statistics (pg_class.reltuples for the whole
+table, EXPLAIN row estimates for filtered queries) are used for large results
+and the exact count is computed in the background instead of blocking the page.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import LocalCache, get_cache, set_cache, get_data_version, compute_cache_key
+from app.core.db import get_db_context, get_dialect_name, table_fingerprint
+from app.models.table import BigTable
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Exact counts stay valid until the data version changes; the TTL only reaps old versions
+COUNT_CACHE_TTL = 3600
+
+# Below this estimate an exact COUNT(*) is cheap enough to run inline
+EXACT_COUNT_THRESHOLD = 100000
+
+# Background exact counts currently running, by cache key
+_pending_counts: Dict[str, asyncio.Task] = {}
+
+# Finished counts this worker could not put in the shared cache (no Redis), so a
+# background count is not restarted by every request
+_local_counts = LocalCache(max_entries=256, max_ttl=COUNT_CACHE_TTL)
+
+
+async def _count_cache_key(db: AsyncSession, plan_key: str, query_params: Dict[str, Any]) -> str:
+    """Cache key of the exact count for the current table state, a filter plan and its bind values"""
+    values = {name: repr(value) for name, value in query_params.items()}
+    version = await get_data_version()
+    return f"row_count:v{version}:{await table_fingerprint(db)}:{plan_key}:{await compute_cache_key(values)}"
+
+
+async def _store_count(cache_key: str, total: int) -> None:
+    """Cache an exact count in Redis, or in this worker when Redis is unavailable"""
+    if not await set_cache(cache_key, total, expire=COUNT_CACHE_TTL):
+        _local_counts.set(cache_key, str(total), COUNT_CACHE_TTL)
+
+
+async def _cached_count(cache_key: str) -> Optional[int]:
+    """Exact count from the shared cache or this worker's fallback, or None"""
+    cached = await get_cache(cache_key)
+    if cached is None:
+        cached = _local_counts.get(cache_key)
+    return int(cached) if cached is not None else None
+
+
+async def _exact_count(db: AsyncSession, where_sql: str, query_params: Dict[str, Any]) -> int:
+    """Run SELECT COUNT(*) for the given WHERE clause"""
+    count_sql = f'SELECT COUNT(*) FROM "{BigTable.name}"{where_sql}'
+    result = await db.execute(text(count_sql), query_params)
+    return result.scalar() or 0
+
+
+async def _estimate_count(db: AsyncSession, where_sql: str, query_params: Dict[str, Any]) -> Optional[int]:
+    """Planner estimate of the row count on PostgreSQL, or None if no usable estimate exists"""
+    try:
+        if not where_sql:
+            result = await db.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table_name)"),
+                {"table_name": f'"{BigTable.name}"'}
+            )
+            estimate = result.scalar()
+        else:
+            result = await db.execute(
+                text(f'EXPLAIN (FORMAT JSON) SELECT 1 FROM "{BigTable.name}"{where_sql}'),
+                query_params
+            )
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = plan[0]["Plan"]["Plan Rows"]
+    except Exception as e:
+        logger.warning(f"Could not estimate row count: {str(e)}")
+        return None
+
+    # reltuples is -1 (or 0) for tables that were never analyzed
+    if estimate is None or estimate <= 0:
+        return None
+    return int(estimate)
+
+
+async def _count_in_background(cache_key: str, where_sql: str, query_params: Dict[str, Any]) -> None:
+    """Compute an exact count in its own session and cache it"""
+    try:
+        async with get_db_context() as session:
+            total = await _exact_count(session, where_sql, query_params)
+
+        # The key carries the data version the count was started under
+        await _store_count(cache_key, total)
+        logger.info(f"Background exact count finished: {total} rows")
+    except Exception as e:
+        logger.error(f"Background row count failed: {str(e)}")
+    finally:
+        _pending_counts.pop(cache_key, None)
+
+
+async def get_row_count(
+        db: AsyncSession,
+        plan_key: str,
+        where_sql: str,
+        query_params: Dict[str, Any],
+        allow_estimate: bool = True
+) -> Tuple[int, bool]:
+    """
+    Return (row_count, is_exact) for a compiled WHERE clause.
+
+    With allow_estimate, large PostgreSQL results are answered from planner
+    statistics while the exact count is computed in the background.
+    """
+    cache_key = await _count_cache_key(db, plan_key, query_params)
+
+    cached = await _cached_count(cache_key)
+    if cached is not None:
+        return cached, True
+
+    # SQLite keeps no planner row estimates, so the local fallback always counts exactly
+    if allow_estimate and get_dialect_name() == "postgresql":
+        estimate = await _estimate_count(db, where_sql, query_params)
+        if estimate is not None and estimate >= EXACT_COUNT_THRESHOLD:
+            if cache_key not in _pending_counts:
+                _pending_counts[cache_key] = asyncio.create_task(
+                    _count_in_background(cache_key, where_sql, dict(query_params))
+                )
+            return estimate, False
+
+    total = await _exact_count(db, where_sql, query_params)
+    await _store_count(cache_key, total)
+    return total, True
+
@@ -0,0 +1,120 @@
+# app/services/row_materializer.py
+"""
+Turn database result rows into JSON-ready rows.
+
+A converter is picked once per column - from the schema registry for known
+columns, otherwise from the first non-NULL value - so only the columns that
+need it (dates, timestamps, Decimals) are touched per row. Everything else is
+zipped with a precomputed key tuple.
+"""
+import logging
+from datetime import date, time
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.schema_registry import schema_registry
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+Converter = Optional[Callable[[Any], Any]]
+
+# Column kinds whose values come back as date/time objects
+TEMPORAL_KINDS = ("date", "timestamp", "time")
+
+
+def _isoformat(value: Any) -> Any:
+    """ISO string for date/time values, anything else unchanged (SQLite returns strings)"""
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return value
+
+
+def _decimal_to_float(value: Any) -> Any:
+    """float for Decimal values (orjson cannot encode Decimal), anything else unchanged"""
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _converter_for_value(value: Any, native_datetimes: bool) -> Converter:
+    """Pick a converter from a sample value"""
+    if isinstance(value, Decimal):
+        return _decimal_to_float
+    if isinstance(value, (date, time)) and not native_datetimes:
+        return _isoformat
+    return None
+
+
+def column_converters(
+        keys: Sequence[str],
+        rows: Sequence[Sequence[Any]],
+        native_datetimes: bool = True
+) -> List[Converter]:
+    """
+    One converter (or None) per column.
+
+    With native_datetimes the rows are going straight to orjson, which encodes
+    date and datetime values itself, so only Decimals need converting.
+    """
+    converters: List[Converter] = []
+
+    for index, key in enumerate(keys):
+        column = schema_registry.get_column(key)
+        if column and column["kind"] in TEMPORAL_KINDS:
+            converters.append(None if native_datetimes else _isoformat)
+            continue
+        if column and column["kind"] not in ("numeric", "other"):
+            # Integers, text and booleans are JSON-native
+            converters.append(None)
+            continue
+
+        # Numeric (maybe Decimal), unknown or computed column - look at the first non-NULL value
+        converter = None
+        for row in rows:
+            value = row[index]
+            if value is not None:
+                converter = _converter_for_value(value, native_datetimes)
+                break
+        converters.append(converter)
+
+    return converters
+
+
+def materialize_rows(
+        keys: Sequence[Any],
+        rows: Sequence[Sequence[Any]],
+        native_datetimes: bool = True
+) -> List[Dict[str, Any]]:
+    """Build row dicts using a precomputed key tuple and per-column converters"""
+    key_tuple: Tuple[str, ...] = tuple(str(key) for key in keys)
+    converters = column_converters(key_tuple, rows, native_datetimes)
+    converted = [(index, converter) for index, converter in enumerate(converters) if converter]
+
+    if not converted:
+        return [dict(zip(key_tuple, row)) for row in rows]
+
+    data = []
+    for row in rows:
+        values = list(row)
+        for index, converter in converted:
+            values[index] = converter(values[index])
+        data.append(dict(zip(key_tuple, values)))
+    return data
+
+
+def materialize_columns(
+        keys: Sequence[Any],
+        rows: Sequence[Sequence[Any]],
+        native_datetimes: bool = True
+) -> Dict[str, List]:
+    """Build {"fields": [...], "values": [[column values], ...]} with per-column converters"""
+    fields = [str(key) for key in keys]
+    converters = column_converters(fields, rows, native_datetimes)
+
+    values = [list(column) for column in zip(*rows)] if rows else [[] for _ in fields]
+    for index, converter in enumerate(converters):
+        if converter:
+            values[index] = [converter(value) for value in values[index]]
+
+    return {"fields": fields, "values": values}
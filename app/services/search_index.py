@@ -0,0 +1,283 @@
+# app/services/search_index.py
+"""
+Index-driven global search.
+
+Every row gets a search document: its text columns joined and lower-cased.
+On PostgreSQL the document is an expression backed by a pg_trgm GIN index,
+which PostgreSQL maintains itself. On the SQLite fallback the documents live
+in an FTS5 trigram table keyed by row id; it is maintained from the edit path,
+rebuilt after every PostgreSQL -> SQLite snapshot and refreshed per id range
+by the delta sync. Without either index the search falls back to an OR of
+LIKE conditions over the text columns.
+"""
+import logging
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from sqlalchemy import text
+
+from app.core.schema_registry import schema_registry
+from app.models.table import BigTable
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# SQLite FTS5 table holding one search document per row (rowid = id)
+SEARCH_TABLE = f"{BigTable.name}_search"
+
+# PostgreSQL trigram index over the search document expression
+PG_SEARCH_INDEX = f"idx_{BigTable.name}_search_trgm"
+
+# Rows written per batch when (re)building the SQLite search table
+REBUILD_BATCH_SIZE = 5000
+
+
+def build_document(values: Iterable[Any]) -> str:
+    """Search document of one row: non-empty text values, lower-cased, one per line"""
+    return "\n".join(str(value) for value in values if value not in (None, "")).lower()
+
+
+def _escape_like(term: str) -> str:
+    """Escape LIKE wildcards so the search term is matched literally"""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _sqlite_text_columns(cursor) -> list:
+    """Text columns of the main table from its declared SQLite types"""
+    cursor.execute(f'PRAGMA table_info("{BigTable.name}")')
+    return [
+        name for _, name, declared_type, *_ in cursor.fetchall()
+        if not declared_type or any(t in declared_type.upper() for t in ("CHAR", "TEXT", "CLOB"))
+    ]
+
+
+def rebuild_sqlite_search_table(
+        conn,
+        text_columns: Optional[Sequence[str]] = None,
+        commit: bool = True
+) -> int:
+    """
+    Recreate and fill the FTS5 search table.
+
+    Works on a plain sqlite3 connection (db_manager) and on the DB-API adapter of
+    the async engine; rows are read in id order one batch at a time.
+    """
+    cursor = conn.cursor()
+    if text_columns is None:
+        text_columns = _sqlite_text_columns(cursor)
+
+    cursor.execute(f'DROP TABLE IF EXISTS "{SEARCH_TABLE}"')
+    cursor.execute(f'CREATE VIRTUAL TABLE "{SEARCH_TABLE}" USING fts5(document, tokenize=\'trigram\')')
+
+    total = 0
+    if text_columns:
+        column_list = ", ".join(f'"{col}"' for col in text_columns)
+        last_id = None
+        while True:
+            if last_id is None:
+                cursor.execute(
+                    f'SELECT "id", {column_list} FROM "{BigTable.name}" ORDER BY "id" LIMIT ?',
+                    (REBUILD_BATCH_SIZE,)
+                )
+            else:
+                cursor.execute(
+                    f'SELECT "id", {column_list} FROM "{BigTable.name}" WHERE "id" > ? ORDER BY "id" LIMIT ?',
+                    (last_id, REBUILD_BATCH_SIZE)
+                )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            cursor.executemany(
+                f'INSERT INTO "{SEARCH_TABLE}"(rowid, document) VALUES (?, ?)',
+                [(row[0], build_document(row[1:])) for row in rows]
+            )
+            total += len(rows)
+            last_id = rows[-1][0]
+
+    if commit:
+        conn.commit()
+    cursor.close()
+    logger.info(f"Built SQLite search table with {total} documents")
+    return total
+
+
+def refresh_sqlite_search_range(
+        conn,
+        first_id: int,
+        last_id: int,
+        text_columns: Optional[Sequence[str]] = None,
+        commit: bool = True
+) -> int:
+    """
+    Rewrite the search documents of an id range after its rows were re-copied (delta sync).
+
+    Does nothing if the search table has not been built yet.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (SEARCH_TABLE,))
+    if not cursor.fetchone():
+        cursor.close()
+        return 0
+
+    if text_columns is None:
+        text_columns = _sqlite_text_columns(cursor)
+
+    cursor.execute(f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid BETWEEN ? AND ?', (first_id, last_id))
+    total = 0
+    if text_columns:
+        column_list = ", ".join(f'"{col}"' for col in text_columns)
+        cursor.execute(
+            f'SELECT "id", {column_list} FROM "{BigTable.name}" WHERE "id" BETWEEN ? AND ?',
+            (first_id, last_id)
+        )
+        rows = cursor.fetchall()
+        cursor.executemany(
+            f'INSERT INTO "{SEARCH_TABLE}"(rowid, document) VALUES (?, ?)',
+            [(row[0], build_document(row[1:])) for row in rows]
+        )
+        total = len(rows)
+
+    if commit:
+        conn.commit()
+    cursor.close()
+    return total
+
+
+class SearchIndex:
+    """Chooses how global search is executed and keeps the search documents up to date"""
+
+    def __init__(self):
+        # "fts5" (SQLite), "trigram" (PostgreSQL) or None for the unindexed fallback
+        self.mode: Optional[str] = None
+
+    def document_expression(self) -> str:
+        """PostgreSQL expression of the search document; must match the index definition exactly"""
+        parts = [f'coalesce("{col}"::text, \'\')' for col in schema_registry.text_columns()]
+        return f"lower({' || chr(10) || '.join(parts)})"
+
+    async def ensure(self, conn, dialect: str, create: bool = False) -> Optional[str]:
+        """
+        Detect the search index and set the mode; with create=True also build it.
+
+        Building is a deliberate maintenance step (db_manager.py search-index,
+        or after a local database copy), never done by the application workers:
+        they all start at once and would rebuild the same table concurrently.
+        """
+        self.mode = None
+        if not schema_registry.text_columns():
+            return None
+
+        try:
+            if dialect == "sqlite":
+                await self._ensure_sqlite(conn, create)
+            else:
+                await self._ensure_postgresql(conn, create)
+        except Exception as e:
+            logger.warning(f"Search index unavailable, using unindexed search: {str(e)}")
+            self.mode = None
+
+        logger.info(f"Global search mode: {self.mode or 'scan'}")
+        return self.mode
+
+    async def _ensure_sqlite(self, conn, create: bool) -> None:
+        """Use the FTS5 table if it is in step with the main table, optionally (re)building it"""
+        exists = (await conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": SEARCH_TABLE}
+        )).scalar()
+
+        if exists:
+            documents = (await conn.execute(text(f'SELECT COUNT(*) FROM "{SEARCH_TABLE}"'))).scalar()
+            rows = (await conn.execute(text(f'SELECT COUNT(*) FROM "{BigTable.name}"'))).scalar()
+            if documents == rows:
+                self.mode = "fts5"
+                return
+            logger.info(f"Search table has {documents} documents for {rows} rows")
+
+        if not create:
+            logger.warning("SQLite search table missing or stale - run 'python db_manager.py search-index'")
+            return
+
+        # Runs inside the caller's transaction, which commits it
+        await conn.run_sync(lambda sync_conn: rebuild_sqlite_search_table(
+            sync_conn.connection.dbapi_connection, schema_registry.text_columns(), commit=False
+        ))
+        self.mode = "fts5"
+
+    async def _ensure_postgresql(self, conn, create: bool) -> None:
+        """Use the trigram index if it exists, optionally creating it"""
+        exists = (await conn.execute(
+            text("SELECT 1 FROM pg_indexes WHERE tablename = :table AND indexname = :index"),
+            {"table": BigTable.name, "index": PG_SEARCH_INDEX}
+        )).scalar()
+
+        if not exists and create:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            await conn.execute(text(
+                f'CREATE INDEX IF NOT EXISTS "{PG_SEARCH_INDEX}" ON "{BigTable.name}" '
+                f'USING gin (({self.document_expression()}) gin_trgm_ops)'
+            ))
+            exists = True
+            logger.info(f"Created trigram search index {PG_SEARCH_INDEX}")
+
+        if exists:
+            self.mode = "trigram"
+
+    def build_clause(self, search: Optional[str], dialect: str, query_params: Dict[str, Any]) -> Optional[str]:
+        """WHERE condition for a global search term, index-driven when the index is available"""
+        if not search or not search.strip():
+            return None
+
+        text_columns = schema_registry.text_columns()
+        if not text_columns:
+            return None
+
+        term = search.strip()
+
+        if self.mode == "fts5" and dialect == "sqlite":
+            # Documents are lower-cased in Python, so the term is folded the same way
+            term = term.lower()
+            if len(term) < 3 or "%" in term or "_" in term:
+                # The trigram index cannot serve these (short multibyte terms even match wrongly)
+                query_params["search_value"] = term
+                return f'"id" IN (SELECT rowid FROM "{SEARCH_TABLE}" WHERE instr(document, :search_value) > 0)'
+            query_params["search_value"] = f"%{term}%"
+            return f'"id" IN (SELECT rowid FROM "{SEARCH_TABLE}" WHERE document LIKE :search_value)'
+
+        if self.mode == "trigram" and dialect == "postgresql":
+            # Fold the term with PostgreSQL lower(), exactly like the indexed document
+            query_params["search_value"] = f"%{_escape_like(term)}%"
+            return f"{self.document_expression()} LIKE lower(:search_value)"
+
+        # Unindexed fallback
+        query_params["search_value"] = f"%{term}%"
+        if dialect == "sqlite":
+            conditions = [f'"{col}" LIKE :search_value' for col in text_columns]
+        else:
+            conditions = [f'"{col}"::text ILIKE :search_value' for col in text_columns]
+        return f"({' OR '.join(conditions)})"
+
+    async def refresh_row(self, db, row_id: Any, column_name: Optional[str] = None) -> None:
+        """Edit-path hook: rewrite the search document of one row (SQLite only, PostgreSQL maintains its index)"""
+        if self.mode != "fts5":
+            return
+
+        text_columns = schema_registry.text_columns()
+        if column_name is not None and column_name not in text_columns:
+            return
+
+        column_list = ", ".join(f'"{col}"' for col in text_columns)
+        row = (await db.execute(
+            text(f'SELECT {column_list} FROM "{BigTable.name}" WHERE "id" = :row_id'),
+            {"row_id": row_id}
+        )).first()
+
+        await db.execute(text(f'DELETE FROM "{SEARCH_TABLE}" WHERE rowid = :row_id'), {"row_id": row_id})
+        if row is not None:
+            await db.execute(
+                text(f'INSERT INTO "{SEARCH_TABLE}"(rowid, document) VALUES (:row_id, :document)'),
+                {"row_id": row_id, "document": build_document(row)}
+            )
+
+
+# Create singleton instance
+search_index = SearchIndex()
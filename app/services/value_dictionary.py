@@ -0,0 +1,447 @@
+# app/services/value_dictionary.py
+"""
+Distinct-value dictionaries for the filter dropdowns.
+
+For each column a dictionary of its distinct values and their row counts is
+built in the background with one GROUP BY and stored in a Redis hash, so every
+worker shares it. Workers keep a sorted in-memory copy and answer prefix and
+substring searches from it without touching the database. Cell edits adjust
+the counts incrementally and send the same delta to the other workers over
+the cache invalidation channel; dictionaries are rebuilt when they get old,
+which also picks up bulk changes such as a re-sync.
+
+Columns with more distinct values than MAX_DICTIONARY_SIZE get no dictionary;
+their dropdowns page through the database instead.
+"""
+import asyncio
+import logging
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date, time as dt_time
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import get_redis, DummyRedis, publish_invalidation, register_invalidation_handler
+from app.core.db import get_db_context, get_dialect_name
+from app.core.schema_registry import schema_registry
+from app.models.table import BigTable
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Redis hash of one column's dictionary: canonical value text -> row count
+DICTIONARY_KEY = "bigtable:value_dict:{}"
+
+# Redis hash of column -> JSON metadata (generation, built_at, complete)
+DICTIONARY_META_KEY = "bigtable:value_dict_meta"
+
+# Lock that keeps several workers from building the same dictionary
+DICTIONARY_LOCK_KEY = "bigtable:value_dict_lock:{}"
+DICTIONARY_LOCK_TTL = 300
+
+# Distinct values above which a column is searched in the database instead
+MAX_DICTIONARY_SIZE = 200000
+
+# Age after which a dictionary is rebuilt in the background (stale data is served meanwhile)
+DICTIONARY_TTL = 3600
+
+# Fields written per HSET when storing a dictionary
+STORE_BATCH_SIZE = 5000
+
+
+def _number_text(value: Any) -> str:
+    """Canonical text of a non-integer number, so Decimal("1.50"), 1.5 and "1.5" share one key"""
+    number = Decimal(str(value))
+    if not number.is_finite():
+        return str(number)
+    return format(number.normalize(), "f")
+
+
+def _value_text(value: Any) -> Optional[str]:
+    """Canonical text of a column value - the dictionary key"""
+    if value is None:
+        return None
+    if isinstance(value, (date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, float)):
+        return _number_text(value)
+    return str(value)
+
+
+def _edit_text(value: Any, kind: str) -> Optional[str]:
+    """Canonical text of a value typed into the grid, matching what the database returns"""
+    if value is None or value == "":
+        return None
+    try:
+        if kind == "integer":
+            return str(int(value))
+        if kind == "numeric":
+            return _number_text(value)
+    except (ValueError, TypeError, InvalidOperation):
+        pass
+    return str(value)
+
+
+def _output_value(key: str, kind: str) -> Any:
+    """Dictionary key back to a JSON value of the column's kind"""
+    try:
+        if kind == "integer":
+            return int(key)
+        if kind == "numeric":
+            return float(key)
+    except ValueError:
+        pass
+    return key
+
+
+class ColumnDictionary:
+    """Sorted in-memory copy of one column's dictionary"""
+
+    def __init__(self, column: str, kind: str, counts: Dict[str, int], generation: int, built_at: float):
+        self.column = column
+        self.kind = kind
+        self.counts = counts
+        self.generation = generation
+        self.built_at = built_at
+        self._sort()
+
+    def _sort(self) -> None:
+        """Sort keys case-insensitively (numbers numerically) for bisect prefix search"""
+        self.keys = sorted(self.counts, key=self._sort_key)
+        self.lowered = [key.lower() for key in self.keys]
+        # Sort key of every entry, aligned with keys; for text columns that is the lowered list itself
+        if self.kind in ("integer", "numeric"):
+            self._order = [self._numeric_sort_key(key) for key in self.keys]
+        else:
+            self._order = self.lowered
+
+    def _sort_key(self, key: str) -> Any:
+        """Position of a key in the sorted lists"""
+        if self.kind in ("integer", "numeric"):
+            return self._numeric_sort_key(key)
+        return key.lower()
+
+    def _numeric_sort_key(self, key: str) -> Tuple[int, Any]:
+        """Sort key of a numeric column's dictionary key"""
+        # Unparsable leftovers sort after the numbers instead of breaking the comparison
+        value = _output_value(key, self.kind)
+        return (1, key) if isinstance(value, str) else (0, value)
+
+    def _insert(self, key: str) -> None:
+        """Insert a new key at its sorted position"""
+        sort_key = self._sort_key(key)
+        index = bisect_right(self._order, sort_key)
+        self.keys.insert(index, key)
+        self.lowered.insert(index, key.lower())
+        if self._order is not self.lowered:
+            self._order.insert(index, sort_key)
+
+    def _remove(self, key: str) -> None:
+        """Remove a key, searching only among the entries with its sort key"""
+        sort_key = self._sort_key(key)
+        start = bisect_left(self._order, sort_key)
+        index = self.keys.index(key, start, bisect_right(self._order, sort_key, lo=start))
+        del self.keys[index]
+        del self.lowered[index]
+        if self._order is not self.lowered:
+            del self._order[index]
+
+    def apply(self, old_key: Optional[str], new_key: Optional[str]) -> None:
+        """Move one row's count from the old value to the new one"""
+        if old_key is not None and old_key in self.counts:
+            self.counts[old_key] -= 1
+            if self.counts[old_key] <= 0:
+                del self.counts[old_key]
+                self._remove(old_key)
+        if new_key is not None:
+            if new_key not in self.counts:
+                self.counts[new_key] = 0
+                self._insert(new_key)
+            self.counts[new_key] += 1
+
+    def search(self, term: Optional[str], match: str, offset: int, limit: int) -> Tuple[List[str], int]:
+        """Matching keys (one page) and the total number of matches"""
+        if not term:
+            return self.keys[offset:offset + limit], len(self.keys)
+
+        term = term.lower()
+        if match == "prefix" and self.kind not in ("integer", "numeric"):
+            start = bisect_left(self.lowered, term)
+            end = bisect_left(self.lowered, term + "\uffff", lo=start)
+            return self.keys[start + offset:min(start + offset + limit, end)], end - start
+
+        matches = [key for key, lowered in zip(self.keys, self.lowered)
+                   if (lowered.startswith(term) if match == "prefix" else term in lowered)]
+        return matches[offset:offset + limit], len(matches)
+
+
+class ValueDictionaryService:
+    """Builds, stores, searches and incrementally maintains the per-column dictionaries"""
+
+    def __init__(self):
+        self._dictionaries: Dict[str, ColumnDictionary] = {}
+        # Columns known to exceed MAX_DICTIONARY_SIZE
+        self._high_cardinality: Dict[str, float] = {}
+        self._building: Dict[str, asyncio.Task] = {}
+        register_invalidation_handler("value_dict", self._apply_remote_edit)
+
+    async def lookup(
+            self,
+            db: AsyncSession,
+            column: str,
+            search: Optional[str] = None,
+            limit: int = 100,
+            offset: int = 0,
+            match: str = "contains"
+    ) -> Dict[str, Any]:
+        """One page of distinct values (with counts) for a filter dropdown"""
+        kind = schema_registry.column_kind(column)
+        dictionary = await self._get_dictionary(column)
+
+        if dictionary is None:
+            # Not built yet (a background build has been started) or too many values
+            return await self._lookup_database(db, column, kind, search, limit, offset, match)
+
+        keys, total = dictionary.search(search, match, offset, limit)
+        return {
+            "values": [_output_value(key, kind) for key in keys],
+            "counts": [dictionary.counts[key] for key in keys],
+            "total": total,
+            "offset": offset,
+            "hasMore": offset + len(keys) < total,
+            "source": "dictionary"
+        }
+
+    async def _get_dictionary(self, column: str) -> Optional[ColumnDictionary]:
+        """Current in-memory dictionary, reloaded from Redis when another worker changed it"""
+        if column in self._high_cardinality:
+            if time.time() - self._high_cardinality[column] < DICTIONARY_TTL:
+                return None
+            del self._high_cardinality[column]
+
+        local = self._dictionaries.get(column)
+        redis = await get_redis()
+
+        meta = None
+        if not isinstance(redis, DummyRedis):
+            try:
+                raw_meta = await redis.hget(DICTIONARY_META_KEY, column)
+                meta = orjson.loads(raw_meta) if raw_meta else None
+            except Exception as e:
+                logger.error(f"Error reading value dictionary metadata: {str(e)}")
+
+        if meta and not meta.get("complete"):
+            # Too many values last time; the column still gets re-checked once that result is old
+            built_at = meta.get("built_at") or 0
+            if time.time() - built_at > DICTIONARY_TTL:
+                self._schedule_build(column)
+            else:
+                self._high_cardinality[column] = built_at
+            return None
+
+        if meta and (local is None or local.generation != meta["generation"]):
+            local = await self._load(redis, column, meta)
+
+        built_at = local.built_at if local else (meta or {}).get("built_at")
+        if local is None or built_at is None or time.time() - built_at > DICTIONARY_TTL:
+            self._schedule_build(column)
+
+        return local
+
+    async def _load(self, redis, column: str, meta: Dict[str, Any]) -> Optional[ColumnDictionary]:
+        """Load a column's dictionary from Redis into memory"""
+        try:
+            raw = await redis.hgetall(DICTIONARY_KEY.format(column))
+        except Exception as e:
+            logger.error(f"Error loading value dictionary for {column}: {str(e)}")
+            return self._dictionaries.get(column)
+
+        dictionary = ColumnDictionary(
+            column, schema_registry.column_kind(column),
+            {key: int(count) for key, count in raw.items()},
+            meta["generation"], meta["built_at"]
+        )
+        self._dictionaries[column] = dictionary
+        return dictionary
+
+    def _schedule_build(self, column: str) -> None:
+        """Start a background build unless one is already running in this worker"""
+        task = self._building.get(column)
+        if task and not task.done():
+            return
+        self._building[column] = asyncio.create_task(self.build(column))
+
+    async def build(self, column: str) -> bool:
+        """Build a column's dictionary with one GROUP BY and publish it"""
+        redis = await get_redis()
+        shared = not isinstance(redis, DummyRedis)
+
+        if shared:
+            try:
+                if not await redis.set(DICTIONARY_LOCK_KEY.format(column), "1", nx=True, ex=DICTIONARY_LOCK_TTL):
+                    # Another worker is building it
+                    return False
+            except Exception as e:
+                logger.error(f"Error locking value dictionary build: {str(e)}")
+                return False
+
+        start_time = time.time()
+        try:
+            async with get_db_context() as db:
+                result = await db.execute(
+                    text(f'SELECT "{column}", COUNT(*) FROM "{BigTable.name}" '
+                         f'WHERE "{column}" IS NOT NULL GROUP BY "{column}" LIMIT :limit'),
+                    {"limit": MAX_DICTIONARY_SIZE + 1}
+                )
+                rows = result.fetchall()
+
+            built_at = time.time()
+            complete = len(rows) <= MAX_DICTIONARY_SIZE
+            counts: Dict[str, int] = {}
+            if complete:
+                for value, count in rows:
+                    key = _value_text(value)
+                    counts[key] = counts.get(key, 0) + count
+            else:
+                self._high_cardinality[column] = built_at
+
+            generation = int(built_at * 1000)
+            if shared:
+                await self._store(redis, column, counts, generation, built_at, complete)
+
+            if complete:
+                self._dictionaries[column] = ColumnDictionary(
+                    column, schema_registry.column_kind(column), counts, generation, built_at
+                )
+
+            logger.info(
+                f"Built value dictionary for {column}: "
+                f"{len(counts) if complete else 'over ' + str(MAX_DICTIONARY_SIZE)} values "
+                f"in {time.time() - start_time:.2f}s")
+            return complete
+
+        except Exception as e:
+            logger.error(f"Error building value dictionary for {column}: {str(e)}")
+            return False
+        finally:
+            if shared:
+                try:
+                    await redis.delete(DICTIONARY_LOCK_KEY.format(column))
+                except Exception:
+                    pass
+
+    async def _store(self, redis, column: str, counts: Dict[str, int], generation: int,
+                     built_at: float, complete: bool) -> None:
+        """Replace a column's dictionary in Redis"""
+        key = DICTIONARY_KEY.format(column)
+        staging_key = f"{key}:building"
+
+        await redis.delete(staging_key)
+        items = list(counts.items())
+        for start in range(0, len(items), STORE_BATCH_SIZE):
+            await redis.hset(staging_key, mapping=dict(items[start:start + STORE_BATCH_SIZE]))
+
+        pipe = redis.pipeline()
+        if items:
+            pipe.rename(staging_key, key)
+        else:
+            pipe.delete(key)
+        pipe.hset(DICTIONARY_META_KEY, column, orjson.dumps(
+            {"generation": generation, "built_at": built_at, "complete": complete}
+        ).decode("utf-8"))
+        await pipe.execute()
+
+    async def apply_edit(self, column: str, old_value: Any, new_value: Any) -> None:
+        """Edit-path hook: move one row's count from the old value to the new one"""
+        kind = schema_registry.column_kind(column)
+        old_key, new_key = _edit_text(old_value, kind), _edit_text(new_value, kind)
+        if old_key == new_key:
+            return
+
+        local = self._dictionaries.get(column)
+        redis = await get_redis()
+
+        if isinstance(redis, DummyRedis):
+            if local:
+                local.apply(old_key, new_key)
+            return
+
+        try:
+            raw_meta = await redis.hget(DICTIONARY_META_KEY, column)
+            if not raw_meta:
+                return
+            meta = orjson.loads(raw_meta)
+            if not meta.get("complete"):
+                return
+
+            key = DICTIONARY_KEY.format(column)
+            pipe = redis.pipeline()
+            if old_key is not None:
+                pipe.hincrby(key, old_key, -1)
+            if new_key is not None:
+                pipe.hincrby(key, new_key, 1)
+            results = await pipe.execute()
+
+            if old_key is not None and int(results[0]) <= 0:
+                await redis.hdel(key, old_key)
+
+            # Every worker patches its copy with the same delta instead of reloading the whole hash
+            if local and local.generation == meta["generation"]:
+                local.apply(old_key, new_key)
+            await publish_invalidation({
+                "op": "value_dict", "column": column, "generation": meta["generation"],
+                "old": old_key, "new": new_key
+            })
+
+        except Exception as e:
+            logger.error(f"Error updating value dictionary for {column}: {str(e)}")
+
+    def _apply_remote_edit(self, message: Dict[str, Any]) -> None:
+        """Apply an edit delta published by another worker to the same dictionary build"""
+        local = self._dictionaries.get(message["column"])
+        if local and local.generation == message["generation"]:
+            local.apply(message["old"], message["new"])
+
+    async def _lookup_database(
+            self,
+            db: AsyncSession,
+            column: str,
+            kind: str,
+            search: Optional[str],
+            limit: int,
+            offset: int,
+            match: str
+    ) -> Dict[str, Any]:
+        """Paged DISTINCT query for columns without a dictionary"""
+        dialect = get_dialect_name()
+        query = f'SELECT DISTINCT "{column}" FROM "{BigTable.name}" WHERE "{column}" IS NOT NULL'
+        params: Dict[str, Any] = {"limit": limit + 1, "offset": offset}
+
+        if search:
+            # SQLite LIKE is already case-insensitive for ASCII
+            operator = "LIKE" if dialect == "sqlite" else "ILIKE"
+            cast_expr = "" if dialect == "sqlite" else "::text"
+            query += f' AND "{column}"{cast_expr} {operator} :search_term'
+            params["search_term"] = f"{search}%" if match == "prefix" else f"%{search}%"
+
+        query += f' ORDER BY "{column}" LIMIT :limit OFFSET :offset'
+        result = await db.execute(text(query), params)
+        rows = result.fetchall()
+
+        values = [_output_value(_value_text(row[0]), kind) for row in rows[:limit]]
+        return {
+            "values": values,
+            "counts": None,
+            "total": None,
+            "offset": offset,
+            "hasMore": len(rows) > limit,
+            "source": "database"
+        }
+
+
+# Create singleton instance
+value_dictionary = ValueDictionaryService()
@@ -0,0 +1,69 @@
+# app/services/wire_format.py
+"""
+Response wire formats for row blocks.
+
+The default format is a list of row dicts. The columnar format sends the
+field names once and one value array per column, which removes the repeated
+keys that dominate the size and encode time of wide blocks. NDJSON sends one
+JSON record per line so a long-running response can be rendered while it is
+still being produced.
+"""
+import logging
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+import orjson
+from fastapi import Request
+
+from app.services.row_materializer import materialize_columns
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+COLUMNAR_FORMAT = "columnar"
+COLUMNAR_MEDIA_TYPE = "application/vnd.bigtable.columnar+json"
+
+NDJSON_FORMAT = "ndjson"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_columnar(request: Optional[Request], response_format: Optional[str] = None) -> bool:
+    """Whether the client asked for the columnar format via ?format= or the Accept header"""
+    if response_format:
+        return response_format.lower() == COLUMNAR_FORMAT
+    if request is None:
+        return False
+    return COLUMNAR_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def rows_to_columnar(fields: Sequence[Any], rows: Sequence[Sequence[Any]]) -> Dict[str, List]:
+    """Transpose result rows into {"fields": [...], "values": [[column values], ...]}"""
+    return materialize_columns(fields, rows)
+
+
+def dicts_to_columnar(rows: List[Dict[str, Any]], fields: Optional[Sequence[str]] = None) -> Dict[str, List]:
+    """Columnar form of a list of row dicts (fields default to the first row's keys)"""
+    if fields is None:
+        fields = list(rows[0].keys()) if rows else []
+    return rows_to_columnar(fields, [[row.get(field) for field in fields] for row in rows])
+
+
+def wants_ndjson(request: Optional[Request], response_format: Optional[str] = None) -> bool:
+    """Whether the client asked for a streamed NDJSON response via format or the Accept header"""
+    if response_format:
+        return response_format.lower() == NDJSON_FORMAT
+    if request is None:
+        return False
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def json_default(value: Any) -> Any:
+    """Types orjson does not serialize natively"""
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def ndjson_line(record: Dict[str, Any]) -> bytes:
+    """One NDJSON record, newline-terminated"""
+    return orjson.dumps(record, default=json_default, option=orjson.OPT_APPEND_NEWLINE)
@@ -118,6 +118,9 @@ function setupWebSocket() {
                 } else if (window.gridApi) {
                     window.gridApi.refreshInfiniteCache();
                 }
+            } else if (data.type === "job") {
+                // Taustatöö olek või edenemine - kuulajad tellivad 'job-update' sündmuse
+                window.dispatchEvent(new CustomEvent('job-update', {detail: data.job}));
             } else if (data.type === "pong") {
                 // Ping vastus, midagi pole vaja teha
             }
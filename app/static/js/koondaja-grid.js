@@ -810,6 +810,75 @@
             $('#koondaja-loading-details').text(`File: ${currentFile || 'Looking for files...'} (${current}/${total})`);
         },
 
+        /**
+         * Import one CSV file as an NDJSON stream, handing each batch of rows to onRows as it arrives
+         */
+        async importFileStreaming(file, onRows) {
+            const response = await fetch('/api/v1/koondaja/import-koondaja-csv', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Accept': 'application/x-ndjson'
+                },
+                body: JSON.stringify({
+                    file_path: file.path,
+                    folder_name: file.folder,
+                    format: 'ndjson'
+                })
+            });
+
+            if (!response.ok) {
+                const error = await response.json().catch(() => ({}));
+                throw new Error(error.detail || 'Error');
+            }
+
+            // Folders without a processor still answer with a plain JSON document
+            if (!(response.headers.get('content-type') || '').includes('application/x-ndjson')) {
+                const result = await response.json();
+                if (result.data && result.data.length > 0) {
+                    onRows(result.data);
+                }
+                return result;
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let summary = null;
+
+            const handleLine = (line) => {
+                if (!line.trim()) {
+                    return;
+                }
+                const record = JSON.parse(line);
+                if (record.type === 'rows') {
+                    onRows(record.rows);
+                } else if (record.type === 'summary') {
+                    summary = record;
+                } else if (record.type === 'error') {
+                    throw new Error(record.detail || 'Error');
+                }
+            };
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) {
+                    break;
+                }
+                buffer += decoder.decode(value, { stream: true });
+
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                lines.forEach(handleLine);
+            }
+            handleLine(buffer + decoder.decode());
+
+            if (!summary) {
+                throw new Error('Import stream ended unexpectedly');
+            }
+            return summary;
+        },
+
         /**
          * Load data from all folders
          */
@@ -858,29 +927,32 @@
                 let invalidRows = 0;
                 const errors = [];
                 const koondajaData = [];
+                let gridCleared = false;
 
                 for (const file of allFiles) {
                     this.updateLoadingProgress(processedFiles, allFiles.length, file.folder, file.name);
 
                     try {
-                        const response = await $.ajax({
-                            url: '/api/v1/koondaja/import-koondaja-csv',
-                            method: 'POST',
-                            contentType: 'application/json',
-                            data: JSON.stringify({
-                                file_path: file.path,
-                                folder_name: file.folder
-                            })
+                        // Rows are appended to the grid as each reconciled batch arrives; counts,
+                        // state and selection are refreshed once when all files are loaded
+                        await this.importFileStreaming(file, (rows) => {
+                            koondajaData.push(...rows);
+                            totalRows += rows.length;
+                            invalidRows += rows.filter(row => !row.has_valid_toimiku).length;
+
+                            const gridApi = StateManager.getGridApi();
+                            if (gridApi) {
+                                if (!gridCleared) {
+                                    gridApi.setRowData([]);
+                                    $('#koondaja-empty-state').addClass('hidden');
+                                    gridCleared = true;
+                                }
+                                gridApi.applyTransaction({ add: rows });
+                            }
                         });
-
-                        if (response.success && response.data && response.data.length > 0) {
-                            koondajaData.push(...response.data);
-                            totalRows += response.data.length;
-                            invalidRows += response.data.filter(row => !row.has_valid_toimiku).length;
-                        }
                     } catch (error) {
                         console.error(`Error processing file ${file.name}:`, error);
-                        errors.push(`${file.folder}/${file.name}: ${error.responseJSON?.detail || 'Error'}`);
+                        errors.push(`${file.folder}/${file.name}: ${error.message || 'Error'}`);
                     }
 
                     processedFiles++;
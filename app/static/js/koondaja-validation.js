@@ -52,10 +52,15 @@
                     contentType: 'application/json',
                     data: JSON.stringify({
                         toimiku_numbers: toimikuNumbers,
-                        fields: ['võlgnik', 'nõude_sisu', 'võla_jääk', 'staatus']
+                        fields: ['võlgnik', 'nõude_sisu', 'võla_jääk', 'staatus'],
+                        format: 'columnar'
                     })
                 });
 
+                if (response.success && response.columns) {
+                    response.data = window.appFunctions.decodeColumnar(response.columns);
+                }
+
                 if (response.success && response.data) {
                     // Create lookup map
                     const dbDataMap = {};
@@ -356,9 +361,13 @@
                 contentType: 'application/json',
                 data: JSON.stringify({
                     toimiku_numbers: toimikuNumbers,
-                    fields: newFields
+                    fields: newFields,
+                    format: 'columnar'
                 }),
                 success: (response) => {
+                    if (response.success && response.columns) {
+                        response.data = window.appFunctions.decodeColumnar(response.columns);
+                    }
                     if (response.success && response.data) {
                         this.mergeDbData(response.data);
                         Utils.showNotification('Database data added', 'success');
@@ -361,7 +361,25 @@
         }
     }
 
+    // Rebuild row objects from a columnar block ({fields: [...], values: [[column values], ...]})
+    function decodeColumnar(block) {
+        const fields = block.fields || [];
+        const values = block.values || [];
+        const rowCount = values.length > 0 ? values[0].length : 0;
+        const rows = new Array(rowCount);
+
+        for (let r = 0; r < rowCount; r++) {
+            const row = {};
+            for (let c = 0; c < fields.length; c++) {
+                row[fields[c]] = values[c][r];
+            }
+            rows[r] = row;
+        }
+        return rows;
+    }
+
     // Assign functions to the global bridge
+    funcs.decodeColumnar = decodeColumnar;
     funcs.refreshData = refreshData;
     funcs.toggleUIElements = toggleUIElements;
     funcs.debounce = debounce;
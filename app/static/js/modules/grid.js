@@ -285,6 +285,41 @@
     }
 
     // Enhanced grid ready handler with header optimizations
+    // Ask the server for the exact row count once per view after /data answered with an estimate
+    function fetchExactRowCount(queryParams, viewKey, isFiltered) {
+        if (state.exactCountView === viewKey) {
+            return;
+        }
+        state.exactCountView = viewKey;
+
+        const countParams = {};
+        if (queryParams.filter_model) {
+            countParams.filter_model = queryParams.filter_model;
+        }
+        if (queryParams.search) {
+            countParams.search = queryParams.search;
+        }
+
+        $.ajax({
+            url: "/api/v1/table/count",
+            method: "GET",
+            data: countParams,
+            dataType: "json",
+            success: function (response) {
+                // Ignore the answer if the user changed sorting or filters in the meantime
+                if (state.blockCursorView !== viewKey || !state.gridApi) {
+                    return;
+                }
+                state.gridApi.setRowCount(response.rowCount, true);
+                $("#status").text(response.rowCount + " kirjet" + (isFiltered ? " (filtreeritud)" : ""));
+            },
+            error: function (xhr, status, error) {
+                console.error("Error loading exact row count:", error);
+                state.exactCountView = null;
+            }
+        });
+    }
+
     function onGridReady(params) {
         state.gridApi = params.api;
 
@@ -304,7 +339,8 @@
                 // Build query parameters
                 const queryParams = {
                     start_row: params.startRow,
-                    end_row: params.endRow
+                    end_row: params.endRow,
+                    format: "columnar"
                 };
 
                 // Add sorting if present
@@ -334,6 +370,25 @@
                     }
                 }
 
+                // Only fetch the visible columns once the user has hidden some
+                const visibleFields = (state.columnDefs || [])
+                    .filter(col => col.field && state.columnVisibility[col.field] !== false)
+                    .map(col => col.field);
+                if (state.columnDefs && visibleFields.length < state.columnDefs.length) {
+                    queryParams.columns = visibleFields.join(",");
+                }
+
+                // Reuse the cursor handed out with the previous block so the server can seek instead of OFFSET
+                const viewKey = JSON.stringify([queryParams.sort_field, queryParams.sort_dir,
+                    queryParams.search, queryParams.filter_model]);
+                if (state.blockCursorView !== viewKey) {
+                    state.blockCursorView = viewKey;
+                    state.blockCursors = {};
+                }
+                if (state.blockCursors[params.startRow]) {
+                    queryParams.after = state.blockCursors[params.startRow];
+                }
+
                 // Add timestamp to bust cache when refreshing
                 if (params.parentNode && params.parentNode.data && params.parentNode.data.timestamp) {
                     queryParams.timestamp = params.parentNode.data.timestamp;
@@ -348,6 +403,11 @@
                     data: queryParams,
                     dataType: "json",
                     success: function (response) {
+                        // Blocks arrive column-oriented; AG Grid wants row objects
+                        if (response && response.columns) {
+                            response.rowData = funcs.decodeColumnar(response.columns);
+                        }
+
                         // Validate response data
                         if (!response || !response.rowData) {
                             console.error("Invalid response format:", response);
@@ -357,13 +417,26 @@
                             return;
                         }
 
-                        // Update status
+                        // Update status - an estimated count is shown as "~N" until the exact count arrives
                         const isFiltered = queryParams.filter_model || queryParams.search;
-                        $("#status").text(response.rowCount + " kirjet" +
+                        const countExact = response.rowCountExact !== false;
+                        $("#status").text((countExact ? "" : "~") + response.rowCount + " kirjet" +
                             (isFiltered ? " (filtreeritud)" : ""));
 
-                        // Check if we have more rows
-                        const lastRow = response.rowCount <= response.endRow ? response.rowCount : -1;
+                        // Remember where the next block starts for keyset pagination
+                        if (response.nextCursor && state.blockCursorView === viewKey) {
+                            state.blockCursors[params.endRow] = response.nextCursor;
+                        }
+
+                        // Check if we have more rows - an estimate can't tell where the data ends
+                        let lastRow;
+                        if (countExact) {
+                            lastRow = response.rowCount <= response.endRow ? response.rowCount : -1;
+                        } else {
+                            const pageSize = params.endRow - params.startRow;
+                            lastRow = response.rowData.length < pageSize ? response.endRow : -1;
+                            fetchExactRowCount(queryParams, viewKey, isFiltered);
+                        }
 
                         // Provide the data to the grid
                         params.successCallback(response.rowData, lastRow);
@@ -633,16 +706,26 @@
         if (!state.gridApi) return;
 
         // Get checked/unchecked state from checkboxes
+        let shownColumn = false;
         $(".column-toggle").each(function () {
             const field = $(this).data('field');
             const isVisible = $(this).prop('checked');
 
+            // Loaded blocks may not contain a column that was hidden until now
+            if (isVisible && state.columnVisibility[field] === false) {
+                shownColumn = true;
+            }
+
             // Update local tracking
             state.columnVisibility[field] = isVisible;
 
             // Update AG Grid
             state.gridApi.setColumnVisible(field, isVisible);
         });
+
+        if (shownColumn) {
+            state.gridApi.refreshInfiniteCache();
+        }
     }
 
     // Update status text
@@ -3,6 +3,10 @@
 """
 Simple, reliable script to export PostgreSQL table to SQL files
 with proper UTF-8 encoding for all Unicode characters.
+
+With --format csv the data file is written by COPY instead, which is far
+smaller and faster to load; --gzip compresses either format. Both are read
+back incrementally by import_to_sqlite.
 """
 
 import os
@@ -13,6 +17,9 @@ import logging
 import psycopg2
 from pathlib import Path
 
+from app.utils.import_to_sqlite import CSV_NULL, open_dump
+from app.utils.pg_snapshot import ProgressReporter, estimate_rows, iter_batches
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -31,6 +38,9 @@ def parse_args():
     parser.add_argument("--table", default="taitur_data", help="Table name to export")
     parser.add_argument("--output-dir", default="data", help="Output directory for SQL files")
     parser.add_argument("--batch-size", type=int, default=1000, help="Rows per batch")
+    parser.add_argument("--format", choices=["sql", "csv"], default="sql",
+                        help="Data file format: INSERT statements or CSV written by COPY")
+    parser.add_argument("--gzip", action="store_true", help="Compress the data file")
     return parser.parse_args()
 
 
@@ -154,12 +164,11 @@ def export_data(conn, table_name, output_file, batch_size=1000):
         # Create output directory if it doesn't exist
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
-        # Get total number of rows
-        with conn.cursor() as cursor:
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-            total_rows = cursor.fetchone()[0]
-            logger.info(f"Total rows: {total_rows}")
+        # Planner estimate for progress reporting - no COUNT(*) scan
+        total_estimate = estimate_rows(conn, table_name)
+        logger.info(f"Estimated rows: {total_estimate}")
 
+        with conn.cursor() as cursor:
             # Get column names
             cursor.execute("""
                 SELECT column_name
@@ -170,72 +179,54 @@ def export_data(conn, table_name, output_file, batch_size=1000):
 
             columns = [row[0] for row in cursor.fetchall()]
 
-            # Open output file with UTF-8 encoding
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(f"-- Data for table {table_name}\n")
-                f.write(f"-- Exported on {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"-- Total rows: {total_rows}\n\n")
-
-                # Use SQL INSERT statements instead of COPY for better compatibility
-                batch_count = 0
-                offset = 0
-                start_time = time.time()
-
-                while offset < total_rows:
-                    cursor.execute(f"""
-                        SELECT * FROM {table_name}
-                        ORDER BY id
-                        LIMIT {batch_size} OFFSET {offset}
-                    """)
-
-                    batch = cursor.fetchall()
-                    if not batch:
-                        break
-
-                    # Write INSERT statements for this batch
-                    col_list = ", ".join(f'"{col}"' for col in columns)
-                    f.write(f"INSERT INTO {table_name} ({col_list}) VALUES\n")
-
-                    values_list = []
-                    for row in batch:
-                        values = []
-                        for val in row:
-                            if val is None:
-                                values.append("NULL")
-                            elif isinstance(val, (int, float)):
-                                values.append(str(val))
-                            elif isinstance(val, (bytes, bytearray)):
-                                # Handle binary data
-                                hex_str = val.hex()
-                                values.append(f"decode('{hex_str}', 'hex')")
-                            else:
-                                # Properly escape strings with Unicode characters
-                                escaped = str(val).replace("'", "''")
-                                values.append(f"'{escaped}'")
-
-                        values_list.append("(" + ", ".join(values) + ")")
-
-                    # Join values with commas and end with semicolon
-                    f.write(",\n".join(values_list))
-                    f.write(";\n\n")
-
-                    # Update counters
-                    offset += len(batch)
-                    batch_count += 1
-
-                    # Report progress
-                    progress = min(100, round(offset / total_rows * 100, 1))
-                    elapsed = time.time() - start_time
-                    rate = offset / elapsed if elapsed > 0 else 0
-                    eta = (total_rows - offset) / rate if rate > 0 else 0
-
-                    logger.info(f"Progress: {offset}/{total_rows} rows ({progress}%) "
-                                f"- {rate:.1f} rows/sec - ETA: {eta:.1f} sec")
-
-                # Add sequence reset if needed
-                f.write(f"-- Reset sequences\n")
-                f.write(f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), "
-                        f"(SELECT MAX(id) FROM {table_name}));\n")
+        # Open output file with UTF-8 encoding
+        with open_dump(output_file, 'w') as f:
+            f.write(f"-- Data for table {table_name}\n")
+            f.write(f"-- Exported on {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write(f"-- Estimated rows: {total_estimate}\n\n")
+
+            # Use SQL INSERT statements instead of COPY for better compatibility
+            col_list = ", ".join(f'"{col}"' for col in columns)
+            progress = ProgressReporter(f"Export {table_name}", total_estimate)
+            start_time = time.time()
+
+            # Stream the table in id order through a server-side cursor
+            for batch in iter_batches(conn, table_name, columns, fetch_size=batch_size):
+                # Write INSERT statements for this batch
+                f.write(f"INSERT INTO {table_name} ({col_list}) VALUES\n")
+
+                values_list = []
+                for row in batch:
+                    values = []
+                    for val in row:
+                        if val is None:
+                            values.append("NULL")
+                        elif isinstance(val, (int, float)):
+                            values.append(str(val))
+                        elif isinstance(val, (bytes, bytearray)):
+                            # Handle binary data
+                            hex_str = val.hex()
+                            values.append(f"decode('{hex_str}', 'hex')")
+                        else:
+                            # Properly escape strings with Unicode characters
+                            escaped = str(val).replace("'", "''")
+                            values.append(f"'{escaped}'")
+
+                    values_list.append("(" + ", ".join(values) + ")")
+
+                # Join values with commas and end with semicolon
+                f.write(",\n".join(values_list))
+                f.write(";\n\n")
+
+                # Report progress
+                progress.add(len(batch))
+
+            progress.add(0, force=True)
+
+            # Add sequence reset if needed
+            f.write(f"-- Reset sequences\n")
+            f.write(f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), "
+                    f"(SELECT MAX(id) FROM {table_name}));\n")
 
         logger.info(f"Data export completed in {time.time() - start_time:.2f} seconds")
         logger.info(f"Data exported to {output_file}")
@@ -246,6 +237,42 @@ def export_data(conn, table_name, output_file, batch_size=1000):
         return False
 
 
+def export_data_csv(conn, table_name, output_file):
+    """Export table data as CSV with COPY, streamed by the server straight into the file"""
+    try:
+        logger.info(f"Exporting data for table {table_name} as CSV...")
+
+        # Create output directory if it doesn't exist
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+        conn.set_client_encoding('UTF8')
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT column_name
+                FROM information_schema.columns
+                WHERE table_name = %s
+                ORDER BY ordinal_position
+            """, (table_name,))
+            col_list = ", ".join(f'"{row[0]}"' for row in cursor.fetchall())
+
+            # NULL gets its own marker so it stays distinct from empty strings
+            copy_sql = (f'COPY (SELECT {col_list} FROM "{table_name}" ORDER BY "id") TO STDOUT '
+                        f"WITH (FORMAT csv, HEADER true, NULL '{CSV_NULL}')")
+
+            start_time = time.time()
+            with open_dump(output_file, 'w') as f:
+                cursor.copy_expert(copy_sql, f)
+
+        logger.info(f"Data export completed in {time.time() - start_time:.2f} seconds "
+                    f"({os.path.getsize(output_file) / 1024 / 1024:.1f} MB)")
+        logger.info(f"Data exported to {output_file}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error exporting data: {str(e)}")
+        return False
+
+
 def main():
     args = parse_args()
 
@@ -261,7 +288,7 @@ def main():
     # Set output file paths
     output_dir = Path(args.output_dir)
     schema_file = output_dir / f"{args.table}_schema.sql"
-    data_file = output_dir / f"{args.table}_data.sql"
+    data_file = output_dir / f"{args.table}_data.{args.format}{'.gz' if args.gzip else ''}"
 
     try:
         # Connect to database
@@ -273,7 +300,10 @@ def main():
 
         # Export data if schema export was successful
         if schema_ok:
-            data_ok = export_data(conn, args.table, data_file, args.batch_size)
+            if args.format == "csv":
+                data_ok = export_data_csv(conn, args.table, data_file)
+            else:
+                data_ok = export_data(conn, args.table, data_file, args.batch_size)
 
             if data_ok:
                 logger.info("Export completed successfully")
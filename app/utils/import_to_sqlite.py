@@ -3,6 +3,11 @@
 """
 Import PostgreSQL SQL exports into SQLite database
 with proper encoding handling and improved schema conversion.
+
+Data dumps are read incrementally: INSERT dumps through a tokenizer that
+handles quoting itself, CSV dumps through the csv module. Values are bound as
+parameters with executemany in large transactions, so multi-GB dumps import
+in bounded memory.
 """
 
 import os
@@ -12,8 +17,12 @@ import argparse
 import logging
 import sqlite3
 import re
+import csv
+import gzip
 from pathlib import Path
 
+from app.utils.pg_snapshot import COMMIT_ROWS, ProgressReporter, set_bulk_pragmas, reset_pragmas
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,9 +34,10 @@ logger = logging.getLogger(__name__)
 def parse_args():
     parser = argparse.ArgumentParser(description="Import SQL files to SQLite database")
     parser.add_argument("--schema-file", required=True, help="Path to schema SQL file")
-    parser.add_argument("--data-file", required=True, help="Path to data SQL file")
+    parser.add_argument("--data-file", required=True, help="Path to data SQL or CSV file (optionally .gz)")
     parser.add_argument("--sqlite-db", default="data/local_data.db", help="SQLite database file")
     parser.add_argument("--table", default="taitur_data", help="Table name")
+    parser.add_argument("--batch-size", type=int, default=COMMIT_ROWS, help="Rows per SQLite transaction")
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
     return parser.parse_args()
 
@@ -177,80 +187,245 @@ def import_schema(schema_file, db_conn, table_name):
         return False
 
 
-def parse_insert_statements(file_path):
-    """Parse INSERT statements from a file and yield batches of values"""
+# Whitespace and comments between tokens
+SKIP = r"(?:\s+|--[^\n]*\n?)*"
+
+# One token of the INSERT dumps written by export_postgres_data, with the whitespace before it
+TOKEN_PATTERN = re.compile(SKIP + r"""
+    (?:
+          (?P<string>'(?:[^']|'')*')
+        | (?P<hex>decode\('(?P<hexdigits>[0-9A-Fa-f]*)',\s*'hex'\))
+        | (?P<number>[-+]?(?:(?:inf|nan)\b|(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?))
+        | (?P<quoted>"(?:[^"]|"")*")
+        | (?P<word>(?!decode\()[A-Za-z_][A-Za-z0-9_.]*)
+        | (?P<punct>[(),;])
+    )
+""", re.VERBOSE)
+
+TRAILING_PATTERN = re.compile(SKIP + r"\Z")
+
+# Characters read from a dump per read()
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Characters kept unread after the last token of a chunk, so no token is cut in two
+TOKEN_LOOKAHEAD = 64
+
+# Rows passed to one executemany call
+EXECUTE_BATCH_SIZE = 10000
+
+# How CSV dumps (COPY ... FORMAT csv) write NULL
+CSV_NULL = "\\N"
+
+
+def open_dump(file_path, mode='r'):
+    """Open a dump for text reading or writing, gzip-compressed if the name ends in .gz"""
+    if str(file_path).endswith('.gz'):
+        return gzip.open(file_path, mode + 't', encoding='utf-8', newline='')
+    return open(file_path, mode, encoding='utf-8', newline='')
+
+
+def tokenize(f, chunk_size=READ_CHUNK_SIZE):
+    """Yield (kind, text) tokens of an SQL dump, reading the file incrementally"""
+    buffer = ""
+    pos = 0
+    eof = False
+    match = TOKEN_PATTERN.match
+
+    while True:
+        # A token ending closer than TOKEN_LOOKAHEAD to the end of the buffer may continue in the next chunk
+        limit = len(buffer) if eof else len(buffer) - TOKEN_LOOKAHEAD
+        while True:
+            token = match(buffer, pos)
+            if token is None or token.end() > limit:
+                break
+            pos = token.end()
+            kind = token.lastgroup
+            yield kind, token.group("hexdigits" if kind == "hex" else kind)
+
+        if eof:
+            if not TRAILING_PATTERN.match(buffer, pos):
+                raise ValueError(f"Unexpected input in dump near: {buffer[pos:pos + 50]!r}")
+            return
+
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def _next_token(tokens):
+    token = next(tokens, None)
+    if token is None:
+        raise ValueError("Unexpected end of dump inside an INSERT statement")
+    return token
+
+
+def _expect(tokens, text):
+    kind, value = _next_token(tokens)
+    if value.upper() != text:
+        raise ValueError(f"Expected {text} in INSERT statement, found {value!r}")
+
+
+def _identifier(kind, text):
+    if kind == "quoted":
+        return text[1:-1].replace('""', '"')
+    return text
+
+
+def _literal(kind, text):
+    """Python value of a literal token"""
+    if kind == "string":
+        return text[1:-1].replace("''", "'")
+    if kind == "number":
+        try:
+            return int(text)
+        except ValueError:
+            return float(text)
+    if kind == "hex":
+        return bytes.fromhex(text)
+    if kind == "word":
+        upper = text.upper()
+        if upper == "NULL":
+            return None
+        if upper in ("TRUE", "FALSE"):
+            return int(upper == "TRUE")
+    raise ValueError(f"Unsupported value in dump: {text!r}")
+
+
+def _insert_rows(tokens):
+    """Rows of one INSERT statement, after its INSERT keyword"""
+    _expect(tokens, "INTO")
+    table = _identifier(*_next_token(tokens))
+
+    _expect(tokens, "(")
+    columns = []
+    while True:
+        kind, text = _next_token(tokens)
+        if text == ")":
+            break
+        if kind != "punct":
+            columns.append(_identifier(kind, text))
+    columns = tuple(columns)
+
+    _expect(tokens, "VALUES")
+    while True:
+        _expect(tokens, "(")
+        row = []
+        while True:
+            kind, text = _next_token(tokens)
+            if kind == "punct":
+                if text == ")":
+                    break
+                if text == ",":
+                    continue
+                raise ValueError(f"Unexpected {text!r} in VALUES list")
+            row.append(_literal(kind, text))
+        yield table, columns, row
+
+        kind, text = _next_token(tokens)
+        if text == ";":
+            return
+        if text != ",":
+            raise ValueError(f"Unexpected {text!r} after VALUES row")
+
+
+def iter_insert_rows(file_path):
+    """Yield (table, columns, values) for every row of the INSERT statements in an SQL dump"""
+    with open_dump(file_path) as f:
+        tokens = tokenize(f)
+        for kind, text in tokens:
+            if kind == "word" and text.upper() == "INSERT":
+                yield from _insert_rows(tokens)
+            elif text != ";":
+                # Anything else (setval, SET ...) is skipped up to its terminating semicolon
+                for _, value in tokens:
+                    if value == ";":
+                        break
+
+
+def iter_csv_rows(file_path, db_conn, table_name):
+    """Yield (table, columns, values) for every row of a CSV dump (header line first, NULL as CSV_NULL)"""
+    with open_dump(file_path) as f:
+        reader = csv.reader(f)
+        columns = tuple(next(reader, ()))
+
+        # COPY writes booleans as t/f and bytea as \x hex; convert by the target column types
+        declared = {row[1]: (row[2] or "").upper() for row in db_conn.execute(f'PRAGMA table_info("{table_name}")')}
+        blob_columns = [i for i, col in enumerate(columns) if "BLOB" in declared.get(col, "")]
+        integer_columns = [i for i, col in enumerate(columns) if "INT" in declared.get(col, "")]
+
+        for values in reader:
+            row = [None if value == CSV_NULL else value for value in values]
+            for i in blob_columns:
+                if row[i] is not None and row[i].startswith("\\x"):
+                    row[i] = bytes.fromhex(row[i][2:])
+            for i in integer_columns:
+                if row[i] in ("t", "f"):
+                    row[i] = int(row[i] == "t")
+            yield table_name, columns, row
+
+
+def _insert_batch(db_conn, insert_sql, rows):
+    """executemany a batch; on failure insert row by row and skip the rows that fail"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-            # Find all INSERT statements
-            insert_pattern = re.compile(r'INSERT INTO .*?\((.*?)\) VALUES\s*(.*?);', re.DOTALL)
-            matches = insert_pattern.finditer(content)
-
-            for match in matches:
-                columns = match.group(1)
-                values_text = match.group(2)
-
-                # Clean and parse values
-                values = []
-                value_pattern = re.compile(r'\((.*?)\)', re.DOTALL)
-                for value_match in value_pattern.finditer(values_text):
-                    # Extract the comma-separated values
-                    value_str = value_match.group(1)
-                    values.append(f"({value_str})")
+        db_conn.executemany(insert_sql, rows)
+        return len(rows)
+    except sqlite3.Error as e:
+        logger.error(f"Error executing batch: {str(e)}")
 
-                yield columns, values
+    inserted = 0
+    for row in rows:
+        try:
+            db_conn.execute(insert_sql, row)
+            inserted += 1
+        except sqlite3.Error as e:
+            logger.error(f"Error importing row: {str(e)}")
+    return inserted
 
-    except Exception as e:
-        logger.error(f"Error parsing INSERT statements: {str(e)}")
-        yield None, None
 
-
-def import_data(data_file, db_conn, table_name):
-    """Import data to SQLite database using direct SQL execution"""
+def import_data(data_file, db_conn, table_name, batch_size=COMMIT_ROWS):
+    """Stream rows from an SQL or CSV dump into SQLite with executemany, committing every batch_size rows"""
     try:
         logger.info(f"Importing data from {data_file}...")
 
-        cursor = db_conn.cursor()
+        is_csv = str(data_file).endswith(('.csv', '.csv.gz'))
+        rows_iter = iter_csv_rows(data_file, db_conn, table_name) if is_csv else iter_insert_rows(data_file)
+
+        progress = ProgressReporter(f"Import {table_name}", 0)
         start_time = time.time()
         total_rows = 0
-
-        # Process INSERT statements in batches
-        for columns, values in parse_insert_statements(data_file):
-            if not columns or not values:
-                continue
-
-            # Execute in reasonable-sized batches
-            batch_size = 100
-            for i in range(0, len(values), batch_size):
-                batch = values[i:i + batch_size]
-                batch_sql = f"INSERT INTO {table_name} ({columns}) VALUES {', '.join(batch)}"
-
-                try:
-                    cursor.execute(batch_sql)
-                    db_conn.commit()
-
-                    total_rows += len(batch)
-
-                    # Show progress
-                    elapsed = time.time() - start_time
-                    rate = total_rows / elapsed if elapsed > 0 else 0
-                    logger.info(f"Imported {total_rows} rows - {rate:.1f} rows/sec")
-
-                except sqlite3.Error as e:
-                    logger.error(f"Error executing batch: {str(e)}")
-                    # Try individually if batch fails
-                    for value in batch:
-                        try:
-                            single_sql = f"INSERT INTO {table_name} ({columns}) VALUES {value}"
-                            cursor.execute(single_sql)
-                            db_conn.commit()
-                            total_rows += 1
-                        except sqlite3.Error as e2:
-                            logger.error(f"Error importing row: {str(e2)}")
+        pending = 0
+        batch = []
+        batch_columns = None
+
+        def flush():
+            nonlocal total_rows, pending
+            placeholders = ",".join("?" for _ in batch_columns)
+            column_list = ",".join(f'"{col}"' for col in batch_columns)
+            inserted = _insert_batch(
+                db_conn, f'INSERT INTO "{table_name}" ({column_list}) VALUES ({placeholders})', batch
+            )
+            total_rows += inserted
+            pending += len(batch)
+            progress.add(inserted)
+
+        for _, columns, row in rows_iter:
+            if columns != batch_columns or len(batch) >= EXECUTE_BATCH_SIZE:
+                if batch:
+                    flush()
+                    batch = []
+                    if pending >= batch_size:
+                        db_conn.commit()
+                        pending = 0
+                batch_columns = columns
+            batch.append(row)
+
+        if batch:
+            flush()
 
         # Final commit
         db_conn.commit()
+        progress.add(0, force=True)
 
         logger.info(f"Data import completed: {total_rows} rows in {time.time() - start_time:.2f} seconds")
         return True
@@ -316,7 +491,9 @@ def main():
 
         # Import data if schema import was successful
         if schema_ok:
-            data_ok = import_data(args.data_file, conn, args.table)
+            set_bulk_pragmas(conn)
+            data_ok = import_data(args.data_file, conn, args.table, args.batch_size)
+            reset_pragmas(conn)
 
             if data_ok:
                 logger.info("Import completed successfully")
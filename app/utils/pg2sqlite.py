@@ -14,6 +14,10 @@ import sqlite3
 import psycopg2
 from pathlib import Path
 
+from app.utils.pg_snapshot import (
+    COMMIT_ROWS, DEFAULT_WORKERS, ProgressReporter, convert_rows, estimate_rows, iter_batches, snapshot_table
+)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -31,7 +35,9 @@ def parse_args():
     parser.add_argument("--database", default="accessdb", help="PostgreSQL database")
     parser.add_argument("--table", default="taitur_data", help="Table name to convert")
     parser.add_argument("--sqlite-db", default="data/local_data.db", help="SQLite database file")
-    parser.add_argument("--batch-size", type=int, default=500, help="Rows per batch")
+    parser.add_argument("--batch-size", type=int, default=COMMIT_ROWS, help="Rows per SQLite transaction")
+    parser.add_argument("--restart", action="store_true", help="Ignore an interrupted snapshot and start over")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Parallel reader processes")
     parser.add_argument("--verbose", action="store_true", help="Verbose output")
     return parser.parse_args()
 
@@ -127,73 +133,47 @@ def create_sqlite_table(sqlite_conn, table_name, columns, primary_keys):
     return True
 
 
-def copy_data(pg_conn, sqlite_conn, table_name, columns, batch_size=500):
-    """Copy data from PostgreSQL to SQLite"""
+def copy_data(pg_conn, sqlite_conn, table_name, columns, batch_size=COMMIT_ROWS):
+    """Copy data from PostgreSQL to SQLite through a server-side cursor, committing every batch_size rows"""
     try:
-        # Get total row count
-        with pg_conn.cursor() as cursor:
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-            total_rows = cursor.fetchone()[0]
-            logger.info(f"Total rows to copy: {total_rows}")
-
-            # Prepare column names and placeholders for SQLite
-            column_names = [col[0] for col in columns]
-            placeholders = ",".join(["?" for _ in columns])
-
-            insert_sql = f'INSERT INTO {table_name} ("' + '","'.join(column_names) + f'") VALUES ({placeholders})'
-
-            # Copy data in batches
-            offset = 0
-            imported_rows = 0
-            start_time = time.time()
-
-            while offset < total_rows:
-                # Get batch from PostgreSQL
-                cursor.execute(f"""
-                    SELECT * FROM {table_name}
-                    ORDER BY id
-                    LIMIT {batch_size} OFFSET {offset}
-                """)
-
-                rows = cursor.fetchall()
-                if not rows:
-                    break
-
-                # Insert batch into SQLite
-                sqlite_cursor = sqlite_conn.cursor()
-
-                try:
-                    # Use executemany with parameterized queries
-                    # This safely handles all special characters
-                    sqlite_conn.executemany(insert_sql, rows)
-                    sqlite_conn.commit()
-                    imported_rows += len(rows)
-                except sqlite3.Error as e:
-                    logger.error(f"Batch insert error: {str(e)}")
-
-                    # Fall back to individual inserts if batch fails
-                    sqlite_conn.rollback()
-
-                    # Try inserting rows one by one
-                    for row in rows:
-                        try:
-                            sqlite_conn.execute(insert_sql, row)
-                            imported_rows += 1
-                        except sqlite3.Error as row_error:
-                            logger.error(f"Row insert error: {str(row_error)}")
-
-                    sqlite_conn.commit()
-
-                # Update offset
-                offset += batch_size
-
-                # Show progress
-                progress = (imported_rows / total_rows) * 100
-                elapsed = time.time() - start_time
-                rate = imported_rows / elapsed if elapsed > 0 else 0
-
-                logger.info(f"Imported {imported_rows}/{total_rows} rows "
-                            f"({progress:.1f}%) - {rate:.1f} rows/sec")
+        # Prepare column names and placeholders for SQLite
+        column_names = [col[0] for col in columns]
+        placeholders = ",".join(["?" for _ in columns])
+
+        insert_sql = f'INSERT INTO {table_name} ("' + '","'.join(column_names) + f'") VALUES ({placeholders})'
+
+        progress = ProgressReporter(f"Copy {table_name}", estimate_rows(pg_conn, table_name))
+        imported_rows = 0
+        pending = 0
+        start_time = time.time()
+
+        for rows in iter_batches(pg_conn, table_name, column_names):
+            rows = convert_rows(rows)
+            try:
+                # Use executemany with parameterized queries
+                # This safely handles all special characters
+                sqlite_conn.executemany(insert_sql, rows)
+                imported_rows += len(rows)
+                pending += len(rows)
+            except sqlite3.Error as e:
+                logger.error(f"Batch insert error: {str(e)}")
+
+                # Try inserting rows one by one
+                for row in rows:
+                    try:
+                        sqlite_conn.execute(insert_sql, row)
+                        imported_rows += 1
+                        pending += 1
+                    except sqlite3.Error as row_error:
+                        logger.error(f"Row insert error: {str(row_error)}")
+
+            progress.add(len(rows))
+            if pending >= batch_size:
+                sqlite_conn.commit()
+                pending = 0
+
+        sqlite_conn.commit()
+        progress.add(0, force=True)
 
         logger.info(f"Data import completed: {imported_rows} rows in {time.time() - start_time:.2f} seconds")
         return True
@@ -225,34 +205,25 @@ def main():
     try:
         logger.info(f"Connecting to PostgreSQL {args.host}:{args.port}/{args.database}...")
 
-        # Connect to PostgreSQL
-        pg_conn = psycopg2.connect(
-            host=args.host,
-            port=args.port,
-            user=args.user,
-            password=args.password,
-            database=args.database
-        )
+        # Connect to PostgreSQL (the reader processes open their own connections with the same parameters)
+        connect_params = {
+            "host": args.host,
+            "port": args.port,
+            "user": args.user,
+            "password": args.password,
+            "database": args.database
+        }
+        pg_conn = psycopg2.connect(**connect_params)
 
         # Connect to SQLite
         logger.info(f"Connecting to SQLite database {args.sqlite_db}...")
         sqlite_conn = sqlite3.connect(args.sqlite_db)
 
-        # Enable foreign keys in SQLite
-        set_pragma_options(sqlite_conn)
-
-        # Get schema information
-        logger.info(f"Getting schema information for {args.table}...")
-        columns = get_columns(pg_conn, args.table)
-        primary_keys = get_primary_keys(pg_conn, args.table)
-
-        # Create table in SQLite
-        logger.info(f"Creating SQLite table {args.table}...")
-        create_sqlite_table(sqlite_conn, args.table, columns, primary_keys)
-
-        # Copy data
+        # Copy into a staging table through a server-side cursor and swap it in;
+        # an interrupted run resumes from its last checkpoint unless --restart is given
         logger.info(f"Copying data from PostgreSQL to SQLite...")
-        copy_data(pg_conn, sqlite_conn, args.table, columns, args.batch_size)
+        snapshot_table(pg_conn, sqlite_conn, args.table, resume=not args.restart, commit_rows=args.batch_size,
+                       workers=args.workers, connect_params=connect_params)
 
         logger.info("Conversion completed successfully!")
         return 0
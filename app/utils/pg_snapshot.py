@@ -0,0 +1,687 @@
+#!/usr/bin/env python
+# pg_snapshot.py
+"""
+Resumable PostgreSQL to SQLite snapshot engine shared by db_manager, pg2sqlite
+and export_postgres_data.
+
+Rows are read in id order through a named (server-side) cursor, so PostgreSQL
+streams the table once instead of re-sorting and skipping rows for every
+OFFSET page, and no COUNT(*) is needed up front (progress uses the planner's
+row estimate). SQLite receives the rows in large transactions with bulk-load
+PRAGMAs into a staging table that replaces the live table only when the copy
+is complete, so the offline copy stays usable meanwhile. The last copied id is
+committed together with each transaction, so an interrupted snapshot resumes
+where it stopped. For large tables the id span is split into partitions that
+several reader processes fetch and convert in parallel, while a single writer
+serialises their batches into SQLite; each partition keeps its own checkpoint.
+
+Every snapshot also records a hash per id range (RANGE_SIZE ids) as computed
+by PostgreSQL. A delta sync recomputes those hashes, which only ships one small
+row per range over the network, and re-copies just the ranges whose hash
+changed; ranges that vanished are deleted. Inserted, updated and deleted rows
+are all caught without a change-tracking column on the server.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip from the server-side cursor
+FETCH_SIZE = 10000
+
+# Rows written per SQLite transaction (one checkpoint per transaction)
+COMMIT_ROWS = 100000
+
+# Seconds between progress log lines
+PROGRESS_INTERVAL = 5
+
+# SQLite table holding the resume checkpoints, one row per id-range partition
+STATE_TABLE = "_snapshot_partitions"
+
+# Reader processes of a parallel snapshot (one SQLite writer keeps up with a few readers)
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Partitions per reader, so one dense id range does not leave the other readers idle
+PARTITIONS_PER_WORKER = 4
+
+# SQLite table holding the PostgreSQL hash of every id range at the last sync
+RANGES_TABLE = "_sync_ranges"
+
+# Ids per range compared by the delta sync
+RANGE_SIZE = 10000
+
+
+def get_columns(pg_conn, table_name):
+    """Column name, data type and nullability of a PostgreSQL table, in table order"""
+    with pg_conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT column_name, data_type, is_nullable
+            FROM information_schema.columns
+            WHERE table_name = %s
+            ORDER BY ordinal_position
+        """, (table_name,))
+        return cursor.fetchall()
+
+
+def estimate_rows(pg_conn, table_name):
+    """Planner row estimate of a table (no COUNT(*) scan)"""
+    with pg_conn.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", (table_name,))
+        row = cursor.fetchone()
+        return max(int(row[0]), 0) if row and row[0] is not None else 0
+
+
+def sqlite_column_type(column_name, data_type):
+    """SQLite column type for a PostgreSQL data type"""
+    if column_name == "id":
+        return "INTEGER PRIMARY KEY"
+
+    data_type = data_type.lower()
+    if "int" in data_type:
+        return "INTEGER"
+    if any(t in data_type for t in ("float", "numeric", "decimal", "real", "double")):
+        return "REAL"
+    if "bool" in data_type:
+        return "INTEGER"  # SQLite doesn't have boolean
+    if any(t in data_type for t in ("timestamp", "date", "time")):
+        return "TIMESTAMP"
+    if "bytea" in data_type:
+        return "BLOB"
+    return "TEXT"
+
+
+def create_table_sql(table_name, columns):
+    """CREATE TABLE statement for SQLite from PostgreSQL column definitions"""
+    column_defs = []
+    for col_name, data_type, is_nullable in columns:
+        null_constraint = "" if is_nullable == "YES" or col_name == "id" else " NOT NULL"
+        column_defs.append(f'    "{col_name}" {sqlite_column_type(col_name, data_type)}{null_constraint}')
+    return f'CREATE TABLE "{table_name}" (\n' + ",\n".join(column_defs) + "\n)"
+
+
+def _convert_value(value):
+    """Convert a PostgreSQL value to a type sqlite3 stores natively"""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, (date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, memoryview):
+        return bytes(value)
+    return value
+
+
+def convert_rows(rows):
+    """Convert a batch of rows, touching only the columns that need it"""
+    if not rows:
+        return rows
+
+    # Pick the columns to convert from the first non-NULL value of each column
+    needs_conversion = []
+    for index in range(len(rows[0])):
+        for row in rows:
+            value = row[index]
+            if value is not None:
+                if not isinstance(value, (int, float, str)) or isinstance(value, bool):
+                    needs_conversion.append(index)
+                break
+
+    if not needs_conversion:
+        return rows
+
+    converted = []
+    for row in rows:
+        values = list(row)
+        for index in needs_conversion:
+            if values[index] is not None:
+                values[index] = _convert_value(values[index])
+        converted.append(values)
+    return converted
+
+
+def iter_batches(pg_conn, table_name, column_names, after_id=None, upto_id=None, fetch_size=FETCH_SIZE):
+    """
+    Yield batches of rows in id order through a named server-side cursor.
+
+    ``after_id`` resumes after an already copied id, ``upto_id`` bounds the range.
+    """
+    column_list = ", ".join(f'"{name}"' for name in column_names)
+    conditions = []
+    params = []
+    if after_id is not None:
+        conditions.append('"id" > %s')
+        params.append(after_id)
+    if upto_id is not None:
+        conditions.append('"id" <= %s')
+        params.append(upto_id)
+    where_sql = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    # Named cursors only live inside a transaction; psycopg2 opens one implicitly
+    cursor_name = f"snapshot_{table_name}_{int(time.time() * 1000)}"
+    with pg_conn.cursor(name=cursor_name) as cursor:
+        cursor.itersize = fetch_size
+        cursor.execute(f'SELECT {column_list} FROM "{table_name}"{where_sql} ORDER BY "id"', params)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield rows
+    pg_conn.commit()
+
+
+def range_hashes(pg_conn, table_name, range_size=RANGE_SIZE):
+    """{range: (row count, hash)} of a PostgreSQL table, computed on the server"""
+    with pg_conn.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT "id" / %s, COUNT(*), md5(string_agg(md5(t::text), '' ORDER BY "id"))
+            FROM "{table_name}" t
+            GROUP BY 1
+        """, (range_size,))
+        hashes = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+    pg_conn.commit()
+    return hashes
+
+
+def _ensure_ranges_table(sqlite_conn):
+    sqlite_conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{RANGES_TABLE}" (
+            table_name TEXT NOT NULL,
+            range_id INTEGER NOT NULL,
+            range_size INTEGER NOT NULL,
+            row_count INTEGER NOT NULL,
+            hash TEXT NOT NULL,
+            PRIMARY KEY (table_name, range_id)
+        )
+    """)
+
+
+def _load_ranges(sqlite_conn, table_name, range_size):
+    """Range hashes recorded at the last sync; ranges of another size are ignored"""
+    _ensure_ranges_table(sqlite_conn)
+    rows = sqlite_conn.execute(
+        f'SELECT range_id, row_count, hash FROM "{RANGES_TABLE}" WHERE table_name = ? AND range_size = ?',
+        (table_name, range_size)
+    ).fetchall()
+    return {range_id: (row_count, hash_value) for range_id, row_count, hash_value in rows}
+
+
+def _store_ranges(sqlite_conn, table_name, range_size, hashes):
+    _ensure_ranges_table(sqlite_conn)
+    sqlite_conn.execute(f'DELETE FROM "{RANGES_TABLE}" WHERE table_name = ?', (table_name,))
+    sqlite_conn.executemany(
+        f'INSERT INTO "{RANGES_TABLE}" (table_name, range_id, range_size, row_count, hash) VALUES (?, ?, ?, ?, ?)',
+        [(table_name, range_id, range_size, count, hash_value) for range_id, (count, hash_value) in hashes.items()]
+    )
+
+
+def set_bulk_pragmas(sqlite_conn, fresh=False):
+    """
+    PRAGMAs for bulk loading; the checkpoints make an interrupted load resumable.
+
+    synchronous=OFF risks corrupting the whole file on a power loss, so it is
+    only used when the file holds no live table yet (``fresh``). Otherwise WAL
+    with synchronous=NORMAL keeps the file intact and is nearly as fast for
+    large transactions.
+    """
+    if fresh:
+        sqlite_conn.execute("PRAGMA synchronous = OFF")
+    else:
+        sqlite_conn.execute("PRAGMA journal_mode = WAL")
+        sqlite_conn.execute("PRAGMA synchronous = NORMAL")
+    sqlite_conn.execute("PRAGMA temp_store = MEMORY")
+    sqlite_conn.execute("PRAGMA cache_size = -262144")  # 256 MB
+    sqlite_conn.execute("PRAGMA foreign_keys = OFF")
+
+
+def reset_pragmas(sqlite_conn):
+    """Back to durable settings for normal application use"""
+    sqlite_conn.execute("PRAGMA synchronous = NORMAL")
+    sqlite_conn.execute("PRAGMA cache_size = -2000")
+
+
+class ProgressReporter:
+    """Logs rows copied, rows/sec and ETA at most every PROGRESS_INTERVAL seconds"""
+
+    def __init__(self, label, total_estimate, already_done=0):
+        self.label = label
+        self.total_estimate = total_estimate
+        self.done = already_done
+        self.start_done = already_done
+        self.start_time = time.time()
+        self.last_report = 0.0
+
+    def add(self, rows, force=False):
+        self.done += rows
+        now = time.time()
+        if not force and now - self.last_report < PROGRESS_INTERVAL:
+            return
+        self.last_report = now
+        logger.info(self.status())
+
+    @property
+    def rate(self):
+        elapsed = time.time() - self.start_time
+        return (self.done - self.start_done) / elapsed if elapsed > 0 else 0.0
+
+    def status(self):
+        rate = self.rate
+        if self.total_estimate and self.done < self.total_estimate:
+            percent = self.done / self.total_estimate * 100
+            eta = (self.total_estimate - self.done) / rate if rate > 0 else 0
+            return (f"{self.label}: {self.done:,}/~{self.total_estimate:,} rows ({percent:.1f}%) "
+                    f"- {rate:,.0f} rows/sec - ETA {eta:.0f}s")
+        return f"{self.label}: {self.done:,} rows - {rate:,.0f} rows/sec"
+
+
+def _ensure_state_table(sqlite_conn):
+    sqlite_conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS "{STATE_TABLE}" (
+            table_name TEXT NOT NULL,
+            partition_id INTEGER NOT NULL,
+            first_id INTEGER NOT NULL,
+            last_id INTEGER,
+            copied_upto INTEGER,
+            rows_copied INTEGER NOT NULL DEFAULT 0,
+            done INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (table_name, partition_id)
+        )
+    """)
+
+
+def _load_partitions(sqlite_conn, table_name, staging_table):
+    """Checkpointed partitions of an interrupted snapshot whose staging table still exists, else []"""
+    _ensure_state_table(sqlite_conn)
+    rows = sqlite_conn.execute(
+        f'SELECT partition_id, first_id, last_id, copied_upto, rows_copied, done FROM "{STATE_TABLE}" '
+        f'WHERE table_name = ? ORDER BY partition_id', (table_name,)
+    ).fetchall()
+    staging_exists = sqlite_conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (staging_table,)
+    ).fetchone()
+    if not rows or not staging_exists:
+        return []
+    keys = ("partition_id", "first_id", "last_id", "copied_upto", "rows_copied", "done")
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def _save_partitions(sqlite_conn, table_name, partitions):
+    """Record progress in the same transaction as the rows, then commit"""
+    now = time.time()
+    sqlite_conn.executemany(
+        f'INSERT OR REPLACE INTO "{STATE_TABLE}" '
+        f'(table_name, partition_id, first_id, last_id, copied_upto, rows_copied, done, updated_at) '
+        f'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+        [(table_name, part["partition_id"], part["first_id"], part["last_id"], part["copied_upto"],
+          part["rows_copied"], part["done"], now) for part in partitions]
+    )
+    sqlite_conn.commit()
+
+
+def plan_partitions(pg_conn, table_name, count):
+    """Split the id span of a table into ``count`` contiguous ranges; the last one is open-ended"""
+    with pg_conn.cursor() as cursor:
+        cursor.execute(f'SELECT MIN("id"), MAX("id") FROM "{table_name}"')
+        min_id, max_id = cursor.fetchone()
+    pg_conn.commit()
+    if min_id is None:
+        return []
+
+    step = max(1, -(-(max_id - min_id + 1) // count))
+    partitions = []
+    first_id = min_id
+    while first_id <= max_id:
+        partitions.append({
+            "partition_id": len(partitions),
+            "first_id": first_id,
+            "last_id": first_id + step - 1,
+            "copied_upto": None,
+            "rows_copied": 0,
+            "done": 0,
+        })
+        first_id += step
+    # Rows added after planning still belong to the last partition
+    partitions[-1]["last_id"] = None
+    return partitions
+
+
+def _resume_after(partition):
+    """Id after which the partition continues"""
+    if partition["copied_upto"] is not None:
+        return partition["copied_upto"]
+    return partition["first_id"] - 1
+
+
+def _serial_batches(pg_conn, table_name, column_names, partitions, fetch_size):
+    """(partition_id, rows) batches read in this process; rows is None when a partition is finished"""
+    for partition in partitions:
+        for rows in iter_batches(pg_conn, table_name, column_names, after_id=_resume_after(partition),
+                                 upto_id=partition["last_id"], fetch_size=fetch_size):
+            yield partition["partition_id"], convert_rows(rows)
+        yield partition["partition_id"], None
+
+
+def _read_partitions(connect_params, table_name, column_names, tasks, results, fetch_size):
+    """Reader process: stream and convert the partitions from the task queue onto the result queue"""
+    import psycopg2
+
+    pg_conn = None
+    try:
+        pg_conn = psycopg2.connect(**connect_params)
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            partition_id, after_id, upto_id = task
+            for rows in iter_batches(pg_conn, table_name, column_names, after_id=after_id,
+                                     upto_id=upto_id, fetch_size=fetch_size):
+                results.put((partition_id, convert_rows(rows), None))
+            results.put((partition_id, None, None))
+    except Exception as e:
+        results.put((None, None, str(e)))
+    finally:
+        if pg_conn is not None:
+            pg_conn.close()
+
+
+def _parallel_batches(connect_params, table_name, column_names, partitions, fetch_size, workers):
+    """(partition_id, rows) batches read and converted by ``workers`` reader processes"""
+    tasks = multiprocessing.Queue()
+    # Bounded so readers cannot run far ahead of the single SQLite writer
+    results = multiprocessing.Queue(maxsize=workers * 4)
+
+    for partition in partitions:
+        tasks.put((partition["partition_id"], _resume_after(partition), partition["last_id"]))
+    for _ in range(workers):
+        tasks.put(None)
+
+    readers = [
+        multiprocessing.Process(
+            target=_read_partitions,
+            args=(connect_params, table_name, column_names, tasks, results, fetch_size),
+            daemon=True
+        )
+        for _ in range(workers)
+    ]
+    for reader in readers:
+        reader.start()
+
+    remaining = len(partitions)
+    try:
+        while remaining:
+            try:
+                partition_id, rows, error = results.get(timeout=1)
+            except queue.Empty:
+                if not any(reader.is_alive() for reader in readers):
+                    raise RuntimeError("Snapshot reader processes exited unexpectedly")
+                continue
+            if error:
+                raise RuntimeError(f"Snapshot reader failed: {error}")
+            if rows is None:
+                remaining -= 1
+            yield partition_id, rows
+    finally:
+        for reader in readers:
+            if reader.is_alive():
+                reader.terminate()
+            reader.join()
+
+
+def snapshot_table(pg_conn, sqlite_conn, table_name="taitur_data", resume=True,
+                   fetch_size=FETCH_SIZE, commit_rows=COMMIT_ROWS, range_size=RANGE_SIZE,
+                   workers=1, connect_params=None):
+    """
+    Copy a PostgreSQL table into SQLite and swap it in.
+
+    With ``workers`` > 1 and ``connect_params`` (psycopg2.connect keyword
+    arguments) the id-range partitions are read and converted by that many
+    reader processes while this process writes. Returns a stats dict with
+    rows, seconds and rows_per_sec.
+    """
+    staging_table = f"{table_name}__snapshot"
+    columns = get_columns(pg_conn, table_name)
+    if not columns:
+        raise ValueError(f"Table {table_name} not found in PostgreSQL")
+    column_names = [col[0] for col in columns]
+
+    # The staging table is built next to the live one - only a file without it may skip syncing
+    set_bulk_pragmas(sqlite_conn, fresh=not _sqlite_columns(sqlite_conn, table_name))
+
+    partitions = _load_partitions(sqlite_conn, table_name, staging_table) if resume else []
+    if partitions:
+        logger.info(f"Resuming snapshot of {table_name} "
+                    f"({sum(part['rows_copied'] for part in partitions):,} rows already copied)")
+    else:
+        sqlite_conn.execute(f'DROP TABLE IF EXISTS "{staging_table}"')
+        sqlite_conn.execute(create_table_sql(staging_table, columns))
+
+        # Hash the ranges before copying: anything changed meanwhile differs at the next delta sync
+        _store_ranges(sqlite_conn, staging_table, range_size, range_hashes(pg_conn, table_name, range_size))
+
+        sqlite_conn.execute(f'DELETE FROM "{STATE_TABLE}" WHERE table_name = ?', (table_name,))
+        partitions = plan_partitions(pg_conn, table_name, workers * PARTITIONS_PER_WORKER if workers > 1 else 1)
+        _save_partitions(sqlite_conn, table_name, partitions)
+
+    placeholders = ",".join(["?"] * len(column_names))
+    column_list = ",".join(f'"{name}"' for name in column_names)
+    insert_sql = f'INSERT INTO "{staging_table}" ({column_list}) VALUES ({placeholders})'
+    id_index = column_names.index("id")
+
+    by_id = {part["partition_id"]: part for part in partitions}
+    unfinished = [part for part in partitions if not part["done"]]
+    rows_copied = sum(part["rows_copied"] for part in partitions)
+
+    if workers > 1 and connect_params and len(unfinished) > 1:
+        workers = min(workers, len(unfinished))
+        logger.info(f"Copying {len(unfinished)} partitions with {workers} reader processes")
+        batches = _parallel_batches(connect_params, table_name, column_names, unfinished, fetch_size, workers)
+    else:
+        batches = _serial_batches(pg_conn, table_name, column_names, unfinished, fetch_size)
+
+    progress = ProgressReporter(f"Snapshot {table_name}", estimate_rows(pg_conn, table_name), rows_copied)
+    start_time = time.time()
+    pending = 0
+
+    for partition_id, rows in batches:
+        partition = by_id[partition_id]
+        if rows is None:
+            # Saved with the next checkpoint, together with the partition's last rows
+            partition["done"] = 1
+            continue
+
+        sqlite_conn.executemany(insert_sql, rows)
+        partition["copied_upto"] = rows[-1][id_index]
+        partition["rows_copied"] += len(rows)
+        rows_copied += len(rows)
+        pending += len(rows)
+        progress.add(len(rows))
+
+        if pending >= commit_rows:
+            _save_partitions(sqlite_conn, table_name, partitions)
+            pending = 0
+
+    _save_partitions(sqlite_conn, table_name, partitions)
+
+    _ensure_ranges_table(sqlite_conn)
+
+    # Swap the finished copy in and drop the checkpoint in one transaction (DDL does not open one itself)
+    sqlite_conn.execute("BEGIN")
+    sqlite_conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+    sqlite_conn.execute(f'ALTER TABLE "{staging_table}" RENAME TO "{table_name}"')
+    sqlite_conn.execute(f'DELETE FROM "{STATE_TABLE}" WHERE table_name = ?', (table_name,))
+    sqlite_conn.execute(f'DELETE FROM "{RANGES_TABLE}" WHERE table_name = ?', (table_name,))
+    sqlite_conn.execute(
+        f'UPDATE "{RANGES_TABLE}" SET table_name = ? WHERE table_name = ?', (table_name, staging_table)
+    )
+    sqlite_conn.commit()
+    reset_pragmas(sqlite_conn)
+
+    seconds = time.time() - start_time
+    progress.add(0, force=True)
+    stats = {"mode": "snapshot", "rows": rows_copied, "seconds": seconds, "rows_per_sec": progress.rate}
+    logger.info(f"Snapshot of {table_name} completed: {rows_copied:,} rows in {seconds:.1f}s "
+                f"({stats['rows_per_sec']:,.0f} rows/sec)")
+    return stats
+
+
+def _sqlite_columns(sqlite_conn, table_name):
+    return [row[1] for row in sqlite_conn.execute(f'PRAGMA table_info("{table_name}")')]
+
+
+def sync_table(pg_conn, sqlite_conn, table_name="taitur_data", fetch_size=FETCH_SIZE,
+               range_size=RANGE_SIZE, on_range_copied=None, workers=1, connect_params=None):
+    """
+    Bring an existing SQLite copy up to date by re-copying only the changed id ranges.
+
+    Falls back to a full snapshot when there is no copy yet, the columns differ
+    or no range hashes were recorded (``workers`` and ``connect_params`` are
+    passed on to it). ``on_range_copied(first_id, last_id)`` is
+    called inside each range's transaction (e.g. to refresh the search table).
+    Returns the stats dict of snapshot_table plus ranges and deleted counts.
+    """
+    columns = get_columns(pg_conn, table_name)
+    if not columns:
+        raise ValueError(f"Table {table_name} not found in PostgreSQL")
+    column_names = [col[0] for col in columns]
+
+    local = _load_ranges(sqlite_conn, table_name, range_size)
+    if _sqlite_columns(sqlite_conn, table_name) != column_names or not local:
+        logger.info(f"No comparable local copy of {table_name}, taking a full snapshot")
+        return snapshot_table(pg_conn, sqlite_conn, table_name, fetch_size=fetch_size, range_size=range_size,
+                              workers=workers, connect_params=connect_params)
+
+    start_time = time.time()
+    remote = range_hashes(pg_conn, table_name, range_size)
+    changed = sorted(range_id for range_id, value in remote.items() if local.get(range_id) != value)
+    removed = sorted(range_id for range_id in local if range_id not in remote)
+    logger.info(f"Delta sync of {table_name}: {len(changed)} changed and {len(removed)} removed "
+                f"of {len(remote)} ranges ({time.time() - start_time:.1f}s to compare)")
+
+    placeholders = ",".join(["?"] * len(column_names))
+    column_list = ",".join(f'"{name}"' for name in column_names)
+    insert_sql = f'INSERT INTO "{table_name}" ({column_list}) VALUES ({placeholders})'
+    delete_sql = f'DELETE FROM "{table_name}" WHERE "id" BETWEEN ? AND ?'
+    range_sql = (f'INSERT OR REPLACE INTO "{RANGES_TABLE}" (table_name, range_id, range_size, row_count, hash) '
+                 f'VALUES (?, ?, ?, ?, ?)')
+
+    set_bulk_pragmas(sqlite_conn)
+    progress = ProgressReporter(f"Sync {table_name}", sum(remote[range_id][0] for range_id in changed))
+    rows_copied = 0
+    rows_deleted = 0
+
+    # One transaction per range: the new hash is stored with the new rows, so an
+    # interrupted sync simply leaves the remaining ranges for the next run
+    for range_id in removed + changed:
+        first_id = range_id * range_size
+        last_id = first_id + range_size - 1
+
+        rows_deleted += sqlite_conn.execute(delete_sql, (first_id, last_id)).rowcount
+        if range_id in remote:
+            for rows in iter_batches(pg_conn, table_name, column_names, after_id=first_id - 1,
+                                     upto_id=last_id, fetch_size=fetch_size):
+                sqlite_conn.executemany(insert_sql, convert_rows(rows))
+                rows_copied += len(rows)
+                progress.add(len(rows))
+            count, hash_value = remote[range_id]
+            sqlite_conn.execute(range_sql, (table_name, range_id, range_size, count, hash_value))
+        else:
+            sqlite_conn.execute(
+                f'DELETE FROM "{RANGES_TABLE}" WHERE table_name = ? AND range_id = ?', (table_name, range_id)
+            )
+
+        if on_range_copied:
+            on_range_copied(first_id, last_id)
+        sqlite_conn.commit()
+
+    reset_pragmas(sqlite_conn)
+
+    seconds = time.time() - start_time
+    stats = {
+        "mode": "delta",
+        "rows": rows_copied,
+        "deleted": rows_deleted,
+        "ranges": len(changed) + len(removed),
+        "seconds": seconds,
+        "rows_per_sec": progress.rate,
+    }
+    logger.info(f"Delta sync of {table_name} completed: {stats['ranges']} ranges, {rows_copied:,} rows copied, "
+                f"{rows_deleted:,} rows replaced or deleted in {seconds:.1f}s")
+    return stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Resumable PostgreSQL to SQLite snapshot")
+    parser.add_argument("--host", default="172.20.10.11", help="PostgreSQL host")
+    parser.add_argument("--port", default="5432", help="PostgreSQL port")
+    parser.add_argument("--user", default="postgres", help="PostgreSQL user")
+    parser.add_argument("--password", default="1234", help="PostgreSQL password")
+    parser.add_argument("--database", default="accessdb", help="PostgreSQL database")
+    parser.add_argument("--table", default="taitur_data", help="Table name to copy")
+    parser.add_argument("--sqlite-db", default="data/local_data.db", help="SQLite database file")
+    parser.add_argument("--fetch-size", type=int, default=FETCH_SIZE, help="Rows per server-side cursor fetch")
+    parser.add_argument("--commit-rows", type=int, default=COMMIT_ROWS, help="Rows per SQLite transaction")
+    parser.add_argument("--restart", action="store_true", help="Ignore an interrupted snapshot and start over")
+    parser.add_argument("--delta", action="store_true", help="Re-copy only the id ranges that changed")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Reader processes for a full snapshot")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    import psycopg2
+
+    connect_params = {
+        "host": args.host,
+        "port": args.port,
+        "user": args.user,
+        "password": args.password,
+        "database": args.database
+    }
+
+    try:
+        pg_conn = psycopg2.connect(**connect_params)
+        sqlite_conn = sqlite3.connect(args.sqlite_db)
+
+        if args.delta:
+            sync_table(pg_conn, sqlite_conn, args.table, fetch_size=args.fetch_size,
+                       workers=args.workers, connect_params=connect_params)
+        else:
+            snapshot_table(pg_conn, sqlite_conn, args.table, resume=not args.restart,
+                           fetch_size=args.fetch_size, commit_rows=args.commit_rows,
+                           workers=args.workers, connect_params=connect_params)
+        return 0
+
+    except Exception as e:
+        logger.error(f"Snapshot failed: {str(e)}")
+        return 1
+
+    finally:
+        if 'pg_conn' in locals():
+            pg_conn.close()
+        if 'sqlite_conn' in locals():
+            sqlite_conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,7 +10,6 @@ import sqlite3
 import traceback
 from pathlib import Path
 import shutil
-import json
 
 # Configure logging
 logging.basicConfig(
@@ -80,6 +79,18 @@ def get_db_config():
         }
 
 
+def pg_connect_params(config):
+    """psycopg2.connect keyword arguments for the configured PostgreSQL server"""
+    return {
+        "host": config['pg_host'],
+        "port": config['pg_port'],
+        "dbname": config['pg_db'],
+        "user": config['pg_user'],
+        "password": config['pg_password'],
+        "connect_timeout": 5
+    }
+
+
 def test_postgresql_connection(config=None):
     """Test if PostgreSQL server is accessible"""
     if not config:
@@ -263,7 +274,17 @@ def initialize_local_db():
 
     if os.path.exists(local_db_path):
         logger.info(f"Local database already exists at: {local_db_path}")
-        if not input("Do you want to recreate it? This will delete all data! (y/n): ").lower().startswith('y'):
+
+        if test_postgresql_connection():
+            # Syncing refreshes the existing copy in place - only changed id ranges are copied
+            choice = input("Sync it with PostgreSQL (s), recreate it - this will delete all data! (r), "
+                           "or cancel (c)? [s]: ").strip().lower()
+            if choice in ("", "s"):
+                logger.info("Refreshing the local database incrementally...")
+                return sync_local_db()
+            if not choice.startswith('r'):
+                return False
+        elif not input("Do you want to recreate it? This will delete all data! (y/n): ").lower().startswith('y'):
             return False
 
         # Backup the existing database
@@ -332,155 +353,100 @@ def postgresql_to_sqlite():
         import psycopg2
 
         logger.info("Connecting to PostgreSQL database...")
-        conn = psycopg2.connect(
-            host=config['pg_host'],
-            port=config['pg_port'],
-            dbname=config['pg_db'],
-            user=config['pg_user'],
-            password=config['pg_password'],
-            connect_timeout=5
-        )
-
-        cursor = conn.cursor()
-
-        # Get table structure
-        cursor.execute("""
-        SELECT column_name, data_type, is_nullable
-        FROM information_schema.columns
-        WHERE table_name = 'taitur_data'
-        ORDER BY ordinal_position
-        """)
-
-        columns = cursor.fetchall()
-        logger.info(f"Found {len(columns)} columns in PostgreSQL table")
-
-        # Backup existing database if it exists
-        if os.path.exists(local_db_path):
-            backup_path = f"{local_db_path}.bak.{int(time.time())}"
-            shutil.copy2(local_db_path, backup_path)
-            logger.info(f"Backup created at: {backup_path}")
+        conn = psycopg2.connect(**pg_connect_params(config))
 
         # Connect to SQLite
         os.makedirs(os.path.dirname(local_db_path), exist_ok=True)
         sqlite_conn = sqlite3.connect(str(local_db_path))
-        sqlite_cursor = sqlite_conn.cursor()
 
-        # Create table with PostgreSQL schema adapted to SQLite
-        create_table_sql = "CREATE TABLE IF NOT EXISTS taitur_data (\n"
+        # Stream the table through a server-side cursor into a staging table that replaces
+        # taitur_data when complete; an interrupted run resumes from its last checkpoint
+        # Id-range partitions are read and converted by parallel reader processes
+        from app.utils.pg_snapshot import snapshot_table, DEFAULT_WORKERS
+        stats = snapshot_table(conn, sqlite_conn, "taitur_data",
+                               workers=DEFAULT_WORKERS, connect_params=pg_connect_params(config))
+        total_inserted = stats["rows"]
 
-        for i, (col_name, data_type, is_nullable) in enumerate(columns):
-            # Convert PostgreSQL types to SQLite
-            sqlite_type = "TEXT"  # Default
+        finish_local_db(sqlite_conn)
 
-            if "int" in data_type.lower():
-                sqlite_type = "INTEGER"
-            elif any(t in data_type.lower() for t in ["float", "numeric", "decimal", "real", "double"]):
-                sqlite_type = "REAL"
-            elif "bool" in data_type.lower():
-                sqlite_type = "INTEGER"  # SQLite doesn't have boolean
-            elif any(t in data_type.lower() for t in ["timestamp", "date", "time"]):
-                sqlite_type = "TIMESTAMP"
+        # Close connections
+        conn.close()
+        sqlite_conn.close()
 
-            # Handle primary key
-            if col_name == "id":
-                sqlite_type = "INTEGER PRIMARY KEY"
+        logger.info(f"Data successfully transferred from PostgreSQL to SQLite: {total_inserted} rows "
+                    f"({stats['rows_per_sec']:,.0f} rows/sec)")
+        return True
 
-            # Add NOT NULL if needed
-            null_constraint = "" if is_nullable == "YES" else " NOT NULL"
+    except Exception as e:
+        logger.error(f"Error transferring data: {e}")
+        logger.error(traceback.format_exc())
+        return False
 
-            # Add column definition
-            create_table_sql += f"    {col_name} {sqlite_type}{null_constraint}"
 
-            # Add comma if not the last column
-            if i < len(columns) - 1:
-                create_table_sql += ",\n"
-            else:
-                create_table_sql += "\n"
+def finish_local_db(sqlite_conn):
+    """Create indexes and rebuild the search table after the local table was replaced"""
+    # Create the indexes the application's filters, sorts and Koondaja lookups use
+    logger.info("Creating indexes...")
+    try:
+        from app.services.index_advisor import recommend_indexes, create_indexes
+        sqlite_columns = [row[1] for row in sqlite_conn.execute("PRAGMA table_info(taitur_data)")]
+        recommendations = recommend_indexes(get_index_usage(), sqlite_columns, "sqlite")
+        created = create_indexes(sqlite_conn, "sqlite", recommendations)
+        logger.info(f"Created {len(created)} indexes")
+    except Exception as e:
+        logger.warning(f"Error creating indexes: {e}")
 
-        create_table_sql += ");"
+    # Rebuild the FTS5 search table used by the application's global search
+    logger.info("Building search index...")
+    try:
+        from app.services.search_index import rebuild_sqlite_search_table
+        rebuild_sqlite_search_table(sqlite_conn)
+    except Exception as e:
+        logger.warning(f"Error building search index: {e}")
 
-        logger.info("Creating SQLite table with schema from PostgreSQL")
 
-        # Drop existing table and create new one
-        sqlite_cursor.execute("DROP TABLE IF EXISTS taitur_data")
-        sqlite_cursor.execute(create_table_sql)
+def sync_local_db():
+    """Apply the rows inserted, updated or deleted in PostgreSQL since the last sync to the local SQLite database"""
+    if not check_requirements():
+        return False
+
+    config = get_db_config()
+    local_db_path = config['local_db']
 
-        # Get column names for INSERT statement
-        column_names = [col[0] for col in columns]
+    try:
+        import psycopg2
+        from app.utils.pg_snapshot import sync_table, DEFAULT_WORKERS
+        from app.services.search_index import refresh_sqlite_search_range
 
-        # Determine batch size based on available memory
-        batch_size = 1000
+        logger.info("Connecting to PostgreSQL database...")
+        conn = psycopg2.connect(**pg_connect_params(config))
 
-        # Prepare INSERT statement
-        placeholders = ",".join(["?"] * len(column_names))
-        insert_sql = f"INSERT INTO taitur_data ({','.join(column_names)}) VALUES ({placeholders})"
+        os.makedirs(os.path.dirname(local_db_path), exist_ok=True)
+        sqlite_conn = sqlite3.connect(str(local_db_path))
 
-        # Count total rows
-        cursor.execute("SELECT COUNT(*) FROM taitur_data")
-        total_rows = cursor.fetchone()[0]
-        logger.info(f"Total rows to transfer: {total_rows}")
-
-        # Fetch and insert data in batches to avoid memory issues
-        offset = 0
-        total_inserted = 0
-
-        while True:
-            # Fetch data from PostgreSQL in batches
-            cursor.execute(f"SELECT * FROM taitur_data ORDER BY id LIMIT {batch_size} OFFSET {offset}")
-            rows = cursor.fetchall()
-
-            if not rows:
-                break
-
-            # Process rows to handle data types properly
-            processed_rows = []
-            for row in rows:
-                processed_row = []
-                for i, val in enumerate(row):
-                    # Convert PostgreSQL types to SQLite compatible types
-                    if val is None:
-                        processed_row.append(None)
-                    elif isinstance(val, (list, dict)):
-                        # Convert JSON types to string
-                        processed_row.append(json.dumps(val))
-                    else:
-                        processed_row.append(val)
-                processed_rows.append(processed_row)
-
-            # Insert data into SQLite
-            sqlite_cursor.executemany(insert_sql, processed_rows)
-            sqlite_conn.commit()
-
-            total_inserted += len(rows)
-            offset += batch_size
-
-            logger.info(f"Inserted {total_inserted}/{total_rows} rows ({(total_inserted / total_rows * 100):.1f}%)")
-
-            if len(rows) < batch_size:
-                break
-
-        # Create indexes that might be useful for performance
-        logger.info("Creating indexes...")
-        try:
-            # Common indexes that might be useful - adjust based on your queries
-            sqlite_cursor.execute("CREATE INDEX IF NOT EXISTS idx_taitur_data_name ON taitur_data(name)")
-            sqlite_cursor.execute("CREATE INDEX IF NOT EXISTS idx_taitur_data_status ON taitur_data(status)")
-            sqlite_cursor.execute("CREATE INDEX IF NOT EXISTS idx_taitur_data_owner ON taitur_data(owner_id)")
-            sqlite_conn.commit()
-        except Exception as e:
-            logger.warning(f"Error creating indexes: {e}")
+        # Keep the search documents of every re-copied range in step, in the same transaction
+        stats = sync_table(
+            conn, sqlite_conn, "taitur_data",
+            on_range_copied=lambda first_id, last_id: refresh_sqlite_search_range(
+                sqlite_conn, first_id, last_id, commit=False
+            ),
+            workers=DEFAULT_WORKERS,
+            connect_params=pg_connect_params(config)
+        )
+
+        if stats["mode"] == "snapshot":
+            # The table was copied from scratch, so its indexes and search table are new
+            finish_local_db(sqlite_conn)
 
-        # Close connections
-        cursor.close()
         conn.close()
-        sqlite_cursor.close()
         sqlite_conn.close()
 
-        logger.info(f"Data successfully transferred from PostgreSQL to SQLite: {total_inserted} rows")
+        logger.info(f"Local database synchronized ({stats['mode']}): {stats['rows']} rows copied "
+                    f"in {stats['seconds']:.1f}s")
         return True
 
     except Exception as e:
-        logger.error(f"Error transferring data: {e}")
+        logger.error(f"Error synchronizing local database: {e}")
         logger.error(traceback.format_exc())
         return False
 
@@ -675,6 +641,132 @@ def show_db_info():
     return True
 
 
+def get_index_usage():
+    """Column usage recorded by the running application (empty if Redis is unavailable)"""
+    try:
+        sys.path.append(str(current_dir))
+        from app.core.config import settings
+        from app.services.index_advisor import read_usage_sync
+        return read_usage_sync(settings.REDIS_CONNECTION_STRING)
+    except ImportError as e:
+        logger.warning(f"Error importing app settings: {e}")
+        return {}
+
+
+def index_report(use_local=False, apply=False):
+    """Print recorded column usage, index recommendations and index hit rates; optionally create missing indexes"""
+    from app.services.index_advisor import (
+        recommend_indexes, create_indexes, existing_indexes_sql, PG_INDEX_STATS_SQL, PG_TABLE_STATS_SQL
+    )
+
+    config = get_db_config()
+    dialect = "sqlite" if use_local else "postgresql"
+
+    try:
+        if use_local:
+            if not check_local_db_exists():
+                return False
+            conn = sqlite3.connect(str(config['local_db']))
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA table_info(taitur_data)")
+            columns = [row[1] for row in cursor.fetchall()]
+        else:
+            import psycopg2
+            conn = psycopg2.connect(**pg_connect_params(config))
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT column_name FROM information_schema.columns WHERE table_name = 'taitur_data'"
+            )
+            columns = [row[0] for row in cursor.fetchall()]
+
+        usage = get_index_usage()
+        recommendations = recommend_indexes(usage, columns, dialect)
+
+        print(f"\n=== Index Report ({'local SQLite' if use_local else 'PostgreSQL'}) ===")
+
+        print("\nRecorded column usage:")
+        if usage:
+            for (column, kind), count in sorted(usage.items(), key=lambda item: -item[1]):
+                print(f"  - {column:<30} {kind:<10} {count:>10,}")
+        else:
+            print("  - None recorded yet (the application records usage in Redis)")
+
+        cursor.execute(existing_indexes_sql(dialect))
+        existing = {row[0] for row in cursor.fetchall()}
+
+        print("\nRecommended indexes:")
+        for rec in recommendations:
+            state = "present" if rec["name"] in existing else "MISSING"
+            print(f"  - [{state:<7}] {rec['name']} ({rec['method']}, {rec['reason']}, {rec['uses']:,} uses)")
+
+        print("\nIndex hit rates:")
+        if use_local:
+            print("  - SQLite keeps no index usage statistics")
+            for name in sorted(existing):
+                print(f"  - {name}")
+        else:
+            cursor.execute(PG_TABLE_STATS_SQL)
+            table_stats = cursor.fetchone()
+            if table_stats:
+                seq_scan, seq_tup_read, idx_scan, idx_tup_fetch = (value or 0 for value in table_stats)
+                total_scans = seq_scan + idx_scan
+                rate = (idx_scan / total_scans * 100) if total_scans else 0.0
+                print(f"  - taitur_data: {idx_scan:,} index scans, {seq_scan:,} sequential scans "
+                      f"({rate:.1f}% index), {seq_tup_read:,} rows read sequentially")
+
+            cursor.execute(PG_INDEX_STATS_SQL)
+            for name, scans, tup_read, blks_hit, blks_read, size in cursor.fetchall():
+                blocks = (blks_hit or 0) + (blks_read or 0)
+                cache_rate = (blks_hit / blocks * 100) if blocks else 0.0
+                print(f"  - {name}: {scans or 0:,} scans, {tup_read or 0:,} tuples, "
+                      f"{cache_rate:.1f}% buffer hits, {size / (1024 * 1024):.1f} MB")
+
+        if apply:
+            created = create_indexes(conn, dialect, recommendations)
+            print(f"\nCreated {len(created)} indexes")
+            for name in created:
+                print(f"  - {name}")
+        elif any(rec["name"] not in existing for rec in recommendations):
+            print(f"\nRun 'python db_manager.py indexes {'--local ' if use_local else ''}--apply' to create missing indexes")
+
+        cursor.close()
+        conn.close()
+        return True
+
+    except Exception as e:
+        logger.error(f"Error building index report: {e}")
+        logger.error(traceback.format_exc())
+        return False
+
+
+def build_search_index():
+    """Create the global search index (pg_trgm on PostgreSQL, FTS5 on the local SQLite database)"""
+    import asyncio
+
+    async def _build():
+        from app.core import db
+        from app.services.search_index import search_index
+
+        await db.init_db()
+        async with db.engine.begin() as conn:
+            mode = await search_index.ensure(conn, db.get_dialect_name(), create=True)
+        await db.engine.dispose()
+        return mode
+
+    try:
+        mode = asyncio.run(_build())
+    except Exception as e:
+        logger.error(f"Error building search index: {e}")
+        return False
+
+    if not mode:
+        logger.error("Search index could not be created, global search will scan the table")
+        return False
+
+    logger.info(f"Search index ready ({mode})")
+    return True
+
+
 def main():
     """Main entry point for the DB manager"""
     parser = argparse.ArgumentParser(description="Manage database operations")
@@ -697,6 +789,17 @@ def main():
     # Info command
     info_parser = subparsers.add_parser("info", help="Show database information")
 
+    # Index advisor command
+    indexes_parser = subparsers.add_parser("indexes", help="Show index recommendations and hit rates")
+    indexes_parser.add_argument("--local", action="store_true", help="Use local SQLite database")
+    indexes_parser.add_argument("--apply", action="store_true", help="Create missing recommended indexes")
+
+    # Sync command
+    subparsers.add_parser("sync", help="Incrementally refresh the local database from PostgreSQL")
+
+    # Search index command
+    subparsers.add_parser("search-index", help="Create the global search index")
+
     args = parser.parse_args()
 
     if args.command == "export":
@@ -714,6 +817,12 @@ def main():
             auto_start()
     elif args.command == "info":
         show_db_info()
+    elif args.command == "indexes":
+        index_report(use_local=args.local, apply=args.apply)
+    elif args.command == "sync":
+        sync_local_db()
+    elif args.command == "search-index":
+        build_search_index()
     else:
         parser.print_help()
         sys.exit(1)